@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    pbkdf2_sha256 with its work factor taken from PASSWORD_HASH_ITERATIONS.
+    The algorithm name is unchanged, so existing hashes keep verifying, and
+    Django rehashes a password at its next successful login whenever the
+    stored iteration count differs from the configured one.
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_HASH_ITERATIONS', PBKDF2PasswordHasher.iterations)
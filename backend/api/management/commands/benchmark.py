@@ -0,0 +1,121 @@
+import os
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from api.utils.benchmark import (BenchmarkRunner, compare_to_baseline, default_scenarios,
+                                 load_baseline, save_baseline, seed_catalog,
+                                 stub_payment_providers)
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway database and benchmark the storefront, checkout and '
+        'dashboard endpoints (p50/p95/p99, throughput, queries per request)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--orders', type=int, default=500)
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+                            help='Only run the named scenario (repeatable)')
+        parser.add_argument('--baseline', default=os.path.join(settings.BASE_DIR, 'benchmarks', 'baseline.json'))
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Store this run as the new baseline')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed p95 slowdown against the baseline (0.2 = 20%%)')
+        parser.add_argument('--fail-on-regression', action='store_true')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Keep the benchmark database between runs')
+
+    def handle(self, *args, **options):
+        # The benchmark never touches the configured database: Django's test
+        # database machinery creates test_<NAME> (Postgres) or a separate file (SQLite).
+        if connection.vendor == 'sqlite' and not connection.settings_dict['TEST'].get('NAME'):
+            connection.settings_dict['TEST']['NAME'] = os.path.join(settings.BASE_DIR, 'benchmark.sqlite3')
+        if connection.vendor == 'sqlite' and options['concurrency'] > 1:
+            # SQLite allows one writer at a time; concurrent checkouts fail with
+            # "database is locked" and would be reported as server errors
+            self.stdout.write(self.style.WARNING(
+                f"SQLite cannot serve {options['concurrency']} concurrent writers; running with "
+                "--concurrency 1. Benchmark against PostgreSQL for concurrent figures."
+            ))
+            options['concurrency'] = 1
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['keepdb'], serialize=False
+        )
+        try:
+            results = self.run_benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        self.report(results)
+        self.check_baseline(results, options)
+
+    def run_benchmark(self, options):
+        self.stdout.write(
+            f"Seeding {options['products']} products, {options['users']} users, "
+            f"{options['orders']} orders..."
+        )
+        seed = seed_catalog(options['products'], options['users'], options['orders'])
+
+        scenarios = default_scenarios(seed)
+        if options['scenarios']:
+            unknown = set(options['scenarios']) - {scenario.name for scenario in scenarios}
+            if unknown:
+                raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+            scenarios = [scenario for scenario in scenarios if scenario.name in options['scenarios']]
+
+        runner = BenchmarkRunner(seed, options['requests'], options['concurrency'])
+        if getattr(settings, 'PAYMENT_SIMULATOR_URL', ''):
+            # Payment calls go to run_payment_simulators, including its latency
+            with mock.patch('api.views.send_via_sendgrid', return_value=True):
+                return runner.run(scenarios)
+        with stub_payment_providers():
+            return runner.run(scenarios)
+
+    def report(self, results):
+        header = (f"{'scenario':<22}{'reqs':>6}{'errors':>8}{'err %':>8}{'p50 ms':>10}{'p95 ms':>10}"
+                  f"{'p99 ms':>10}{'req/s':>9}{'queries':>9}")
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for name, row in results.items():
+            line = (
+                f"{name:<22}{row['requests']:>6}{row['errors']:>8}{row['error_rate']:>8}{row['p50_ms']:>10}"
+                f"{row['p95_ms']:>10}{row['p99_ms']:>10}{row['throughput_rps']:>9}"
+                f"{row['queries_per_request']:>9}"
+            )
+            # Latency of a scenario that mostly errored says little about the endpoint
+            self.stdout.write(self.style.WARNING(line) if row['errors'] else line)
+
+    def check_baseline(self, results, options):
+        path = options['baseline']
+        if options['save_baseline']:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            keys = ('products', 'users', 'orders', 'requests', 'concurrency')
+            save_baseline(path, results, {key: options[key] for key in keys})
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {path}"))
+            return
+
+        baseline = load_baseline(path)
+        if baseline is None:
+            self.stdout.write(f"No baseline at {path}; run with --save-baseline to create one")
+            return
+
+        regressions = compare_to_baseline(results, baseline, options['tolerance'])
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
+            return
+        for regression in regressions:
+            self.stdout.write(self.style.WARNING(f"Regression: {regression}"))
+        if options['fail_on_regression']:
+            raise CommandError(f"{len(regressions)} regression(s) against the baseline")
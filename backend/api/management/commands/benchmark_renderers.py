@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from api import renderers
+from api.utils.benchmark import benchmark_renderers, render_payloads
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark the response renderers against DRF\'s stdlib JSONRenderer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Products per payload')
+        parser.add_argument('--rounds', type=int, default=50)
+
+    def handle(self, *args, **options):
+        if renderers.orjson is None:
+            self.stdout.write(self.style.WARNING("orjson is not installed; fast_json is the stdlib fallback"))
+        if renderers.msgpack is None:
+            self.stdout.write("msgpack is not installed; skipping the MessagePack renderer")
+
+        results = benchmark_renderers(render_payloads(options['rows']), options['rounds'])
+        header = f"{'payload':<12}{'renderer':<14}{'median ms':>11}{'KiB':>9}{'speedup':>9}  same data"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for payload, rows in results.items():
+            for name, row in rows.items():
+                self.stdout.write(
+                    f"{payload:<12}{name:<14}{row['ms']:>11.2f}{row['bytes'] / 1024:>9.1f}"
+                    f"{row['speedup']:>8.1f}x  {'yes' if row['matches'] else 'NO'}"
+                )
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services import PaymentService
+
+
+class Command(BaseCommand):
+    help = "Verify each order's latest_payment/payment_status against its payments"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Recompute the drifted orders')
+        parser.add_argument('--verbose-limit', type=int, default=20,
+                            help='How many mismatches to list')
+
+    def handle(self, *args, **options):
+        service = PaymentService()
+        drifted = []
+        for order_id, stored, actual in service.latest_payment_drift():
+            if len(drifted) < options['verbose_limit']:
+                self.stdout.write(f"Order {order_id}: stored {stored}, expected {actual}")
+            drifted.append(order_id)
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("All order payment pointers are consistent"))
+            return
+
+        if options['fix']:
+            repaired = 0
+            for start in range(0, len(drifted), 500):
+                repaired += service.repair_latest_payment(drifted[start:start + 500])
+            self.stdout.write(self.style.SUCCESS(f"Repaired {repaired} order(s)"))
+            return
+        raise CommandError(f"{len(drifted)} order(s) out of sync; rerun with --fix")
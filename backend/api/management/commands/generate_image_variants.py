@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from api.models import Product
+from api.utils.images import generate_image_variants, is_remote
+
+
+class Command(BaseCommand):
+    help = 'Generate and cache responsive variants of every locally stored product image'
+
+    def handle(self, *args, **options):
+        names = (Product.objects.exclude(image='').exclude(image__isnull=True)
+                 .values_list('image', flat=True).distinct())
+        images = created = 0
+        for name in names.iterator():
+            if is_remote(name):
+                continue
+            created += generate_image_variants(name)
+            images += 1
+        self.stdout.write(self.style.SUCCESS(f"Generated {created} variants for {images} images"))
@@ -4,10 +4,9 @@ from django.core.files.base import ContentFile
 from api.models import Product, Categories  
 from urllib.parse import urlparse
 
-import json
-import uuid
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
+from api.utils.product_import import ProductImporter, READERS, detect_format, iter_records
 
 # def save_image_from_url(instance, image_url):
 #     """Download image from a URL and save it to the ImageField."""
@@ -99,51 +98,35 @@ from django.contrib.auth import get_user_model
 #             else:
 #                 self.stdout.write(f"Category already exists: {cat['name']}")
 class Command(BaseCommand):
-    help = 'Import products from JSON file'
-
-    def handle(self, *args, **kwargs):
+    help = 'Import products from a JSON, NDJSON or CSV file in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='products_sample.json')
+        parser.add_argument('--format', choices=sorted(READERS), help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--match-on', choices=['id', 'title'], default='id')
+        parser.add_argument('--create-categories', action='store_true',
+                            help='Create categories referenced by name that do not exist yet')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        path = options['path']
         try:
-            with open('products_sample.json', 'r') as file:
-                data = json.load(file)
+            fmt = options['format'] or detect_format(path)
 
             User = get_user_model()
-            default_user = User.objects.first()
-
-            # Map existing categories by UUID
-            category_map = {str(cat.id): cat for cat in Categories.objects.all()}
-
-            created_count = 0
-            for item in data:
-                category_id = item['category']
-                if category_id not in category_map:
-                    self.stdout.write(self.style.WARNING(f"Category ID {category_id} not found. Skipping..."))
-                    continue
-
-                Product.objects.update_or_create(
-                    id=uuid.UUID(item['id']),
-                    defaults={
-                        'user': default_user,
-                        'title': item['title'],
-                        'image': item['image'],
-                        'brand': item['brand'],
-                        'category': category_map[category_id],
-                        'description': item['description'],
-                        'is_active': item['is_active'],
-                        'rating': item['rating'],
-                        'numReviews': item['numReviews'],
-                        'countInStock': item['countInStock'],
-                        'Date_added': item['Date_added'],
-                        'new_price': item['new_price'],
-                        'old_price': item['old_price'],
-                        'specs': item['specs'],
-                        'best_seller': item['best_seller'],
-                        'flash_sale': item['flash_sale'],
-                        'flash_sale_price': item['flash_sale_price'],
-                        'flash_sale_end': item['flash_sale_end'],
-                    }
-                )
-                created_count += 1
-
-            self.stdout.write(self.style.SUCCESS(f"Successfully imported {created_count} products."))
+            importer = ProductImporter(
+                match_on=options['match_on'],
+                batch_size=options['batch_size'],
+                default_user=User.objects.first(),
+                create_categories=options['create_categories'],
+                dry_run=options['dry_run'],
+            )
+
+            with open(path, 'r', encoding='utf-8', newline='') as file:
+                stats = importer.run(iter_records(file, fmt))
+
+            prefix = "[dry run] " if options['dry_run'] else ""
+            self.stdout.write(self.style.SUCCESS(f"{prefix}Imported products: {stats}"))
         except Exception as e:
             self.stderr.write(self.style.ERROR(f"Error importing products: {e}"))
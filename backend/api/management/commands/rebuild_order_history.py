@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.services import OrderHistoryService
+
+
+class Command(BaseCommand):
+    help = 'Recompute the order history read model from orders, items and payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        written = OrderHistoryService.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} order history entries"))
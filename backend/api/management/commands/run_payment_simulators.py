@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from api.utils.payment_simulator import PaymentSimulator, make_server
+
+
+class Command(BaseCommand):
+    help = 'Run local M-Pesa Daraja and Stripe stand-ins for integration and load tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host')
+        parser.add_argument('--port', type=int)
+        parser.add_argument('--latency-ms', type=float)
+        parser.add_argument('--failure-rate', type=float, help='Share of payments that fail (0-1)')
+        parser.add_argument('--duplicate-rate', type=float,
+                            help='Share of callbacks/webhooks delivered twice (0-1)')
+        parser.add_argument('--callback-delay', type=float, help='Seconds before a result is delivered')
+        parser.add_argument('--webhook-url', help='Stripe webhook URL of the Django app')
+
+    def handle(self, *args, **options):
+        option_settings = {
+            'host': 'HOST',
+            'port': 'PORT',
+            'latency_ms': 'LATENCY_MS',
+            'failure_rate': 'FAILURE_RATE',
+            'duplicate_rate': 'DUPLICATE_CALLBACK_RATE',
+            'callback_delay': 'CALLBACK_DELAY',
+            'webhook_url': 'STRIPE_WEBHOOK_URL',
+        }
+        overrides = {
+            setting: options[option] for option, setting in option_settings.items()
+            if options[option] is not None
+        }
+        simulator = PaymentSimulator(**overrides)
+        server = make_server(simulator)
+
+        config = simulator.config
+        self.stdout.write(self.style.SUCCESS(
+            f"Payment simulators listening on http://{config['HOST']}:{config['PORT']} "
+            f"(latency {config['LATENCY_MS']}ms, failure rate {config['FAILURE_RATE']}, "
+            f"duplicate rate {config['DUPLICATE_CALLBACK_RATE']})"
+        ))
+        self.stdout.write("Set PAYMENT_SIMULATOR_URL to this address in the app's environment.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
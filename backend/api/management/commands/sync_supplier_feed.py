@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from api.utils.feed_sync import SupplierFeedSync
+
+
+class Command(BaseCommand):
+    help = 'Incrementally sync products from the supplier feed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Ignore stored ETag/Last-Modified and page hashes')
+        parser.add_argument('--no-images', action='store_true', help='Do not download product images')
+        parser.add_argument('--concurrency', type=int)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        overrides = {}
+        if options['no_images']:
+            overrides['DOWNLOAD_IMAGES'] = False
+        if options['concurrency']:
+            overrides['CONCURRENCY'] = options['concurrency']
+
+        try:
+            summary = SupplierFeedSync(
+                full=options['full'],
+                dry_run=options['dry_run'],
+                default_user=get_user_model().objects.first(),
+                **overrides,
+            ).run()
+            self.stdout.write(self.style.SUCCESS(f"Supplier feed sync: {summary}"))
+        except Exception as e:
+            self.stderr.write(self.style.ERROR(f"Error syncing supplier feed: {e}"))
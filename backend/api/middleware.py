@@ -0,0 +1,117 @@
+import logging
+import time
+from contextlib import nullcontext
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
+
+from .utils.metrics import (RequestStats, collect_request_stats, get_metrics_config,
+                            install_instrumentation, record_request)
+from .utils.query_budget import (QueryBudgetExceeded, QueryInspector, budget_for,
+                                 get_query_budget_config)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncCapableMiddleware:
+    """
+    Base for middleware that wraps the request in a context manager and
+    post-processes the response. Serves async views on the event loop
+    instead of forcing Django to run the chain in a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.before(request)
+        with state['context']:
+            response = self.get_response(request)
+        return self.after(request, response, state)
+
+    async def __acall__(self, request):
+        state = self.before(request)
+        with state['context']:
+            response = await self.get_response(request)
+        return self.after(request, response, state)
+
+    def before(self, request):
+        return {'context': nullcontext()}
+
+    def after(self, request, response, state):
+        return response
+
+
+class PerformanceMetricsMiddleware(AsyncCapableMiddleware):
+    """
+    Records wall time, SQL count/time, cache hits/misses and outbound HTTP
+    time per resolved URL name, and reports them in a Server-Timing header.
+    Aggregates are exposed by the metrics view.
+    """
+
+    def __init__(self, get_response):
+        self.config = get_metrics_config()
+        if not self.config['ENABLED']:
+            raise MiddlewareNotUsed
+        install_instrumentation()
+        super().__init__(get_response)
+
+    def before(self, request):
+        stats = RequestStats()
+        return {
+            'stats': stats,
+            'context': collect_request_stats(stats),
+            'start': time.perf_counter(),
+        }
+
+    def after(self, request, response, state):
+        duration = time.perf_counter() - state['start']
+        stats = state['stats']
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name or match._func_path) if match else 'unresolved'
+        record_request(view, request.method, response.status_code, duration, stats)
+
+        if self.config['SERVER_TIMING']:
+            response['Server-Timing'] = stats.server_timing(duration)
+        return response
+
+
+class QueryBudgetMiddleware(AsyncCapableMiddleware):
+    """
+    Development/staging check for N+1 queries and per-endpoint query
+    budgets (QUERY_BUDGETS). Violations are logged with the project stack
+    that issued the repeated statement, or raised when RAISE is set.
+    """
+
+    def __init__(self, get_response):
+        self.config = get_query_budget_config()
+        if not self.config['ENABLED']:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def before(self, request):
+        inspector = QueryInspector()
+        return {'inspector': inspector, 'context': inspector.capture()}
+
+    def after(self, request, response, state):
+        inspector = state['inspector']
+        for duration_ms, sql, stack in inspector.slow:
+            logger.warning("Slow query (%.0f ms) in %s: %s\n    %s",
+                           duration_ms, request.path, sql, '\n    '.join(stack))
+
+        problems = inspector.problems(budget_for(request))
+        if problems:
+            message = f"{request.method} {request.path}: " + '\n'.join(problems)
+            if self.config['RAISE']:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        if self.config['HEADER']:
+            response['X-Query-Count'] = str(inspector.count)
+        return response
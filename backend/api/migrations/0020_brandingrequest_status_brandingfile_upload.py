@@ -0,0 +1,91 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:01
+
+import uuid
+from django.db import migrations, models
+
+
+def backfill_existing_uploads(apps, schema_editor):
+    # Files uploaded before resumable uploads were already accepted.
+    BrandingFile = apps.get_model('api', 'BrandingFile')
+    BrandingRequest = apps.get_model('api', 'BrandingRequest')
+    for branding_file in BrandingFile.objects.all():
+        branding_file.upload_id = uuid.uuid4()
+        branding_file.status = 'verified'
+        branding_file.save(update_fields=['upload_id', 'status'])
+    BrandingRequest.objects.update(status='submitted')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_categories_description_categories_is_active_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='brandingfile',
+            name='bytes_received',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='brandingfile',
+            name='content_type',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='brandingfile',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='brandingfile',
+            name='error',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='brandingfile',
+            name='original_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='brandingfile',
+            name='size',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='brandingfile',
+            name='status',
+            field=models.CharField(choices=[('uploading', 'Uploading'), ('uploaded', 'Uploaded'), ('verified', 'Verified'), ('rejected', 'Rejected')], default='uploading', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='brandingfile',
+            name='thumbnail',
+            field=models.ImageField(blank=True, null=True, upload_to='branding_uploads/thumbnails/'),
+        ),
+        migrations.AddField(
+            model_name='brandingfile',
+            name='upload_id',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='brandingrequest',
+            name='finalized_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='brandingrequest',
+            name='status',
+            field=models.CharField(choices=[('awaiting_files', 'Awaiting Files'), ('submitted', 'Submitted')], default='awaiting_files', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='brandingfile',
+            name='file',
+            field=models.FileField(blank=True, upload_to='branding_uploads/'),
+        ),
+        migrations.RunPython(backfill_existing_uploads, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='brandingfile',
+            name='upload_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+    ]
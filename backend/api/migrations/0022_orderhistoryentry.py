@@ -0,0 +1,69 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_order_history(apps, schema_editor):
+    Order = apps.get_model('api', 'Order')
+    Payment = apps.get_model('api', 'Payment')
+    OrderHistoryEntry = apps.get_model('api', 'OrderHistoryEntry')
+
+    latest = {}
+    for payment in Payment.objects.filter(order__isnull=False).order_by('order_id', '-created_at'):
+        latest.setdefault(payment.order_id, payment)
+
+    entries = []
+    for order in Order.objects.annotate(item_total=Sum('items__quantity')).iterator():
+        payment = latest.get(order.id)
+        entries.append(OrderHistoryEntry(
+            order_id=order.id,
+            user_id=order.user_id,
+            order_number=order.orderId,
+            total_price=order.totalPrice,
+            status=order.status,
+            is_paid=order.isPaid,
+            payment_method=order.paymentmethod,
+            item_count=order.item_total or 0,
+            created_at=order.createdAt,
+            latest_payment_id=payment.id if payment else None,
+            latest_payment_status=payment.status if payment else None,
+            latest_payment_reference=payment.reference_number if payment else None,
+            latest_payment_created_at=payment.created_at if payment else None,
+        ))
+    OrderHistoryEntry.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_product_source_hash_supplierfeedpage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderHistoryEntry',
+            fields=[
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='history_entry', serialize=False, to='api.order')),
+                ('order_number', models.CharField(blank=True, max_length=200, null=True)),
+                ('total_price', models.DecimalField(blank=True, decimal_places=2, max_digits=7, null=True)),
+                ('status', models.CharField(blank=True, max_length=200, null=True)),
+                ('is_paid', models.BooleanField(default=False)),
+                ('payment_method', models.CharField(blank=True, max_length=200, null=True)),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(blank=True, null=True)),
+                ('latest_payment_id', models.UUIDField(blank=True, null=True)),
+                ('latest_payment_status', models.CharField(blank=True, max_length=20, null=True)),
+                ('latest_payment_reference', models.CharField(blank=True, max_length=100, null=True)),
+                ('latest_payment_created_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='order_history', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-created_at'], name='order_history_user_created')],
+            },
+        ),
+        migrations.RunPython(backfill_order_history, migrations.RunPython.noop),
+    ]
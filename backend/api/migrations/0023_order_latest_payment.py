@@ -0,0 +1,36 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_latest_payment(apps, schema_editor):
+    Order = apps.get_model('api', 'Order')
+    Payment = apps.get_model('api', 'Payment')
+    latest = Payment.objects.filter(order=OuterRef('pk')).order_by('-created_at')
+    Order.objects.update(
+        latest_payment=Subquery(latest.values('id')[:1]),
+        payment_status=Subquery(latest.values('status')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_orderhistoryentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='latest_payment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.payment'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='payment_status',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.RunPython(backfill_latest_payment, migrations.RunPython.noop),
+    ]
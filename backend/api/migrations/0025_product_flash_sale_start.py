@@ -0,0 +1,26 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_stockreservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='flash_sale_start',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['flash_sale', 'flash_sale_end'], name='product_flash_sale_end'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['flash_sale_start'], name='product_flash_sale_start'),
+        ),
+    ]
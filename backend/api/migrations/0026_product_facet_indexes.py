@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_product_flash_sale_start'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['brand'], name='product_brand'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['new_price'], name='product_new_price'),
+        ),
+    ]
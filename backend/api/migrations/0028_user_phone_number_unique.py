@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:41
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_phone_numbers(apps, schema_editor):
+    User = apps.get_model('api', 'User')
+    duplicates = list(
+        User.objects.exclude(phone_number='').values('phone_number')
+        .annotate(count=Count('id')).filter(count__gt=1).values_list('phone_number', flat=True)[:20]
+    )
+    if duplicates:
+        raise RuntimeError(
+            "Phone numbers shared by several accounts must be resolved before they can be made unique: "
+            + ", ".join(duplicates)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0027_review_aggregates'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_phone_numbers, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(condition=models.Q(('phone_number', ''), _negated=True), fields=('phone_number',), name='user_phone_number_unique'),
+        ),
+    ]
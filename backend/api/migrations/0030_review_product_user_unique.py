@@ -0,0 +1,57 @@
+# Generated by Django 5.1.7 on 2026-10-19 18:05
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def drop_duplicate_reviews(apps, schema_editor):
+    """Keep each customer's latest review of a product and re-derive the aggregates it counted twice"""
+    Product = apps.get_model('api', 'Product')
+    Review = apps.get_model('api', 'Review')
+
+    pairs = (Review.objects.filter(product__isnull=False, user__isnull=False)
+             .values('product_id', 'user_id').annotate(count=Count('id')).filter(count__gt=1))
+    affected = set()
+    for pair in pairs.iterator():
+        reviews = Review.objects.filter(product_id=pair['product_id'], user_id=pair['user_id'])
+        latest = reviews.order_by('-updated_at', '-created_at').values_list('id', flat=True).first()
+        reviews.exclude(id=latest).delete()
+        affected.add(pair['product_id'])
+
+    for product_id in affected:
+        counts = [0] * 5
+        for rating in Review.objects.filter(
+            product_id=product_id, rating__gte=1, rating__lte=5
+        ).values_list('rating', flat=True):
+            counts[rating - 1] += 1
+        count = sum(counts)
+        total = sum(stars * counts[stars - 1] for stars in range(1, 6))
+        average = (Decimal(total) / count).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) if count else Decimal(0)
+        Product.objects.filter(id=product_id).update(
+            numReviews=count,
+            rating_total=total,
+            rating_average=average,
+            rating=int(average.quantize(Decimal('1'), rounding=ROUND_HALF_UP)),
+            **{f'rating_count_{stars}': counts[stars - 1] for stars in range(1, 6)},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0029_catalog_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_reviews, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='review',
+            name='review_product_user',
+        ),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.UniqueConstraint(fields=('product', 'user'), name='review_product_user_unique'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-19 18:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0030_review_product_user_unique'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='orderhistoryentry',
+            name='order_history_user_created',
+        ),
+        migrations.AddIndex(
+            model_name='orderhistoryentry',
+            index=models.Index(fields=['user', '-created_at', '-order'], name='order_history_user_created'),
+        ),
+    ]
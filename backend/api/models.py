@@ -30,6 +30,13 @@ class User(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
     
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            # Registration checks all identifiers in one query and lets these catch races
+            models.UniqueConstraint(fields=['phone_number'], condition=~models.Q(phone_number=''),
+                                    name='user_phone_number_unique'),
+        ]
+    
     def is_admin(self):
         return self.role == 'admin' or self.is_superuser
     
@@ -62,6 +69,7 @@ class Categories(models.Model):
     description = models.TextField(null=True, blank=True)
     slug = models.CharField(max_length=250, null=True, blank=True)
     is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name_plural = 'Categories'
@@ -79,23 +87,46 @@ class Product(models.Model):
     is_active = models.BooleanField(default=True)
     rating = models.IntegerField(null=True, blank=True, default=0)
     numReviews = models.IntegerField(null=True, blank=True, default=0)
+    # Review aggregates, kept in step with Review rows by ReviewService
+    rating_average = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    rating_total = models.PositiveIntegerField(default=0)
+    rating_count_1 = models.PositiveIntegerField(default=0)
+    rating_count_2 = models.PositiveIntegerField(default=0)
+    rating_count_3 = models.PositiveIntegerField(default=0)
+    rating_count_4 = models.PositiveIntegerField(default=0)
+    rating_count_5 = models.PositiveIntegerField(default=0)
     countInStock = models.IntegerField(null=True, blank=True, default=0)
     Date_added = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     new_price = models.DecimalField(max_digits=7, decimal_places=2, null=True, blank=True)
     old_price = models.DecimalField(max_digits=7, decimal_places=2, null=True, blank=True)
     specs = models.JSONField(null=True, blank=True)
     best_seller = models.BooleanField(default=False)
     flash_sale = models.BooleanField(default=False)
     flash_sale_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    flash_sale_start = models.DateTimeField(null=True, blank=True)
     flash_sale_end = models.DateTimeField(null=True, blank=True)
     id = models.UUIDField(default=uuid.uuid4, unique=True,
                           primary_key=True, editable=False)
     
+    # Supplier feed sync state
+    source_hash = models.CharField(max_length=64, blank=True, default='')
+    source_image_url = models.URLField(max_length=500, blank=True, default='')
+    source_image_hash = models.CharField(max_length=64, blank=True, default='')
+    
     def __str__(self):
         return self.title 
     
     class Meta:
         ordering =['-Date_added']
+        indexes = [
+            # Flash-sale index rebuilds and the schedule sweep
+            models.Index(fields=['flash_sale', 'flash_sale_end'], name='product_flash_sale_end'),
+            models.Index(fields=['flash_sale_start'], name='product_flash_sale_start'),
+            # Catalog facets and filters
+            models.Index(fields=['brand'], name='product_brand'),
+            models.Index(fields=['new_price'], name='product_new_price'),
+        ]
         
     def get_image_url(self):
          return self.image.url if self.image else 'https://res.cloudinary.com/ivano/image/upload/v1/default/noavatar.png'
@@ -108,6 +139,17 @@ class Review(models.Model):
     comment=models.TextField(null=True, blank=True)
     id = models.UUIDField(default=uuid.uuid4, unique=True,
                           primary_key=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True, null=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', '-created_at'], name='review_product_created'),
+        ]
+        constraints = [
+            # One review per customer and product; ReviewService replaces it on resubmission
+            models.UniqueConstraint(fields=['product', 'user'], name='review_product_user_unique'),
+        ]
     
     def __str__(self):
         return str(self.rating)
@@ -117,6 +159,7 @@ class Testimonials(models.Model):
     position = models.CharField(max_length=200, null=True, blank=True)
     rating = models.IntegerField(null=True, blank=True, default=1)
     comment=models.TextField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return str(self.user)
@@ -163,6 +206,9 @@ class Order(models.Model):
     createdAt = models.DateTimeField(auto_now_add=True, null=True, blank=True)
     id = models.UUIDField(default=uuid.uuid4, unique=True,
                           primary_key=True, editable=False)
+    # Maintained by PaymentService.record_payment; audit with check_order_payments
+    latest_payment = models.ForeignKey("Payment", on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    payment_status = models.CharField(max_length=20, null=True, blank=True)
     
     
     def save(self, *args, **kwargs):
@@ -191,11 +237,16 @@ class SliderData(models.Model):
     description = models.TextField(null=True, blank=True)
     id = models.UUIDField(default=uuid.uuid4, unique=True,
                           primary_key=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return self.title
     
 class BrandingRequest(models.Model):
+    STATUS_CHOICES = [
+        ('awaiting_files', 'Awaiting Files'),
+        ('submitted', 'Submitted'),
+    ]
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
     email = models.EmailField()
@@ -206,13 +257,35 @@ class BrandingRequest(models.Model):
     timeline = models.CharField(max_length=100, blank=True)
     branding_instructions = models.TextField(blank=True)
     submitted_at = models.DateTimeField(auto_now_add=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='awaiting_files')
+    finalized_at = models.DateTimeField(null=True, blank=True)
     
     def __str__(self):
         return f"{self.first_name} {self.last_name} - {self.company}"
 
 class BrandingFile(models.Model):
+    STATUS_CHOICES = [
+        ('uploading', 'Uploading'),
+        ('uploaded', 'Uploaded'),
+        ('verified', 'Verified'),
+        ('rejected', 'Rejected'),
+    ]
     branding_request = models.ForeignKey(BrandingRequest, on_delete=models.CASCADE, related_name="files")
-    file = models.FileField(upload_to='branding_uploads/')
+    file = models.FileField(upload_to='branding_uploads/', blank=True)
+    thumbnail = models.ImageField(upload_to='branding_uploads/thumbnails/', null=True, blank=True)
+    
+    # Resumable upload state; upload_id is the client's capability token
+    upload_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    original_name = models.CharField(max_length=255, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.PositiveBigIntegerField(default=0)
+    bytes_received = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+    error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, null=True)
+    
+    def is_settled(self):
+        return self.status in ('verified', 'rejected')
     
     def __str__(self):
         return str(self.branding_request) 
@@ -294,3 +367,76 @@ class PaymentWebhook(models.Model):
     
     def __str__(self):
         return f"{self.webhook_type} - {self.payment.reference_number}"
+    
+
+class SupplierFeedPage(models.Model):
+    """Validators of the last fetch of one supplier feed page"""
+    url = models.URLField(max_length=500, unique=True)
+    etag = models.CharField(max_length=255, blank=True)
+    last_modified = models.CharField(max_length=100, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True)
+    fetched_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return self.url
+
+
+class OrderHistoryEntry(models.Model):
+    """
+    Denormalized order history row, one per order, carrying the latest
+    payment and item count so a customer's history is a single indexed
+    range scan. Maintained by signals on Order, OrderItem and Payment;
+    rebuild with `manage.py rebuild_order_history`.
+    """
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, primary_key=True, related_name='history_entry')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='order_history', null=True)
+    order_number = models.CharField(max_length=200, null=True, blank=True)
+    total_price = models.DecimalField(max_digits=7, decimal_places=2, null=True, blank=True)
+    status = models.CharField(max_length=200, null=True, blank=True)
+    is_paid = models.BooleanField(default=False)
+    payment_method = models.CharField(max_length=200, null=True, blank=True)
+    item_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(null=True, blank=True)
+    latest_payment_id = models.UUIDField(null=True, blank=True)
+    latest_payment_status = models.CharField(max_length=20, null=True, blank=True)
+    latest_payment_reference = models.CharField(max_length=100, null=True, blank=True)
+    latest_payment_created_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-order'], name='order_history_user_created'),
+        ]
+    
+    def __str__(self):
+        return f"{self.order_number} ({self.latest_payment_status or 'unpaid'})"
+
+
+class StockReservation(models.Model):
+    """
+    Time-limited hold on a product's stock for an unpaid order. Placing a
+    hold takes the units off Product.countInStock; payment converts it and
+    the sweeper puts released units back.
+    """
+    STATUS_CHOICES = [
+        ('held', 'Held'),
+        ('converted', 'Converted'),
+        ('released', 'Released'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='held')
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} for {self.order_id} ({self.status})"
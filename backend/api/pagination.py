@@ -1,4 +1,4 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.response import Response 
 
 class CustomPagination(PageNumberPagination):
@@ -14,4 +14,23 @@ class CustomPagination(PageNumberPagination):
             'next':self.get_next_link(),
             'previous':self.get_previous_link(),
             'data':data
-        })
\ No newline at end of file
+        })
+
+
+class OrderHistoryPagination(CursorPagination):
+    """
+    Keyset pages over (user, -created_at, -order); cost stays flat however
+    deep the client scrolls. The order id breaks created_at ties, so orders
+    placed in the same instant keep a stable place across pages.
+    """
+    page_size = 20
+    page_size_query_param = 'limit'
+    max_page_size = 50
+    ordering = ('-created_at', '-order_id')
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'data': data
+        })
@@ -0,0 +1,70 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional accelerator
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional accelerator
+    msgpack = None
+
+# Types orjson handles natively (str, numbers, dict/list and their subclasses,
+# UUID, aware and naive datetimes, dates, times) never reach this fallback;
+# everything else gets the same conversion as DRF's stdlib encoder.
+_fallback = JSONEncoder().default
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Drop-in JSONRenderer that encodes with orjson when it is installed. The
+    bytes are interchangeable with the stdlib renderer's compact output:
+    datetimes end in 'Z' for UTC, Decimals not already coerced to strings by
+    a serializer become floats, and U+2028/U+2029 are escaped. Indented
+    output (`; indent=4`, the browsable API) and installs without orjson go
+    through the stdlib renderer.
+    """
+
+    options = (orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data, default=_fallback, option=self.options)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+def _msgpack_default(obj):
+    # The JSON conversions, so both formats carry the same values
+    value = _fallback(obj)
+    if isinstance(value, tuple):
+        return list(value)
+    return value
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    MessagePack responses for clients that send `Accept: application/msgpack`.
+    Only listed in DEFAULT_RENDERER_CLASSES when msgpack is installed.
+    """
+
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if msgpack is None:
+            raise RuntimeError("MessagePackRenderer requires the msgpack package")
+        return msgpack.packb(data, default=_msgpack_default, use_bin_type=True, datetime=False)
@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer, SerializerMethodField
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from  .models import Categories, Payment, Product, Order, OrderItem, ShippingAddress, SliderData,User,Testimonials, BrandingRequest, BrandingFile
+from  .models import Categories, Payment, Product, Order, OrderItem, Review, ShippingAddress, SliderData,User,Testimonials, BrandingRequest, BrandingFile
 import requests
 from django.core.files.base import ContentFile
 import re
@@ -10,6 +10,11 @@ from django.utils import timezone
 from datetime import datetime, timedelta
 from collections import defaultdict
 import calendar
+from .utils.images import get_many_image_variants, image_variants_payload
+from .utils.media import media_url
+from django.db import transaction
+from .services import InventoryService, InsufficientStock, RegistrationConflict, RegistrationService
+from .utils.pricing import PricingError, current_price, quote_cart
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
@@ -39,9 +44,10 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ["id", "username", "first_name", "last_name", "avatar", "email", "phone_number", "password", "confirm_password", "role","permissions"]
         extra_kwargs = {
             "password": {"write_only": True},
-            "username": {"required": True},
-            "email": {"required": True},
-            "phone_number": {"required": True},
+            # Uniqueness is checked for all identifiers at once in validate()
+            "username": {"required": True, "validators": []},
+            "email": {"required": True, "validators": []},
+            "phone_number": {"required": True, "validators": []},
             "first_name": {"required": True},
             "last_name": {"required": True}
         }
@@ -54,33 +60,18 @@ class UserSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 "Username must be 3-20 characters and can only contain letters, numbers, and underscores"
             )
-        
-        # Check if username already exists
-        if User.objects.filter(username=value).exists():
-            raise serializers.ValidationError("Username already exists")
-        
         return value
 
     def validate_phone_number(self, value):
         # Phone number should be 10 digits
         if not re.match(r'^\d{10}$', value):
             raise serializers.ValidationError("Please enter a valid 10-digit phone number")
-        
-        # Check if phone number already exists
-        if User.objects.filter(phone_number=value).exists():
-            raise serializers.ValidationError("Phone number already registered")
-        
         return value
 
     def validate_email(self, value):
         # Email format validation
         if not re.match(r'^[^\s@]+@[^\s@]+\.[^\s@]+$', value):
             raise serializers.ValidationError("Please enter a valid email address")
-        
-        # Check if email already exists
-        if User.objects.filter(email=value).exists():
-            raise serializers.ValidationError("Email already registered")
-        
         return value
 
     def validate_password(self, value):
@@ -94,12 +85,18 @@ class UserSerializer(serializers.ModelSerializer):
     def validate(self, data):
         if data['password'] != data['confirm_password']:
             raise serializers.ValidationError({"password": "Passwords do not match"})
+        errors = RegistrationService.conflicts(data.get('username'), data.get('email'), data.get('phone_number'))
+        if errors:
+            raise serializers.ValidationError(errors)
         return data
 
     def create(self, validated_data):
         validated_data.pop("confirm_password")
-        user = User.objects.create_user(**validated_data)
-        return user
+        avatar = validated_data.pop("avatar", None)
+        try:
+            return RegistrationService.register(validated_data, avatar=avatar)
+        except RegistrationConflict as e:
+            raise serializers.ValidationError(e.errors)
         
 class ShippingAddressSerializer(serializers.ModelSerializer):
     class Meta:
@@ -153,10 +150,24 @@ class CategorySerializer(ModelSerializer):
         fields = ['id', 'name', 'description', 'slug', 'is_active', 'total_products']
 
     def get_total_products(self, obj):
-        return obj.products.count()  
+        # Views annotate product_count to avoid one COUNT query per category
+        if hasattr(obj, 'product_count'):
+            return obj.product_count
+        return obj.products.count()
         
         
     
+class ProductListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        products = list(data.all() if hasattr(data, 'all') else data)
+        if 'image_variants' in self.child.fields:
+            # One cache round trip for the page instead of one per product
+            self.child.prefetched_variants = get_many_image_variants(
+                product.image.name for product in products if product.image
+            )
+        return super().to_representation(products)
+
+
 class ProductSerializer(serializers.ModelSerializer):
     title = serializers.CharField(required=True)
     category = CategorySerializer(read_only=True)
@@ -167,22 +178,75 @@ class ProductSerializer(serializers.ModelSerializer):
         required=False
     )
     image_url = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
     upload_image_url = serializers.URLField(write_only=True, required=False) 
     image = serializers.ImageField(required=False)
+    rating_histogram = serializers.SerializerMethodField()
+    
+    # Named sparse fieldsets for ?view=; 'detail' is every field
+    VIEWS = {
+        'card': ('id', 'title', 'image_url', 'image_variants', 'brand', 'rating', 'rating_average', 'numReviews',
+                 'countInStock', 'new_price', 'old_price', 'flash_sale', 'flash_sale_price', 'flash_sale_end'),
+        'detail': None,
+    }
+    # Model columns read by output fields whose name is not a column
+    COLUMNS = {
+        'image_url': ('image',),
+        'image_variants': ('image',),
+        'rating_histogram': tuple(f'rating_count_{stars}' for stars in range(1, 6)),
+    }
+    
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+    
+    @classmethod
+    def fieldset(cls, params, default='detail'):
+        """
+        Output fields asked for with ?fields=a,b or ?view=card|detail, or None
+        for all of them. Raises ValidationError for unknown names.
+        """
+        readable = [name for name, field in cls().fields.items() if not field.write_only]
+        if params.get('fields'):
+            fields = [name.strip() for name in params['fields'].split(',') if name.strip()]
+            unknown = sorted(set(fields) - set(readable))
+            if unknown:
+                raise serializers.ValidationError({'fields': [f"Unknown field(s): {', '.join(unknown)}"]})
+            return ['id'] + [name for name in readable if name in fields and name != 'id']
+        view = params.get('view') or default
+        if view not in cls.VIEWS:
+            raise serializers.ValidationError({'view': [f"Expected one of: {', '.join(cls.VIEWS)}"]})
+        return list(cls.VIEWS[view]) if cls.VIEWS[view] is not None else None
+    
+    @classmethod
+    def columns(cls, fields):
+        """Model columns to load with .only() for the given output fields"""
+        columns = {'id'}
+        for name in fields:
+            columns.update(cls.COLUMNS.get(name, (name,)))
+        return sorted(columns)
     
     class Meta:
         model = Product 
         fields = [
-            'id', 'user', 'title', 'image', 'image_url', 'upload_image_url',
+            'id', 'user', 'title', 'image', 'image_url', 'image_variants', 'upload_image_url',
             'brand', 'category', 'category_id', 'description', 'is_active',
-            'rating', 'numReviews', 'countInStock', 'Date_added', 'new_price',
+            'rating', 'numReviews', 'rating_average', 'rating_histogram', 'countInStock', 'Date_added', 'new_price',
             'old_price', 'specs', 'best_seller', 'flash_sale', 
-            'flash_sale_price', 'flash_sale_end'
+            'flash_sale_price', 'flash_sale_start', 'flash_sale_end'
         ]
+        read_only_fields = ['rating_average']
+        list_serializer_class = ProductListSerializer
     
     def validate(self, attrs):
         if attrs.get("image") in ["", None]:
             attrs.pop("image", None)
+        start = attrs.get('flash_sale_start', getattr(self.instance, 'flash_sale_start', None))
+        end = attrs.get('flash_sale_end', getattr(self.instance, 'flash_sale_end', None))
+        if start and end and start >= end:
+            raise serializers.ValidationError({'flash_sale_end': 'Flash sale must end after it starts.'})
         return attrs
     
     def create(self, validated_data):
@@ -196,6 +260,9 @@ class ProductSerializer(serializers.ModelSerializer):
              
         return instance 
     
+    def get_rating_histogram(self, obj):
+        return {str(stars): getattr(obj, f'rating_count_{stars}') for stars in range(1, 6)}
+    
     def get_image_url(self, obj):
         request = self.context.get('request')
         if obj.image and hasattr(obj.image, 'url'):
@@ -204,6 +271,12 @@ class ProductSerializer(serializers.ModelSerializer):
             return obj.image.url
         return None
     
+    def get_image_variants(self, obj):
+        if not obj.image:
+            return None
+        variants = getattr(self, 'prefetched_variants', {}).get(obj.image.name)
+        return image_variants_payload(obj.image.name, self.context.get('request'), variants)
+    
 class OrderItemSerializer(serializers.ModelSerializer):
     product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
     
@@ -211,15 +284,74 @@ class OrderItemSerializer(serializers.ModelSerializer):
         model = OrderItem
         fields = ['id','order', 'product', 'quantity', 'price']      
 
+
+class ProductSummarySerializer(serializers.ModelSerializer):
+    """Compact projection for cart hydration; pass `now` in the context"""
+    price = serializers.SerializerMethodField()
+    on_sale = serializers.SerializerMethodField()
+    available = serializers.SerializerMethodField()
+    image_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Product
+        fields = ['id', 'title', 'image_url', 'price', 'new_price', 'on_sale', 'countInStock', 'available']
+    
+    def get_price(self, obj):
+        price, _ = current_price(obj, self.context['now'])
+        return str(price) if price is not None else None
+    
+    def get_on_sale(self, obj):
+        return current_price(obj, self.context['now'])[1]
+    
+    def get_available(self, obj):
+        # NULL countInStock is untracked stock, which checkout never refuses
+        return bool(obj.is_active and (obj.countInStock is None or obj.countInStock > 0))
+    
+    def get_image_url(self, obj):
+        request = self.context.get('request')
+        if obj.image and hasattr(obj.image, 'url'):
+            if request:
+                return request.build_absolute_uri(obj.image.url)
+            return obj.image.url
+        return None
+
+
+class ReviewSerializer(serializers.ModelSerializer):
+    rating = serializers.IntegerField(min_value=1, max_value=5)
+    comment = serializers.CharField(required=False, allow_blank=True, max_length=5000)
+    
+    class Meta:
+        model = Review
+        fields = ['id', 'name', 'rating', 'comment', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'name', 'created_at', 'updated_at']
+
+
+class CartItemSerializer(serializers.Serializer):
+    """Cart line as sent by the client; any price it carries is ignored"""
+    product = serializers.UUIDField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class CartQuoteSerializer(serializers.Serializer):
+    items = CartItemSerializer(many=True, allow_empty=False)
+
         
 class OrderSerializer(serializers.ModelSerializer):
     # shipping_address_data = serializers.SerializerMethodField(read_only=True)
     shippingAddress = ShippingAddressSerializer()
-    items =  OrderItemSerializer(many=True)
+    # Validated as bare cart lines (no per-line product lookups) and
+    # rendered as stored OrderItems in to_representation
+    items = CartItemSerializer(many=True, write_only=True, allow_empty=False)
     class Meta:
         model = Order 
-        fields = ['id','orderId', 'paymentmethod', 'taxPrice', 'shippingAddress', 'totalPrice', 'isPaid', 'paidAt', 'status', 'isDelivered', 'deliveredAt', 'createdAt', 'items']
+        fields = ['id','orderId', 'paymentmethod', 'taxPrice', 'shippingAddress', 'totalPrice', 'isPaid', 'paidAt', 'status', 'isDelivered', 'deliveredAt', 'createdAt', 'items', 'payment_status']
+        read_only_fields = ['taxPrice', 'totalPrice', 'isPaid', 'paidAt', 'status', 'isDelivered', 'deliveredAt', 'payment_status']
         extra_kwargs = {"user":{"read_only":True}}
+    
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['items'] = OrderItemSerializer(instance.items.all(), many=True).data
+        return data
         
     def create(self, validated_data):
         
@@ -228,10 +360,28 @@ class OrderSerializer(serializers.ModelSerializer):
         
         user = self.context['request'].user
         
-        shipping_address = ShippingAddress.objects.create(user=user, **shipping_data)
-        order = Order.objects.create(user=user,shippingAddress=shipping_address, **validated_data)
-        for item_data in items_data:
-            OrderItem.objects.create(order=order, **item_data)
+        # Totals come from the catalog, never from the client
+        try:
+            quote = quote_cart(items_data)
+        except PricingError as e:
+            raise serializers.ValidationError({'items': e.errors})
+        shipping_data['shippingPrice'] = quote.shipping
+        
+        try:
+            with transaction.atomic():
+                shipping_address = ShippingAddress.objects.create(user=user, **shipping_data)
+                order = Order.objects.create(
+                    user=user, shippingAddress=shipping_address,
+                    taxPrice=quote.tax, totalPrice=quote.total, **validated_data
+                )
+                OrderItem.objects.bulk_create([
+                    OrderItem(order=order, product=line.product, quantity=line.quantity, price=line.unit_price)
+                    for line in quote.lines
+                ])
+                # Hold the stock until payment; nothing is created if any item is short
+                InventoryService.reserve(order)
+        except InsufficientStock as e:
+            raise serializers.ValidationError({'items': [f"Not enough stock for product {e.product_id}"]})
             
         # shipping_address = user.shipping_addresses.first()
         # if shipping_address:
@@ -250,10 +400,25 @@ class OrderSerializer(serializers.ModelSerializer):
     #     return None
     
 class TestimonialsSerializer(serializers.ModelSerializer):
-    user = UserProfileSerializer(read_only=True)
+    """Public homepage projection; expects select_related('user')"""
+    name = serializers.SerializerMethodField()
+    avatar_url = serializers.SerializerMethodField()
+    
     class Meta:
         model = Testimonials
-        fields = "__all__"
+        fields = ['id', 'name', 'avatar_url', 'position', 'rating', 'comment']
+    
+    def get_name(self, obj):
+        if obj.user is None:
+            return None
+        return f"{obj.user.first_name or ''} {obj.user.last_name or ''}".strip() or obj.user.username
+    
+    def get_avatar_url(self, obj):
+        if obj.user is None or not obj.user.avatar:
+            return None
+        request = self.context.get('request')
+        url = obj.user.avatar.url
+        return request.build_absolute_uri(url) if request else url
         
 class SliderDataSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
@@ -280,13 +445,20 @@ class SliderDataSerializer(serializers.ModelSerializer):
         return None
     
 class BrandingFileSerializer(serializers.ModelSerializer):
+    url = serializers.SerializerMethodField()
     class Meta:
         model = BrandingFile
-        fields = ['file']  
+        fields = ['file', 'url']
+        extra_kwargs = {"file": {"write_only": True}}
+        
+    def get_url(self, obj):
+        return media_url(obj.file, self.context.get('request'))
+
 class BrandingRequestSerializer(serializers.ModelSerializer):
     class Meta:
         model = BrandingRequest 
         fields = '__all__'
+        read_only_fields = ['status', 'finalized_at']
         
 class DashboardStatsSerializer(serializers.Serializer):
     total_revenue = serializers.DecimalField(max_digits=10, decimal_places=2)
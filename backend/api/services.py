@@ -7,11 +7,33 @@ from django.utils import timezone
 import stripe
 import secrets
 import string
-from .models import Payment, User, Order, Categories, Product
-from django.db.models import Sum, Count, Q, F
+from .models import (Payment, User, Order, Categories, Product, BrandingRequest, BrandingFile,
+                     OrderHistoryEntry, StockReservation, Review)
+from django.db.models import Sum, Count, Q, F, OuterRef, Subquery, Value, DecimalField, FloatField, IntegerField
+from django.db.models.functions import Cast, Coalesce, Greatest, NullIf, Round
 from collections import defaultdict
 import calendar
+import logging
+import os
+from io import BytesIO
+from PIL import Image
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.core.cache import cache
+import httpx
+from asgiref.sync import sync_to_async
 from rest_framework.response import Response 
+from .utils.payment_events import publish_payment_status
+from .utils import catalog_version
+from .utils.http_client import async_client
+
+logger = logging.getLogger(__name__)
+
+MPESA_TOKEN_CACHE_KEY = 'mpesa_access_token'
+MPESA_TIMEOUT = 30
 
 class MPesaService:
     def __init__(self):
@@ -21,13 +43,15 @@ class MPesaService:
         self.pass_key = settings.MPESA_CONFIG['MPESA_PASSKEY']
         self.callback_url = settings.MPESA_CONFIG['MPESA_CALLBACK_URL']
         
-        if settings.MPESA_CONFIG['ENVIRONMENT'] == 'sandbox':
+        if settings.MPESA_CONFIG['ENVIRONMENT'] == 'simulator':
+            self.base_url = settings.MPESA_CONFIG['SIMULATOR_URL']
+        elif settings.MPESA_CONFIG['ENVIRONMENT'] == 'sandbox':
             self.base_url = settings.MPESA_CONFIG['SANDBOX_URL']
         else:
             self.base_url = settings.MPESA_CONFIG['PRODUCTION_URL']
     
-    def get_access_token(self):
-        """Get OAuth access token from Safaricom API"""
+    def token_request(self):
+        """URL and headers of the OAuth token request"""
         api_url = f"{self.base_url}/oauth/v1/generate?grant_type=client_credentials"
         
         # Create basic auth header
@@ -39,13 +63,46 @@ class MPesaService:
             'Authorization': f'Basic {auth_b64}',
             'Content-Type': 'application/json'
         }
+        return api_url, headers
+    
+    def get_access_token(self):
+        """Get OAuth access token from Safaricom API"""
+        token = cache.get(MPESA_TOKEN_CACHE_KEY)
+        if token:
+            return token
         
+        api_url, headers = self.token_request()
         try:
-            response = requests.get(api_url, headers=headers)
+            response = requests.get(api_url, headers=headers, timeout=MPESA_TIMEOUT)
             response.raise_for_status()
-            return response.json()['access_token']
+            data = response.json()
         except requests.exceptions.RequestException as e:
             raise Exception(f"Failed to get M-Pesa access token: {str(e)}")
+        
+        cache.set(MPESA_TOKEN_CACHE_KEY, data['access_token'], self.token_timeout(data))
+        return data['access_token']
+    
+    async def aget_access_token(self):
+        """Async get_access_token using httpx"""
+        token = await cache.aget(MPESA_TOKEN_CACHE_KEY)
+        if token:
+            return token
+        
+        api_url, headers = self.token_request()
+        try:
+            response = await async_client().get(api_url, headers=headers, timeout=MPESA_TIMEOUT)
+            response.raise_for_status()
+            data = response.json()
+        except httpx.HTTPError as e:
+            raise Exception(f"Failed to get M-Pesa access token: {str(e)}")
+        
+        await cache.aset(MPESA_TOKEN_CACHE_KEY, data['access_token'], self.token_timeout(data))
+        return data['access_token']
+    
+    @staticmethod
+    def token_timeout(data):
+        # Tokens live for expires_in seconds (3599); renew a minute early
+        return max(int(data.get('expires_in', 3599)) - 60, 0)
     
     def generate_password(self):
         """Generate password for M-Pesa API"""
@@ -54,12 +111,25 @@ class MPesaService:
         password = base64.b64encode(password_string.encode()).decode('utf-8')
         return password, timestamp
     
+    def stk_push_payload(self, phone_number, amount, account_reference, transaction_desc):
+        password, timestamp = self.generate_password()
+        return {
+            'BusinessShortCode': self.business_short_code,
+            'Password': password,
+            'Timestamp': timestamp,
+            'TransactionType': 'CustomerBuyGoodsOnline',
+            'Amount': int(float(amount)),
+            'PartyA': phone_number,
+            'PartyB': 6694920,
+            'PhoneNumber': phone_number,
+            'CallBackURL': self.callback_url,
+            'AccountReference': account_reference,
+            'TransactionDesc': transaction_desc
+        }
+    
     def initiate_stk_push(self, phone_number, amount, account_reference, transaction_desc):
         """Initiate STK Push for M-Pesa payment"""
         access_token = self.get_access_token()
-        print("access_token", access_token)
-        
-        password, timestamp = self.generate_password()
         
         api_url = f"{self.base_url}/mpesa/stkpush/v1/processrequest"
         
@@ -68,55 +138,103 @@ class MPesaService:
             'Content-Type': 'application/json'
         }
         
+        payload = self.stk_push_payload(phone_number, amount, account_reference, transaction_desc)
+        try:
+            response = requests.post(api_url, json=payload, headers=headers, timeout=MPESA_TIMEOUT)
+            response.raise_for_status()
+            return response.json()
+           
+        except requests.exceptions.HTTPError as e:
+            print("HTTPError:", e.response.status_code, e.response.text)
+            raise Exception(f"Safaricom Error: {e.response.text}")
+    
+    async def ainitiate_stk_push(self, phone_number, amount, account_reference, transaction_desc):
+        """Async initiate_stk_push using httpx"""
+        access_token = await self.aget_access_token()
+        
+        api_url = f"{self.base_url}/mpesa/stkpush/v1/processrequest"
+        headers = {
+            'Authorization': f'Bearer {access_token}',
+            'Content-Type': 'application/json'
+        }
+        payload = self.stk_push_payload(phone_number, amount, account_reference, transaction_desc)
+        response = await async_client().post(api_url, json=payload, headers=headers, timeout=MPESA_TIMEOUT)
+        if response.is_error:
+            raise Exception(f"Safaricom Error: {response.text}")
+        return response.json()
+
+    def query_stk_push(self, checkout_request_id):
+        """Query the result of an STK Push"""
+        access_token = self.get_access_token()
+        password, timestamp = self.generate_password()
+
+        api_url = f"{self.base_url}/mpesa/stkpushquery/v1/query"
+        headers = {
+            'Authorization': f'Bearer {access_token}',
+            'Content-Type': 'application/json'
+        }
         payload = {
             'BusinessShortCode': self.business_short_code,
             'Password': password,
             'Timestamp': timestamp,
-            'TransactionType': 'CustomerBuyGoodsOnline',
-            'Amount': int(float(amount)),
-            'PartyA': phone_number,
-            'PartyB': 6694920,
-            'PhoneNumber': phone_number,
-            'CallBackURL': self.callback_url,
-            'AccountReference': account_reference,
-            'TransactionDesc': transaction_desc
-        }      
+            'CheckoutRequestID': checkout_request_id
+        }
         try:
-            response = requests.post(api_url, json=payload, headers=headers)
+            response = requests.post(api_url, json=payload, headers=headers, timeout=MPESA_TIMEOUT)
             response.raise_for_status()
             return response.json()
-           
         except requests.exceptions.HTTPError as e:
-            print("HTTPError:", e.response.status_code, e.response.text)
             raise Exception(f"Safaricom Error: {e.response.text}")
 
+
+# httpx-backed client so the *_async methods don't block the event loop;
+# installed once, since it holds the connection pools every request shares.
+# allow_sync_methods keeps the sync calls (pay_for_order, webhooks) working.
+stripe.default_http_client = stripe.HTTPXClient(allow_sync_methods=True)
+
+
 class StripeService:
     def __init__(self):
         stripe.api_key = settings.STRIPE_CONFIG['STRIPE_SECRET_KEY']
+        if settings.STRIPE_CONFIG.get('API_BASE'):
+            stripe.api_base = settings.STRIPE_CONFIG['API_BASE']
+    
+    def payment_intent_data(self, amount, currency='usd', customer_email=None):
+        # Convert amount to cents for Stripe
+        amount_cents = int(float(amount) * 100)
+        
+        intent_data = {
+            'amount': amount_cents,
+            'currency': currency,
+            'automatic_payment_methods': {
+                'enabled': True,
+            },
+        }
+        
+        if customer_email:
+            intent_data['receipt_email'] = customer_email
+        return intent_data
     
     def create_payment_intent(self, amount, currency='usd', customer_email=None):
         """Create a Stripe Payment Intent"""
         try:
-            # Convert amount to cents for Stripe
-            amount_cents = int(float(amount) * 100)
-            
-            intent_data = {
-                'amount': amount_cents,
-                'currency': currency,
-                'automatic_payment_methods': {
-                    'enabled': True,
-                },
-            }
-            
-            if customer_email:
-                intent_data['receipt_email'] = customer_email
-            
-            intent = stripe.PaymentIntent.create(**intent_data)
+            intent = stripe.PaymentIntent.create(
+                **self.payment_intent_data(amount, currency, customer_email)
+            )
             return intent
             
         except stripe.error.StripeError as e:
             raise Exception(f"Failed to create Stripe payment intent: {str(e)}")
     
+    async def acreate_payment_intent(self, amount, currency='usd', customer_email=None):
+        """Async create_payment_intent"""
+        try:
+            return await stripe.PaymentIntent.create_async(
+                **self.payment_intent_data(amount, currency, customer_email)
+            )
+        except stripe.error.StripeError as e:
+            raise Exception(f"Failed to create Stripe payment intent: {str(e)}")
+    
     def confirm_payment_intent(self, payment_intent_id):
         """Confirm a payment intent and get its status"""
         try:
@@ -124,6 +242,10 @@ class StripeService:
             return intent
         except stripe.error.StripeError as e:
             raise Exception(f"Failed to retrieve payment intent: {str(e)}")
+    
+    async def aretrieve_payment_intent(self, payment_intent_id):
+        """Async retrieve of a payment intent; Stripe errors propagate"""
+        return await stripe.PaymentIntent.retrieve_async(payment_intent_id)
 
 class PaymentService:
     def __init__(self):
@@ -152,8 +274,48 @@ class PaymentService:
             raise ValueError("Invalid phone number format")
         
         
-    def create_order_payment(self, order_id, payment_method, phone_number=None):
-        order = Order.objects.get(orderId=order_id)
+    @staticmethod
+    def latest_payment_subquery():
+        return Payment.objects.filter(order=OuterRef('pk')).order_by('-created_at')
+
+    def record_payment(self, payment, created=False, update_fields=None):
+        """
+        Save a payment and keep its order's latest_payment/payment_status in
+        step, in one transaction. A new payment becomes the order's latest;
+        a status change only touches the order while it is still the latest.
+        """
+        with transaction.atomic():
+            payment.save(force_insert=created, update_fields=update_fields)
+            if payment.order_id:
+                orders = Order.objects.filter(id=payment.order_id)
+                if created:
+                    orders.update(latest_payment=payment, payment_status=payment.status)
+                else:
+                    orders.filter(latest_payment=payment).update(payment_status=payment.status)
+        return payment
+
+    def latest_payment_drift(self, chunk_size=2000):
+        """Yield (order_id, stored, actual) for orders whose pointer disagrees with their payments"""
+        latest = self.latest_payment_subquery()
+        orders = Order.objects.annotate(
+            actual_id=Subquery(latest.values('id')[:1]),
+            actual_status=Subquery(latest.values('status')[:1]),
+        ).values_list('id', 'latest_payment_id', 'payment_status', 'actual_id', 'actual_status')
+        for order_id, stored_id, stored_status, actual_id, actual_status in orders.iterator(chunk_size=chunk_size):
+            if (stored_id, stored_status) != (actual_id, actual_status):
+                yield order_id, (stored_id, stored_status), (actual_id, actual_status)
+
+    def repair_latest_payment(self, order_ids):
+        """Recompute latest_payment/payment_status for the given orders"""
+        latest = self.latest_payment_subquery()
+        return Order.objects.filter(id__in=order_ids).update(
+            latest_payment=Subquery(latest.values('id')[:1]),
+            payment_status=Subquery(latest.values('status')[:1]),
+        )
+
+    def create_order_payment(self, order_id, payment_method, phone_number=None, order=None):
+        if order is None:
+            order = Order.objects.select_related('user').get(orderId=order_id)
 
         if payment_method == "mpesa":
             return self.create_mpesa_payment(
@@ -183,7 +345,7 @@ class PaymentService:
             reference = self.generate_reference_number()
             
             # Create payment record
-            payment = Payment.objects.create(
+            payment = self.record_payment(Payment(
                 user=user,
                 amount=amount,
                 order=order,
@@ -192,7 +354,7 @@ class PaymentService:
                 description=description,
                 reference_number=reference,
                 mpesa_phone_number=formatted_phone
-            )
+            ), created=True)
             
             # Initiate STK push
             mpesa_response = self.mpesa_service.initiate_stk_push(
@@ -206,7 +368,7 @@ class PaymentService:
             if mpesa_response.get('ResponseCode') == '0':
                 payment.mpesa_checkout_request_id = mpesa_response.get('CheckoutRequestID')
                 payment.status = 'processing'
-                payment.save()
+                self.record_payment(payment)
                 
                 return {
                     'success': True,
@@ -218,7 +380,7 @@ class PaymentService:
             else:
                 payment.status = 'failed'
                 payment.callback_data = mpesa_response
-                payment.save()
+                self.record_payment(payment)
                 
                 return {
                     'success': False,
@@ -238,7 +400,7 @@ class PaymentService:
             reference = self.generate_reference_number()
             
             # Create payment record
-            payment = Payment.objects.create(
+            payment = self.record_payment(Payment(
                 user=user,
                 amount=amount,
                 order=order,
@@ -246,14 +408,20 @@ class PaymentService:
                 payment_method='visa',
                 status='pending',
                 reference_number=reference
-            )
+            ), created=True)
             
             # Create Stripe payment intent
-            intent = self.stripe_service.create_payment_intent(
-                amount=amount,
-                currency=currency,
-                customer_email=customer_email
-            )
+            try:
+                intent = self.stripe_service.create_payment_intent(
+                    amount=amount,
+                    currency=currency,
+                    customer_email=customer_email
+                )
+            except Exception:
+                # Don't leave a pending payment behind as the order's latest
+                payment.status = 'failed'
+                self.record_payment(payment, update_fields=['status', 'updated_at'])
+                raise
             
             # Update payment with Stripe data
             payment.stripe_payment_intent_id = intent.id
@@ -273,6 +441,104 @@ class PaymentService:
                 'message': str(e)
             }
     
+    async def acreate_mpesa_payment(self, user, amount, phone_number, description="Payment", order=None):
+        """Async create_mpesa_payment: async ORM and httpx, no thread held while waiting"""
+        try:
+            formatted_phone = self.format_phone_number(phone_number)
+            reference = self.generate_reference_number()
+            
+            payment = await sync_to_async(self.record_payment)(Payment(
+                user=user,
+                amount=amount,
+                order=order,
+                payment_method='mpesa',
+                status='pending',
+                description=description,
+                reference_number=reference,
+                mpesa_phone_number=formatted_phone
+            ), created=True)
+            
+            mpesa_response = await self.mpesa_service.ainitiate_stk_push(
+                phone_number=formatted_phone,
+                amount=amount,
+                account_reference=reference,
+                transaction_desc=description
+            )
+            
+            if mpesa_response.get('ResponseCode') == '0':
+                payment.mpesa_checkout_request_id = mpesa_response.get('CheckoutRequestID')
+                payment.status = 'processing'
+                await sync_to_async(self.record_payment)(
+                    payment, update_fields=['mpesa_checkout_request_id', 'status', 'updated_at']
+                )
+                
+                return {
+                    'success': True,
+                    'payment_id': str(payment.id),
+                    'reference': reference,
+                    'checkout_request_id': mpesa_response.get('CheckoutRequestID'),
+                    'message': 'Payment initiated. Please complete on your phone.'
+                }
+            
+            payment.status = 'failed'
+            payment.callback_data = mpesa_response
+            await sync_to_async(self.record_payment)(
+                payment, update_fields=['status', 'callback_data', 'updated_at']
+            )
+            return {
+                'success': False,
+                'message': mpesa_response.get('errorMessage', 'Payment initiation failed')
+            }
+                
+        except Exception as e:
+            return {
+                'success': False,
+                'message': str(e)
+            }
+    
+    async def acreate_stripe_payment(self, user, amount, currency='usd', customer_email=None, order=None):
+        """Async create_stripe_payment"""
+        try:
+            reference = self.generate_reference_number()
+            
+            payment = await sync_to_async(self.record_payment)(Payment(
+                user=user,
+                amount=amount,
+                order=order,
+                currency=currency.upper(),
+                payment_method='visa',
+                status='pending',
+                reference_number=reference
+            ), created=True)
+            
+            try:
+                intent = await self.stripe_service.acreate_payment_intent(
+                    amount=amount,
+                    currency=currency,
+                    customer_email=customer_email
+                )
+            except Exception:
+                payment.status = 'failed'
+                await sync_to_async(self.record_payment)(payment, update_fields=['status', 'updated_at'])
+                raise
+            
+            payment.stripe_payment_intent_id = intent.id
+            await payment.asave(update_fields=['stripe_payment_intent_id', 'updated_at'])
+            
+            return {
+                'success': True,
+                'payment_id': str(payment.id),
+                'reference': reference,
+                'client_secret': intent.client_secret,
+                'payment_intent_id': intent.id
+            }
+            
+        except Exception as e:
+            return {
+                'success': False,
+                'message': str(e)
+            }
+    
     def process_mpesa_callback(self, callback_data):
         """Process M-Pesa callback data"""
         try:
@@ -289,6 +555,10 @@ class PaymentService:
             if not payment:
                 return False
             
+            # Safaricom retries callbacks; a repeat must not pay the order twice
+            if payment.status == 'completed':
+                return True
+            
             # Update payment based on callback
             stk_callback = callback_data.get('Body', {}).get('stkCallback', {})
             result_code = stk_callback.get('ResultCode')
@@ -305,17 +575,23 @@ class PaymentService:
                 
                 payment.status = 'completed'
                 payment.completed_at = timezone.now()
-                if payment.order:
-                    payment.order.isPaid = True
-                    payment.order.paidAt = timezone.now()
-                    payment.order.status = 'processing'
-                    payment.order.save()
             else:
                 # Payment failed
                 payment.status = 'failed'
             
             payment.callback_data = callback_data
-            payment.save()
+            with transaction.atomic():
+                # Re-checked under the row lock, for a repeat racing the first callback
+                if Payment.objects.select_for_update().filter(pk=payment.pk, status='completed').exists():
+                    return True
+                if payment.status == 'completed' and payment.order:
+                    payment.order.isPaid = True
+                    payment.order.paidAt = timezone.now()
+                    payment.order.status = 'processing'
+                    payment.order.save(update_fields=['isPaid', 'paidAt', 'status'])
+                    InventoryService.convert(payment.order_id)
+                self.record_payment(payment)
+                publish_payment_status(payment)
             
             return True
             
@@ -336,6 +612,10 @@ class PaymentService:
             if not payment:
                 return False
             
+            # Stripe retries webhooks; a repeat must not pay the order twice
+            if payment.status == 'completed':
+                return True
+            
             event_type = webhook_data.get('type')
             
             if event_type == 'payment_intent.succeeded':
@@ -359,7 +639,14 @@ class PaymentService:
                 payment.status = 'failed'
             
             payment.callback_data = webhook_data
-            payment.save()
+            with transaction.atomic():
+                # Re-checked under the row lock, for a repeat racing the first webhook
+                if Payment.objects.select_for_update().filter(pk=payment.pk, status='completed').exists():
+                    return True
+                if payment.status == 'completed' and payment.order_id:
+                    InventoryService.convert(payment.order_id)
+                self.record_payment(payment)
+                publish_payment_status(payment)
             
             return True
             
@@ -529,4 +816,679 @@ class DashboardAnalyticsService:
     @staticmethod
     def get_recent_orders(limit=5):
         """Get recent orders"""
-        return Order.objects.select_related('user').order_by('-createdAt')[:limit]
\ No newline at end of file
+        return Order.objects.select_related('user').order_by('-createdAt')[:limit]
+
+
+class OrderHistoryService:
+    """Maintains the OrderHistoryEntry read model behind the order history endpoint"""
+
+    @staticmethod
+    def entry_values(order, latest_payment, item_count):
+        return {
+            'user_id': order.user_id,
+            'order_number': order.orderId,
+            'total_price': order.totalPrice,
+            'status': order.status,
+            'is_paid': order.isPaid,
+            'payment_method': order.paymentmethod,
+            'item_count': item_count or 0,
+            'created_at': order.createdAt,
+            'latest_payment_id': latest_payment.id if latest_payment else None,
+            'latest_payment_status': latest_payment.status if latest_payment else None,
+            'latest_payment_reference': latest_payment.reference_number if latest_payment else None,
+            'latest_payment_created_at': latest_payment.created_at if latest_payment else None,
+        }
+
+    @classmethod
+    def refresh(cls, order_id):
+        """Recompute one order's entry; drops it if the order is gone"""
+        order = (Order.objects.filter(id=order_id).select_related('latest_payment')
+                 .annotate(item_total=Sum('items__quantity')).first())
+        if order is None:
+            OrderHistoryEntry.objects.filter(order_id=order_id).delete()
+            return None
+        entry, _ = OrderHistoryEntry.objects.update_or_create(
+            order_id=order_id,
+            defaults=cls.entry_values(order, order.latest_payment, order.item_total),
+        )
+        return entry
+
+    @classmethod
+    def rebuild(cls, batch_size=500):
+        """Recompute every entry in batches; returns the number written"""
+        written = 0
+        ids = list(Order.objects.order_by('id').values_list('id', flat=True))
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            orders = Order.objects.filter(id__in=batch).annotate(item_total=Sum('items__quantity'))
+            latest = {}
+            for payment in Payment.objects.filter(order_id__in=batch).order_by('order_id', '-created_at'):
+                latest.setdefault(payment.order_id, payment)
+            entries = [
+                OrderHistoryEntry(order_id=order.id, **cls.entry_values(order, latest.get(order.id), order.item_total))
+                for order in orders
+            ]
+            with transaction.atomic():
+                OrderHistoryEntry.objects.filter(order_id__in=batch).delete()
+                OrderHistoryEntry.objects.bulk_create(entries)
+            written += len(entries)
+        return written
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id, requested):
+        self.product_id = product_id
+        self.requested = requested
+        super().__init__(f"Only limited stock left for product {product_id}; requested {requested}")
+
+
+class InventoryService:
+    """
+    Checkout stock holds. Product.countInStock is what is still available to
+    sell: a hold takes its units with a conditional UPDATE (so concurrent
+    checkouts of the same SKU can never drive it below zero), payment
+    converts the hold, and the sweeper returns units of expired holds.
+    Every status change is a conditional UPDATE too, so a hold is released
+    or converted exactly once even when the sweeper and a callback race.
+    """
+
+    @staticmethod
+    def get_config():
+        config = getattr(settings, 'INVENTORY_RESERVATIONS', {})
+        return {
+            'HOLD_FOR': config.get('HOLD_FOR', timedelta(minutes=15)),
+            'FAILED_PAYMENT_GRACE': config.get('FAILED_PAYMENT_GRACE', timedelta(minutes=5)),
+        }
+
+    @staticmethod
+    def take_stock(product_id, quantity):
+        # NULL countInStock means stock is not tracked: always taken, and stays NULL
+        in_stock = Q(countInStock__gte=quantity) | Q(countInStock__isnull=True)
+        products = Product.objects.filter(id=product_id)
+        with transaction.atomic():
+            taken = products.filter(in_stock).update(
+                countInStock=F('countInStock') - quantity, updated_at=timezone.now()
+            ) == 1
+            # Cached catalog pages only go stale when the product sells out;
+            # the row stays locked until commit, so this reads our own update
+            if taken and products.filter(countInStock=0).exists():
+                catalog_version.bump('products')
+        return taken
+
+    @staticmethod
+    def return_stock(product_id, quantity):
+        products = Product.objects.filter(id=product_id)
+        with transaction.atomic():
+            products.update(countInStock=F('countInStock') + quantity, updated_at=timezone.now())
+            # Back in stock only if it was sold out before these units came back
+            if products.filter(countInStock__gt=0, countInStock__lte=quantity).exists():
+                catalog_version.bump('products')
+
+    @staticmethod
+    def transition(reservation_id, from_status, to_status, *conditions):
+        return StockReservation.objects.filter(
+            *conditions, pk=reservation_id, status=from_status
+        ).update(status=to_status, updated_at=timezone.now()) == 1
+
+    @classmethod
+    def reserve(cls, order):
+        """Hold stock for every item of the order, all or nothing; raises InsufficientStock"""
+        quantities = defaultdict(int)
+        for product_id, quantity in order.items.values_list('product_id', 'quantity'):
+            quantities[product_id] += quantity
+        expires_at = timezone.now() + cls.get_config()['HOLD_FOR']
+
+        with transaction.atomic():
+            # Same row order in every checkout, so two carts sharing SKUs cannot deadlock
+            for product_id in sorted(quantities, key=str):
+                if quantities[product_id] and not cls.take_stock(product_id, quantities[product_id]):
+                    raise InsufficientStock(product_id, quantities[product_id])
+            return StockReservation.objects.bulk_create([
+                StockReservation(order=order, product_id=product_id, quantity=quantity, expires_at=expires_at)
+                for product_id, quantity in quantities.items() if quantity
+            ])
+
+    @classmethod
+    def ensure_reserved(cls, order):
+        """Before a payment attempt: extend the order's holds, or place them again if released"""
+        if order.isPaid or order.reservations.filter(status='converted').exists():
+            return
+        expires_at = timezone.now() + cls.get_config()['HOLD_FOR']
+        if not order.reservations.filter(status='held').update(expires_at=expires_at):
+            cls.reserve(order)
+
+    @classmethod
+    def convert(cls, order_id):
+        """Mark the order's holds as sold; holds released in the meantime take their stock again"""
+        reservations = StockReservation.objects.filter(order_id=order_id, status__in=['held', 'released'])
+        for reservation in reservations.values_list('pk', 'product_id', 'quantity', named=True):
+            if cls.transition(reservation.pk, 'held', 'converted'):
+                continue
+            if cls.transition(reservation.pk, 'released', 'converted'):
+                if not cls.take_stock(reservation.product_id, reservation.quantity):
+                    logger.error(
+                        "Order %s was paid after its hold expired and product %s is sold out; "
+                        "%s unit(s) oversold", order_id, reservation.product_id, reservation.quantity
+                    )
+
+    @classmethod
+    def release(cls, reservations, *conditions):
+        released = 0
+        for reservation in reservations.values_list('pk', 'product_id', 'quantity', named=True):
+            with transaction.atomic():
+                if cls.transition(reservation.pk, 'held', 'released', *conditions):
+                    cls.return_stock(reservation.product_id, reservation.quantity)
+                    released += 1
+        return released
+
+    @classmethod
+    def release_order(cls, order_id):
+        return cls.release(StockReservation.objects.filter(order_id=order_id, status='held'))
+
+    @classmethod
+    def release_expired(cls):
+        """Sweeper: release holds past expiry, or whose order's payment failed a while ago"""
+        now = timezone.now()
+        due = Q(expires_at__lt=now) | Q(
+            order__payment_status__in=['failed', 'cancelled'],
+            order__latest_payment__updated_at__lt=now - cls.get_config()['FAILED_PAYMENT_GRACE'],
+        )
+        # `due` is re-checked per row, so a hold extended meanwhile is kept
+        return cls.release(StockReservation.objects.filter(due, status='held'), due)
+
+
+class ReviewService:
+    """
+    Keeps Product.rating, numReviews, rating_average and the per-star
+    histogram in step with Review rows. Every change is an F() update in the
+    same transaction as the review write, so list pages read ratings
+    straight off the product row and concurrent reviews never lose a count.
+    numReviews and the averages are derived from the histogram, which makes
+    the first local review replace any imported figures.
+    """
+
+    STARS = range(1, 6)
+
+    @staticmethod
+    def count_field(stars):
+        return f'rating_count_{stars}'
+
+    @classmethod
+    def review_count(cls):
+        total = F(cls.count_field(1))
+        for stars in cls.STARS[1:]:
+            total = total + F(cls.count_field(stars))
+        return total
+
+    @classmethod
+    def refresh_averages(cls, products):
+        """Recompute numReviews and the averages from each row's own histogram"""
+        # A float quotient: SQLite keeps an integer cast to NUMERIC an integer
+        # and would truncate the division. Round() hands PostgreSQL a numeric.
+        average = Coalesce(
+            Round(Cast(F('rating_total'), FloatField()) / NullIf(cls.review_count(), 0), 2),
+            Value(0), output_field=DecimalField(max_digits=3, decimal_places=2),
+        )
+        catalog_version.bump('products')
+        return products.update(
+            numReviews=cls.review_count(),
+            rating_average=average,
+            rating=Cast(Round(average), IntegerField()),
+            updated_at=timezone.now(),
+        )
+
+    @classmethod
+    def apply(cls, product_id, added=None, removed=None):
+        """Move one rating into and/or out of the product's aggregates"""
+        if product_id is None or added == removed:
+            return
+        changes = {}
+        total = F('rating_total')
+        if added:
+            changes[cls.count_field(added)] = F(cls.count_field(added)) + 1
+            total = total + added
+        if removed:
+            # Floored at zero: a drifted row waits for recompute() rather than failing the write
+            changes[cls.count_field(removed)] = Greatest(F(cls.count_field(removed)) - 1, 0)
+            total = total - removed
+        products = Product.objects.filter(id=product_id)
+        with transaction.atomic(savepoint=False):
+            products.update(rating_total=Greatest(total, 0), **changes)
+            cls.refresh_averages(products)
+
+    @classmethod
+    def submit(cls, user, product, rating, comment=''):
+        """Create the user's review of the product, or replace it; returns (review, created)"""
+        try:
+            return cls.write(user, product, rating, comment)
+        except IntegrityError:
+            # A concurrent first submission inserted the row after our lookup; replace that one
+            return cls.write(user, product, rating, comment)
+
+    @classmethod
+    def write(cls, user, product, rating, comment):
+        with transaction.atomic():
+            review = Review.objects.select_for_update().filter(product=product, user=user).first()
+            created = review is None
+            previous = None if created else review.rating
+            if created:
+                review = Review(product=product, user=user)
+            review.name = user.first_name or user.username
+            review.rating = rating
+            review.comment = comment
+            review.save()
+            cls.apply(product.id, added=rating, removed=previous if previous in cls.STARS else None)
+        return review, created
+
+    @classmethod
+    def delete(cls, review):
+        with transaction.atomic():
+            rating = review.rating
+            if Review.objects.filter(pk=review.pk).delete()[0] and rating in cls.STARS:
+                cls.apply(review.product_id, removed=rating)
+
+    @classmethod
+    def recompute(cls, batch_size=500):
+        """
+        Rebuild every reviewed product's aggregates from its Review rows, for
+        drift from bulk edits or admin deletes. Products without reviews keep
+        their imported figures. Returns the number of products rewritten.
+        """
+        def rating_sum(value, stars=None):
+            reviews = Review.objects.filter(product=OuterRef('pk'), rating__gte=1, rating__lte=5)
+            if stars:
+                reviews = reviews.filter(rating=stars)
+            return Coalesce(Subquery(
+                reviews.order_by().values('product').annotate(value=value).values('value')
+            ), 0)
+
+        has_counts = Q()
+        for stars in cls.STARS:
+            has_counts |= Q(**{f'{cls.count_field(stars)}__gt': 0})
+        ids = list(Product.objects.filter(Q(id__in=Review.objects.values('product_id')) | has_counts)
+                   .order_by().values_list('id', flat=True))
+        updated = 0
+        for start in range(0, len(ids), batch_size):
+            products = Product.objects.filter(id__in=ids[start:start + batch_size])
+            with transaction.atomic():
+                updated += products.update(
+                    rating_total=rating_sum(Sum('rating')),
+                    **{cls.count_field(stars): rating_sum(Count('id'), stars) for stars in cls.STARS},
+                )
+                cls.refresh_averages(products)
+        return updated
+
+
+class RegistrationConflict(Exception):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(errors.values()))
+
+
+class RegistrationService:
+    """
+    Sign-up without per-field round trips: one query finds every identifier
+    already taken, the unique constraints catch anything that races past
+    it, and the avatar is resized by a worker after the account exists.
+    """
+
+    MESSAGES = {
+        'username': "Username already exists",
+        'email': "Email already registered",
+        'phone_number': "Phone number already registered",
+    }
+
+    @classmethod
+    def conflicts(cls, username=None, email=None, phone_number=None):
+        """{field: message} for the identifiers another account already uses"""
+        wanted = {
+            'username': username,
+            'email': User.objects.normalize_email(email) if email else None,
+            'phone_number': phone_number,
+        }
+        match = Q()
+        for field, value in wanted.items():
+            if value:
+                match |= Q(**{field: value})
+        if not match:
+            return {}
+
+        errors = {}
+        for row in User.objects.filter(match).values(*wanted)[:len(wanted)]:
+            for field, value in wanted.items():
+                if value and row[field] == value:
+                    errors[field] = cls.MESSAGES[field]
+        return errors
+
+    @classmethod
+    def register(cls, validated_data, avatar=None):
+        """Create the account; raises RegistrationConflict if an identifier was taken meanwhile"""
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(**validated_data)
+        except IntegrityError:
+            errors = cls.conflicts(
+                validated_data.get('username'), validated_data.get('email'), validated_data.get('phone_number')
+            )
+            if not errors:
+                raise
+            raise RegistrationConflict(errors)
+        if avatar:
+            cls.stage_avatar(user, avatar)
+        return user
+
+    @staticmethod
+    def stage_avatar(user, upload):
+        """Keep the raw upload and let a worker resize it into user.avatar"""
+        from .tasks import process_avatar
+
+        ext = os.path.splitext(upload.name)[1].lower()
+        name = default_storage.save(f"avatar/pending/{user.id}{ext}", upload)
+        transaction.on_commit(lambda: process_avatar.delay(str(user.id), name))
+        return name
+
+    @staticmethod
+    def process_avatar(user_id, name):
+        user = User.objects.filter(id=user_id).first()
+        try:
+            if user is not None:
+                with default_storage.open(name, 'rb') as handle:
+                    # ResizedImageField does the resize and re-encode on save
+                    user.avatar.save(os.path.basename(name), File(handle), save=False)
+                user.save(update_fields=['avatar'])
+        except (OSError, ValueError) as e:
+            logger.warning("Could not process avatar %s for user %s: %s", name, user_id, e)
+        finally:
+            default_storage.delete(name)
+        return user
+
+
+class BrandingUploadError(Exception):
+    pass
+
+
+class BrandingUploadService:
+    """Resumable branding uploads, validated and finalized in the background"""
+
+    COPY_BUFFER = 64 * 1024
+
+    @staticmethod
+    def get_config():
+        config = getattr(settings, 'BRANDING_UPLOADS', {})
+        return {
+            'MAX_FILE_SIZE': config.get('MAX_FILE_SIZE', 200 * 1024 * 1024),
+            'MAX_FILES': config.get('MAX_FILES', 10),
+            'CHUNK_SIZE': config.get('CHUNK_SIZE', 5 * 1024 * 1024),
+            'ALLOWED_TYPES': tuple(config.get('ALLOWED_TYPES', ['image/', 'application/pdf'])),
+            'TEMP_DIR': config.get('TEMP_DIR', os.path.join(settings.BASE_DIR, 'uploads_tmp')),
+            'EXPIRE_AFTER': config.get('EXPIRE_AFTER', timedelta(hours=24)),
+            'THUMBNAIL_SIZE': config.get('THUMBNAIL_SIZE', (256, 256)),
+        }
+
+    @staticmethod
+    def temp_path(branding_file):
+        temp_dir = BrandingUploadService.get_config()['TEMP_DIR']
+        return os.path.join(temp_dir, f"{branding_file.upload_id}.part")
+
+    @staticmethod
+    def check_declared(name, size, content_type):
+        """Cheap checks on client-declared metadata; the real ones run later"""
+        config = BrandingUploadService.get_config()
+        if size <= 0:
+            raise BrandingUploadError(f"{name}: file is empty")
+        if size > config['MAX_FILE_SIZE']:
+            max_mb = config['MAX_FILE_SIZE'] // (1024 * 1024)
+            raise BrandingUploadError(f"{name}: file size too large. Maximum size is {max_mb}MB")
+        if content_type and not content_type.startswith(config['ALLOWED_TYPES']):
+            raise BrandingUploadError(f"{name}: invalid file type. Only images and PDFs are allowed")
+
+    @staticmethod
+    def register_files(branding_request, manifest):
+        """Create upload slots from a [{name, size, content_type}] manifest"""
+        config = BrandingUploadService.get_config()
+        if len(manifest) > config['MAX_FILES']:
+            raise BrandingUploadError(f"At most {config['MAX_FILES']} files can be uploaded")
+
+        slots = []
+        for entry in manifest:
+            name = str(entry.get('name', ''))[:255]
+            try:
+                size = int(entry.get('size', 0))
+            except (TypeError, ValueError):
+                raise BrandingUploadError(f"{name}: invalid size")
+            content_type = str(entry.get('content_type', ''))[:100]
+            BrandingUploadService.check_declared(name, size, content_type)
+            slots.append(BrandingFile(
+                branding_request=branding_request,
+                original_name=name,
+                size=size,
+                content_type=content_type,
+            ))
+        return BrandingFile.objects.bulk_create(slots)
+
+    @staticmethod
+    def attach_uploaded_files(branding_request, files):
+        """
+        Hand files that arrived in a multipart request to the background
+        validation. They are only moved into TEMP_DIR, as if uploaded in
+        chunks; process_file copies them to storage off the request path.
+        """
+        config = BrandingUploadService.get_config()
+        if len(files) > config['MAX_FILES']:
+            raise BrandingUploadError(f"At most {config['MAX_FILES']} files can be uploaded")
+
+        for upload in files:
+            BrandingUploadService.check_declared(upload.name, upload.size, upload.content_type)
+
+        os.makedirs(config['TEMP_DIR'], exist_ok=True)
+        branding_files = []
+        for upload in files:
+            branding_file = BrandingFile(
+                branding_request=branding_request,
+                original_name=upload.name[:255],
+                size=upload.size,
+                content_type=(upload.content_type or '')[:100],
+                bytes_received=upload.size,
+                status='uploaded',
+            )
+            path = BrandingUploadService.temp_path(branding_file)
+            if hasattr(upload, 'temporary_file_path'):
+                # Large uploads are already on disk: a rename, not a copy
+                file_move_safe(upload.temporary_file_path(), path)
+            else:
+                with open(path, 'wb') as target:
+                    for chunk in upload.chunks():
+                        target.write(chunk)
+            branding_files.append(branding_file)
+
+        branding_files = BrandingFile.objects.bulk_create(branding_files)
+        BrandingUploadService.queue_processing(branding_files)
+        return branding_files
+
+    @staticmethod
+    def queue_processing(branding_files):
+        from .tasks import process_branding_file
+        ids = [branding_file.id for branding_file in branding_files]
+        transaction.on_commit(lambda: [process_branding_file.delay(file_id) for file_id in ids])
+
+    @staticmethod
+    def write_chunk(upload_id, offset, stream, length):
+        """
+        Append one chunk read from stream. The offset must equal the bytes
+        already received, so a client resumes by asking for the upload
+        status and sending from there.
+        """
+        with transaction.atomic():
+            branding_file = BrandingFile.objects.select_for_update().get(upload_id=upload_id)
+
+            if branding_file.status != 'uploading':
+                raise BrandingUploadError("Upload already completed")
+            if offset != branding_file.bytes_received:
+                raise BrandingUploadError(
+                    f"Expected offset {branding_file.bytes_received}, got {offset}"
+                )
+            if offset + length > branding_file.size:
+                raise BrandingUploadError("Chunk exceeds declared file size")
+
+            path = BrandingUploadService.temp_path(branding_file)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            written = 0
+            with open(path, 'r+b' if os.path.exists(path) else 'wb') as target:
+                target.seek(offset)
+                target.truncate()
+                while written < length:
+                    data = stream.read(min(BrandingUploadService.COPY_BUFFER, length - written))
+                    if not data:
+                        break
+                    target.write(data)
+                    written += len(data)
+
+            branding_file.bytes_received = offset + written
+            if branding_file.bytes_received == branding_file.size:
+                branding_file.status = 'uploaded'
+                BrandingUploadService.queue_processing([branding_file])
+            branding_file.save(update_fields=['bytes_received', 'status'])
+
+        return branding_file
+
+    @staticmethod
+    def sniff_content_type(handle):
+        """Detect the real type from file contents, None if not allowed"""
+        head = handle.read(5)
+        handle.seek(0)
+        if head.startswith(b'%PDF'):
+            return 'application/pdf'
+        try:
+            with Image.open(handle) as image:
+                image_format = image.format
+                image.verify()
+            return Image.MIME.get(image_format)
+        except Exception:
+            return None
+        finally:
+            handle.seek(0)
+
+    @staticmethod
+    def make_thumbnail(handle, name):
+        size = BrandingUploadService.get_config()['THUMBNAIL_SIZE']
+        with Image.open(handle) as image:
+            image.thumbnail(size)
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            buffer = BytesIO()
+            image.save(buffer, 'JPEG', quality=80)
+        stem = os.path.splitext(os.path.basename(name))[0]
+        return ContentFile(buffer.getvalue(), name=f"{stem}_thumb.jpg")
+
+    @staticmethod
+    def process_file(file_id):
+        """Validate a fully uploaded file, store it and build a thumbnail"""
+        branding_file = BrandingFile.objects.select_related('branding_request').get(id=file_id)
+        if branding_file.status != 'uploaded':
+            return branding_file
+        try:
+            return BrandingUploadService.validate_and_store(branding_file)
+        except Exception:
+            # A file left 'uploaded' would keep its request from ever being finalized
+            logger.exception("Processing branding file %s failed", file_id)
+            if branding_file.file:
+                branding_file.file.delete(save=False)
+            BrandingFile.objects.filter(id=file_id, status='uploaded').update(
+                file='', status='rejected', error='File could not be processed'
+            )
+            BrandingUploadService.finalize_request(branding_file.branding_request_id)
+            branding_file.refresh_from_db()
+            return branding_file
+
+    @staticmethod
+    def validate_and_store(branding_file):
+        config = BrandingUploadService.get_config()
+        temp_path = BrandingUploadService.temp_path(branding_file)
+        from_temp = not branding_file.file
+
+        try:
+            handle = open(temp_path, 'rb') if from_temp else branding_file.file.open('rb')
+        except (FileNotFoundError, ValueError):
+            branding_file.status = 'rejected'
+            branding_file.error = 'Uploaded data is missing'
+            branding_file.save(update_fields=['status', 'error'])
+            BrandingUploadService.finalize_request(branding_file.branding_request_id)
+            return branding_file
+
+        with handle:
+            handle.seek(0, os.SEEK_END)
+            actual_size = handle.tell()
+            handle.seek(0)
+            content_type = BrandingUploadService.sniff_content_type(handle)
+
+            error = ''
+            if actual_size > config['MAX_FILE_SIZE']:
+                error = 'File size too large'
+            elif actual_size != branding_file.size:
+                error = 'File size does not match the declared size'
+            elif not content_type or not content_type.startswith(config['ALLOWED_TYPES']):
+                error = 'Invalid file type. Only images and PDFs are allowed'
+
+            if error:
+                branding_file.status = 'rejected'
+                branding_file.error = error
+                if not from_temp:
+                    branding_file.file.delete(save=False)
+            else:
+                name = branding_file.original_name or f"{branding_file.upload_id}"
+                if from_temp:
+                    branding_file.file.save(name, File(handle), save=False)
+                if content_type.startswith('image/'):
+                    handle.seek(0)
+                    thumbnail = BrandingUploadService.make_thumbnail(handle, name)
+                    branding_file.thumbnail.save(thumbnail.name, thumbnail, save=False)
+                branding_file.content_type = content_type
+                branding_file.status = 'verified'
+
+        branding_file.save()
+        if from_temp and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+        BrandingUploadService.finalize_request(branding_file.branding_request_id)
+        return branding_file
+
+    @staticmethod
+    def finalize_request(branding_request_id):
+        """Mark a request submitted once every one of its files has settled"""
+        if BrandingFile.objects.filter(
+            branding_request_id=branding_request_id
+        ).exclude(status__in=['verified', 'rejected']).exists():
+            return False
+
+        # Conditional update so concurrent workers finalize exactly once
+        return bool(BrandingRequest.objects.filter(
+            id=branding_request_id, status='awaiting_files'
+        ).update(status='submitted', finalized_at=timezone.now()))
+
+    @staticmethod
+    def expire_stale_uploads():
+        """
+        Reject uploads abandoned for longer than EXPIRE_AFTER, and complete
+        uploads whose processing never finished (a lost task or a crash).
+        """
+        config = BrandingUploadService.get_config()
+        cutoff = timezone.now() - config['EXPIRE_AFTER']
+        stale = list(BrandingFile.objects.filter(status__in=['uploading', 'uploaded'], created_at__lt=cutoff))
+
+        for branding_file in stale:
+            path = BrandingUploadService.temp_path(branding_file)
+            if os.path.exists(path):
+                os.remove(path)
+            if branding_file.file:
+                branding_file.file.delete(save=False)
+
+        for status, error in (('uploading', 'Upload expired'), ('uploaded', 'File could not be processed')):
+            # Conditional on the status, so a file a worker just settled is left alone
+            BrandingFile.objects.filter(
+                id__in=[branding_file.id for branding_file in stale if branding_file.status == status],
+                status=status,
+            ).update(status='rejected', error=error)
+
+        for request_id in {branding_file.branding_request_id for branding_file in stale}:
+            BrandingUploadService.finalize_request(request_id)
+        return len(stale)
@@ -0,0 +1,88 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Categories, Order, OrderItem, Payment, Product, SliderData, Testimonials, User
+from .utils import autocomplete, catalog_version
+from .utils.flash_sales import invalidate_index as invalidate_flash_sale_index
+from .utils.images import is_remote, queue_image_variants, variants_cache_key
+
+
+@receiver(post_save, sender=Product)
+def queue_product_image_variants(sender, instance, **kwargs):
+    name = instance.image.name if instance.image else None
+    # Derivatives are keyed by file name, so only new uploads need work.
+    if name and not is_remote(name) and not cache.get(variants_cache_key(name)):
+        transaction.on_commit(lambda: queue_image_variants(name))
+
+
+def refresh_order_history(order_id):
+    from .services import OrderHistoryService
+    transaction.on_commit(lambda: OrderHistoryService.refresh(order_id))
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_order_history(instance.id)
+
+
+@receiver([post_save, post_delete], sender=OrderItem)
+@receiver([post_save, post_delete], sender=Payment)
+def order_child_changed(sender, instance, raw=False, **kwargs):
+    # Item counts and the latest payment live on the order's history entry.
+    if instance.order_id and not raw:
+        refresh_order_history(instance.order_id)
+
+
+@receiver(pre_delete, sender=Order)
+def release_order_stock(sender, instance, **kwargs):
+    # Holds cascade away with the order, so give their units back first.
+    from .services import InventoryService
+    InventoryService.release_order(instance.id)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, **kwargs):
+    # Also covers products taken off sale, whose flash fields are now empty.
+    transaction.on_commit(invalidate_flash_sale_index)
+    catalog_version.bump('products')
+    deleted = kwargs['signal'] is post_delete
+    transaction.on_commit(lambda: update_autocomplete(autocomplete.product_changed, instance, deleted))
+
+
+@receiver([post_save, post_delete], sender=Categories)
+def category_changed(sender, instance, **kwargs):
+    # Product payloads embed their category, and a delete detaches products without a save
+    catalog_version.bump('categories', 'products')
+    deleted = kwargs['signal'] is post_delete
+    transaction.on_commit(lambda: update_autocomplete(autocomplete.category_changed, instance, deleted))
+
+
+def update_autocomplete(apply_change, instance, deleted):
+    # Patch the shared index in place; rebuild it if another writer holds the lock
+    if not apply_change(instance, deleted=deleted):
+        from .tasks import rebuild_autocomplete_index
+        rebuild_autocomplete_index.delay()
+
+
+@receiver([post_save, post_delete], sender=Testimonials)
+def testimonial_changed(sender, instance, **kwargs):
+    catalog_version.bump('testimonials')
+
+
+@receiver([post_save, post_delete], sender=User)
+def testimonial_author_changed(sender, instance, created=False, update_fields=None, **kwargs):
+    # The feed shows the author's name and avatar; logins only touch last_login
+    # and, when the hashing cost changed, the password.
+    if created or (update_fields and set(update_fields) <= {'last_login', 'password'}):
+        return
+    # A deleted author's testimonials were already detached by SET_NULL
+    if kwargs['signal'] is post_delete or Testimonials.objects.filter(user_id=instance.pk).exists():
+        catalog_version.bump('testimonials')
+
+
+@receiver([post_save, post_delete], sender=SliderData)
+def slider_changed(sender, instance, **kwargs):
+    catalog_version.bump('sliders')
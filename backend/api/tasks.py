@@ -1,51 +1,86 @@
 import requests
 from celery import shared_task
-from django.contrib.auth.models import User
-from api.models import Product, Categories 
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from api.utils.product_import import ProductImporter, remote_feed_record
+from api.utils.feed_sync import SupplierFeedSync
+from api.utils import autocomplete, flash_sales, images
+from api.services import BrandingUploadService, InventoryService, RegistrationService, ReviewService
 
 API_URL = "https://fakeapi.net/products"
 
 @shared_task
 def import_products():
     try:
-        
-        response = requests.get(API_URL)
+        response = requests.get(API_URL, timeout=60)
         
         if response.status_code == 200:
-            data = response.json().get("data", [])
-            
-            for item in data:
-                category_name = item.get("category", "uncategorized")
-                category, _ = Categories.objects.get_or_create(name=category_name)
-                
-                user = User.objects.first()
-                
-                rating_info = item.get("rating", {})
-                rating_value = rating_info.get("rate",0)
-                num_reviews = rating_info.get("count", 0)
-                
-                
-                product, created = Product.objects.update_or_create(
-                    title=item['title'],
-                    defaults= {
-                        "user":user,
-                        "description": item.get("description"),
-                        "image": item.get("image"),
-                        "category": category,
-                        'brand':item.get('brand'),
-                        "countInStock": item.get('stock', 0),
-                        "rating": rating_value,
-                        "numReviews": num_reviews,
-                        "new_price":item.get('price')
-                    }
-                )
-                if created:
-                    print(f"added:{product.name}")
-                else:
-                    print(f"updated:{product.name}")
-                    
+            records = (remote_feed_record(item) for item in response.json().get("data", []))
+            importer = ProductImporter(
+                match_on='title',
+                default_user=get_user_model().objects.first(),
+                create_categories=True,
+            )
+            stats = importer.run(records)
+            print(f"Imported products: {stats}")
+            return stats.as_dict()
         else:
             print(f"Failed to fetch products:{response.status_code}")
     
     except Exception as e:
-        print(f"Error importing products: {str(e)}")
\ No newline at end of file
+        print(f"Error importing products: {str(e)}")
+
+
+@shared_task
+def sync_supplier_feed(full=False):
+    """Incremental catalog sync; pass full=True to ignore stored validators"""
+    summary = SupplierFeedSync(full=full, default_user=get_user_model().objects.first()).run()
+    print(f"Supplier feed sync: {summary}")
+    return summary
+
+
+@shared_task
+def generate_image_variants(name):
+    return images.generate_image_variants(name)
+
+
+@shared_task
+def process_avatar(user_id, name):
+    RegistrationService.process_avatar(user_id, name)
+
+
+@shared_task
+def process_branding_file(file_id):
+    BrandingUploadService.process_file(file_id)
+
+
+@shared_task
+def expire_branding_uploads():
+    return BrandingUploadService.expire_stale_uploads()
+
+
+@shared_task
+def release_expired_reservations():
+    return InventoryService.release_expired()
+
+
+@shared_task
+def apply_flash_sale_schedule():
+    started, ended, next_boundary = flash_sales.apply_schedule()
+    # Beat runs this every SCHEDULE_INTERVAL; a window opening or closing
+    # sooner than that gets a run of its own at that exact moment.
+    interval = flash_sales.get_flash_sale_config()['SCHEDULE_INTERVAL']
+    eager = apply_flash_sale_schedule.app.conf.task_always_eager
+    if next_boundary and next_boundary - timezone.now() < interval and not eager:
+        apply_flash_sale_schedule.apply_async(eta=next_boundary)
+    return {'started': started, 'ended': ended}
+
+
+@shared_task
+def rebuild_autocomplete_index():
+    return autocomplete.rebuild()
+
+
+@shared_task
+def recompute_review_aggregates():
+    return ReviewService.recompute()
@@ -1,3 +1,575 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+import stripe
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import (BrandingFile, BrandingRequest, Categories, Order, Payment, Product, Review,
+                     StockReservation, Testimonials, User)
+from .services import (BrandingUploadService, InventoryService, PaymentService, RegistrationConflict,
+                       RegistrationService)
+from .utils.benchmark import seed_catalog
+from .utils.payment_simulator import PaymentSimulator, make_server
+from .utils.product_import import ProductImporter
+from .utils.query_budget import query_budget
+
+# Grouped counts ?facets=1 adds to a product page on a facet cache miss
+FACET_QUERIES = 5
+
+
+def budget(view):
+    return settings.QUERY_BUDGETS['BUDGETS'][view]
+
+
+class QueryBudgetTests(TestCase):
+    """
+    The list and detail endpoints stay within their QUERY_BUDGETS entry on
+    a cold cache, and never run the same statement once per row.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seed = seed_catalog(products=30, users=3, orders=12, categories=4)
+        cls.user = cls.seed['users'][0]
+        Testimonials.objects.bulk_create([
+            Testimonials(user=user, position='Customer', rating=5, comment='Great prints')
+            for user in cls.seed['users']
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def login(self):
+        # Budgets of public endpoints assume an anonymous visitor; the
+        # token's user lookup is one more query.
+        self.client.cookies['access'] = str(RefreshToken.for_user(self.user).access_token)
+
+    def get(self, url, view):
+        with query_budget(budget(view)):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return response
+
+    def test_product_list(self):
+        # A plain page keeps clear of the headroom the facet counts need
+        for url in ('/api/products/', '/api/products/?view=card&page=2'):
+            with query_budget(budget('ProductAPIView') - FACET_QUERIES):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_product_list_with_facets(self):
+        response = self.get('/api/products/?facets=1&in_stock=1', 'ProductAPIView')
+        self.assertIn('facets', response.json())
+
+    def test_product_detail(self):
+        self.get(f"/api/products/{self.seed['product_ids'][0]}/", 'getProduct')
+
+    def test_flash_sales_and_best_sellers(self):
+        self.login()
+        self.get('/api/flash-sales/', 'getFlashSales')
+        self.get('/api/best-sellers/', 'getBestSellers')
+
+    def test_category_list(self):
+        self.get('/api/categories/', 'CategoryViewSet')
+
+    def test_category_detail(self):
+        category = Categories.objects.first()
+        self.get(f'/api/categories/{category.pk}/', 'CategoryViewSet')
+
+    def test_order_history(self):
+        self.login()
+        response = self.get('/api/orders/history/', 'user_orders_with_payments')
+        self.assertTrue(response.json()['data'])
+
+    def test_testimonials(self):
+        response = self.get('/api/testimonials/', 'getTestimonials')
+        self.assertEqual(len(response.json()['data']), 3)
+
+
+@mock.patch('api.views.send_via_sendgrid')
+class StripePaymentTests(APITestCase):
+    """
+    Card payments go through the real sync Stripe client against the local
+    Stripe stand-in, so the installed HTTP client must serve sync calls.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        simulator = PaymentSimulator(PORT=0, LATENCY_MS=0, LATENCY_JITTER_MS=0, STRIPE_AUTO_CONFIRM=False)
+        cls.server = make_server(simulator)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.api_base = stripe.api_base
+        stripe.api_base = 'http://127.0.0.1:%d' % cls.server.server_address[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        stripe.api_base = cls.api_base
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        seed = seed_catalog(products=5, users=1, orders=1, categories=1)
+        cls.user = seed['users'][0]
+        cls.order = Order.objects.get(orderId=seed['orders_by_user'][str(cls.user.id)][0])
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def pay(self):
+        return self.client.post(f'/api/payments/pay-for-order/{self.order.orderId}/', {'payment_method': 'visa'})
+
+    def test_visa_payment_creates_intent(self, send_email):
+        response = self.pay()
+        self.assertEqual(response.status_code, 201, response.data)
+        payment = Payment.objects.get(id=response.data['payment_id'])
+        self.assertEqual(payment.stripe_payment_intent_id, response.data['payment_intent_id'])
+        self.assertTrue(response.data['client_secret'].startswith(payment.stripe_payment_intent_id))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.latest_payment_id, payment.id)
+        # Stripe's httpx calls are counted as outbound HTTP
+        self.assertIn('http;dur=', response['Server-Timing'])
+        self.assertIn('desc="1 calls"', response['Server-Timing'])
+
+    def test_failed_intent_marks_payment_failed(self, send_email):
+        with mock.patch.multiple(stripe, api_base='http://127.0.0.1:1', max_network_retries=0):
+            response = self.pay()
+        self.assertEqual(response.status_code, 400)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_status, 'failed')
+        self.assertEqual(self.order.latest_payment.status, 'failed')
+
+
+class InventoryTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed = seed_catalog(products=3, users=1, orders=1, categories=1)
+        cls.user = seed['users'][0]
+        cls.order = Order.objects.get(orderId=seed['orders_by_user'][str(cls.user.id)][0])
+        cls.product = Product.objects.get(id=seed['product_ids'][0])
+
+    def set_stock(self, count):
+        Product.objects.filter(id=self.product.id).update(countInStock=count)
+
+    def stock(self):
+        return Product.objects.values_list('countInStock', flat=True).get(id=self.product.id)
+
+    @mock.patch('api.services.catalog_version.bump')
+    def test_catalog_version_moves_only_across_the_stock_boundary(self, bump):
+        self.set_stock(3)
+        self.assertTrue(InventoryService.take_stock(self.product.id, 2))
+        bump.assert_not_called()
+        self.assertFalse(InventoryService.take_stock(self.product.id, 2))
+        self.assertTrue(InventoryService.take_stock(self.product.id, 1))
+        bump.assert_called_once_with('products')
+
+        InventoryService.return_stock(self.product.id, 2)
+        self.assertEqual(bump.call_count, 2)
+        InventoryService.return_stock(self.product.id, 1)
+        self.assertEqual(bump.call_count, 2)
+        self.assertEqual(self.stock(), 3)
+
+    def test_untracked_stock_is_always_taken(self):
+        self.set_stock(None)
+        self.assertTrue(InventoryService.take_stock(self.product.id, 5))
+        self.assertIsNone(self.stock())
+
+    @mock.patch('api.views.send_via_sendgrid')
+    def place_order(self, quantity, send_email):
+        self.client.force_authenticate(self.user)
+        return self.client.post('/api/orders/', {
+            'paymentmethod': 'mpesa', 'taxPrice': '0', 'totalPrice': '0',
+            'shippingAddress': {'town': 'Nairobi', 'address': 'Moi Avenue', 'country': 'Kenya', 'shippingPrice': '0'},
+            'items': [{'product': str(self.product.id), 'quantity': quantity}],
+        }, format='json')
+
+    def test_checkout_holds_stock_until_the_hold_expires(self):
+        self.set_stock(5)
+        self.assertEqual(self.place_order(3).status_code, 201)
+        self.assertEqual(self.stock(), 2)
+
+        response = self.place_order(3)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Not enough stock', response.data['items'][0])
+        self.assertEqual(self.stock(), 2)
+
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(InventoryService.release_expired(), 1)
+        self.assertEqual(self.stock(), 5)
+        self.assertEqual(InventoryService.release_expired(), 0)
+
+    def test_paid_order_keeps_its_stock(self):
+        self.set_stock(5)
+        order = Order.objects.get(orderId=self.place_order(2).data['orderId'])
+        InventoryService.convert(order.id)
+        self.assertEqual(list(StockReservation.objects.values_list('status', flat=True)), ['converted'])
+
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(InventoryService.release_expired(), 0)
+        self.assertEqual(self.stock(), 3)
+
+    def test_payment_after_release_takes_the_stock_again(self):
+        self.set_stock(5)
+        order = Order.objects.get(orderId=self.place_order(2).data['orderId'])
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        InventoryService.release_expired()
+
+        InventoryService.convert(order.id)
+        self.assertEqual(StockReservation.objects.get().status, 'converted')
+        self.assertEqual(self.stock(), 3)
+
+    def test_stripe_webhook_replay_after_completion_is_ignored(self):
+        service = PaymentService()
+        payment = service.record_payment(Payment(
+            user=self.user, order=self.order, amount=self.order.totalPrice, payment_method='visa',
+            status='processing', reference_number='STRIPE-REPLAY', stripe_payment_intent_id='pi_replay',
+        ), created=True)
+        intent = {'id': 'pi_replay', 'amount': int(self.order.totalPrice * 100)}
+
+        succeeded = {'type': 'payment_intent.succeeded', 'data': {'object': intent}}
+        self.assertTrue(service.process_stripe_webhook(succeeded, 'pi_replay'))
+        failed = {'type': 'payment_intent.payment_failed', 'data': {'object': intent}}
+        self.assertTrue(service.process_stripe_webhook(failed, 'pi_replay'))
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+        self.assertEqual(payment.callback_data, succeeded)
+
+
+class OrderHistoryTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # seed_catalog stamps every order with the same created_at
+        seed = seed_catalog(products=5, users=1, orders=7, categories=1)
+        cls.user = seed['users'][0]
+        cls.order_numbers = seed['orders_by_user'][str(cls.user.id)]
+
+    def test_pages_are_stable_when_created_at_ties(self):
+        self.client.force_authenticate(self.user)
+        seen, url = [], '/api/orders/history/?limit=3'
+        while url:
+            body = self.client.get(url).json()
+            seen += [order['order_number'] for order in body['data']]
+            url = body['next']
+        self.assertEqual(sorted(seen), sorted(self.order_numbers))
+
+
+class CartPricingTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed = seed_catalog(products=2, users=1, orders=0, categories=1)
+        cls.regular, cls.sale = Product.objects.filter(id__in=seed['product_ids']).order_by('title')
+        Product.objects.filter(id=cls.regular.id).update(
+            new_price=Decimal('100.00'), flash_sale=False, flash_sale_price=None,
+        )
+        Product.objects.filter(id=cls.sale.id).update(
+            new_price=Decimal('50.00'), flash_sale=True, flash_sale_price=Decimal('40.00'),
+            flash_sale_start=None, flash_sale_end=timezone.now() + timedelta(days=1),
+        )
+
+    def quote(self, *items):
+        return self.client.post('/api/cart/quote/', {'items': list(items)}, format='json')
+
+    def line(self, product, quantity, **extra):
+        return {'product': str(product.id), 'quantity': quantity, **extra}
+
+    @override_settings(PRICING={'TAX_RATE': '0.16', 'SHIPPING_FLAT': '200', 'FREE_SHIPPING_OVER': '1000'})
+    def test_prices_come_from_the_catalog(self):
+        response = self.quote(
+            self.line(self.regular, 2, price='1.00'),
+            self.line(self.sale, 1),
+            self.line(self.regular, 1),
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        lines = {line['product']: line for line in response.data['items']}
+        self.assertEqual(lines[str(self.regular.id)]['quantity'], 3)
+        self.assertEqual(lines[str(self.regular.id)]['unit_price'], '100.00')
+        self.assertEqual(lines[str(self.regular.id)]['line_total'], '300.00')
+        self.assertTrue(lines[str(self.sale.id)]['flash_sale'])
+        self.assertEqual(lines[str(self.sale.id)]['unit_price'], '40.00')
+        self.assertEqual(response.data['subtotal'], '340.00')
+        self.assertEqual(response.data['shippingPrice'], '200.00')
+        self.assertEqual(response.data['taxPrice'], '54.40')
+        self.assertEqual(response.data['totalPrice'], '594.40')
+
+    @override_settings(PRICING={'SHIPPING_FLAT': '200', 'FREE_SHIPPING_OVER': '1000'})
+    def test_free_shipping_threshold(self):
+        response = self.quote(self.line(self.regular, 10))
+        self.assertEqual(response.data['shippingPrice'], '0.00')
+        self.assertEqual(response.data['totalPrice'], '1000.00')
+
+    def test_ended_flash_sale_sells_at_the_regular_price(self):
+        Product.objects.filter(id=self.sale.id).update(flash_sale_end=timezone.now() - timedelta(minutes=1))
+        line, = self.quote(self.line(self.sale, 1)).data['items']
+        self.assertFalse(line['flash_sale'])
+        self.assertEqual(line['unit_price'], '50.00')
+
+    def test_unavailable_products_are_rejected(self):
+        Product.objects.filter(id=self.sale.id).update(is_active=False)
+        response = self.quote(self.line(self.regular, 1), self.line(self.sale, 1), {'product': str(uuid.uuid4()), 'quantity': 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.data['items']), 2)
+
+
+class ReviewTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed = seed_catalog(products=1, users=2, orders=0, categories=1)
+        cls.first, cls.second = seed['users']
+        cls.product = Product.objects.get(id=seed['product_ids'][0])
+        cls.url = f'/api/products/{cls.product.id}/reviews/'
+
+    def review(self, user, rating):
+        self.client.force_authenticate(user)
+        return self.client.post(self.url, {'rating': rating, 'comment': 'Sharp print'}, format='json')
+
+    def summary(self):
+        self.client.force_authenticate(None)
+        return self.client.get(self.url).data['summary']
+
+    def test_aggregates_follow_reviews(self):
+        self.assertEqual(self.review(self.first, 5).status_code, 201)
+        self.assertEqual(self.review(self.second, 2).status_code, 201)
+        summary = self.summary()
+        self.assertEqual(summary['numReviews'], 2)
+        self.assertEqual(summary['rating_average'], '3.50')
+        self.assertEqual(summary['histogram'], {'1': 0, '2': 1, '3': 0, '4': 0, '5': 1})
+
+        # Resubmitting replaces the customer's review instead of adding one
+        self.assertEqual(self.review(self.first, 3).status_code, 200)
+        summary = self.summary()
+        self.assertEqual(summary['numReviews'], 2)
+        self.assertEqual(summary['rating_average'], '2.50')
+        self.assertEqual(summary['histogram'], {'1': 0, '2': 1, '3': 1, '4': 0, '5': 0})
+
+        self.client.force_authenticate(self.second)
+        self.assertEqual(self.client.delete(self.url).status_code, 204)
+        summary = self.summary()
+        self.assertEqual((summary['numReviews'], summary['rating_average'], summary['rating']), (1, '3.00', 3))
+
+    def test_one_review_per_customer_and_product(self):
+        Review.objects.create(product=self.product, user=self.first, rating=4)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Review.objects.create(product=self.product, user=self.first, rating=1)
+
+    def test_rating_must_be_one_to_five(self):
+        self.assertEqual(self.review(self.first, 6).status_code, 400)
+        self.assertEqual(self.summary()['histogram'], {str(stars): 0 for stars in range(1, 6)})
+
+
+class RegistrationTests(APITestCase):
+    url = '/api/user/register/'
+
+    def setUp(self):
+        cache.clear()  # registration is throttled per client
+
+    def payload(self, **overrides):
+        return {
+            'username': 'wanjiru', 'email': 'wanjiru@example.com', 'phone_number': '0712345678',
+            'first_name': 'Wanjiru', 'last_name': 'Kamau',
+            'password': 'Secret1!pass', 'confirm_password': 'Secret1!pass', **overrides,
+        }
+
+    def test_register(self):
+        response = self.client.post(self.url, self.payload(), format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        user = User.objects.get(username='wanjiru')
+        self.assertTrue(user.check_password('Secret1!pass'))
+        self.assertNotIn('password', response.data)
+
+    def test_taken_identifiers_are_reported_together(self):
+        self.client.post(self.url, self.payload(), format='json')
+        response = self.client.post(self.url, self.payload(email='wanjiru@EXAMPLE.com'), format='json')
+        self.assertEqual(response.status_code, 400)
+        for field, message in RegistrationService.MESSAGES.items():
+            self.assertEqual(response.data[field], [message])
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_phone_number_alone_conflicts(self):
+        self.client.post(self.url, self.payload(), format='json')
+        response = self.client.post(
+            self.url, self.payload(username='achieng', email='achieng@example.com'), format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {'phone_number'})
+
+    def test_phone_number_is_unique_in_the_database(self):
+        User.objects.create_user(username='first', email='first@example.com', phone_number='0711111111')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            User.objects.create_user(username='second', email='second@example.com', phone_number='0711111111')
+
+    def test_conflict_racing_past_validation(self):
+        User.objects.create_user(username='wanjiru', email='other@example.com', phone_number='0722222222')
+        with self.assertRaises(RegistrationConflict) as raised:
+            RegistrationService.register({
+                'username': 'wanjiru', 'email': 'wanjiru@example.com',
+                'phone_number': '0712345678', 'password': 'Secret1!pass',
+            })
+        self.assertEqual(raised.exception.errors, {'username': RegistrationService.MESSAGES['username']})
+
+
+def png_bytes(size=(32, 32)):
+    # Noise doesn't compress, so the file spans several upload chunks
+    buffer = BytesIO()
+    Image.frombytes('RGB', size, os.urandom(size[0] * size[1] * 3)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class BrandingUploadTests(APITestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overrides = self.settings(MEDIA_ROOT=media_root, BRANDING_UPLOADS={
+            **settings.BRANDING_UPLOADS, 'TEMP_DIR': os.path.join(media_root, 'uploads_tmp'), 'CHUNK_SIZE': 1024,
+        })
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.png = png_bytes()
+
+    def submit(self, name='logo.png', size=None):
+        response = self.client.post('/api/submit-branding/', {
+            'first_name': 'Otieno', 'last_name': 'Odhiambo', 'email': 'otieno@example.com', 'phone': '0712345678',
+            'project_details': 'Logo on 200 mugs',
+            'files': [{'name': name, 'size': size or len(self.png), 'content_type': 'image/png'}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['uploads'][0]
+
+    def put(self, upload, data, offset, **extra):
+        headers = {'HTTP_CONTENT_RANGE': f"bytes {offset}-{offset + len(data) - 1}/{upload['size']}", **extra}
+        return self.client.generic('PUT', upload['upload_url'], data, 'application/octet-stream', **headers)
+
+    def upload(self, upload, data, start=0):
+        for offset in range(start, len(data), upload['chunk_size']):
+            response = self.put(upload, data[offset:offset + upload['chunk_size']], offset)
+            self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def branding_file(self, upload):
+        return BrandingFile.objects.select_related('branding_request').get(upload_id=upload['upload_id'])
+
+    def test_chunked_upload_is_verified_and_finalizes_the_request(self):
+        upload = self.submit()
+        self.assertEqual(self.branding_file(upload).branding_request.status, 'awaiting_files')
+
+        first = self.put(upload, self.png[:100], 0)
+        self.assertEqual(first.json(), {'upload_id': upload['upload_id'], 'status': 'uploading', 'bytes_received': 100})
+        # A chunk from the wrong offset is refused, so the client resumes from bytes_received
+        self.assertEqual(self.put(upload, self.png[300:400], 300).status_code, 409)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            last = self.upload(upload, self.png, start=100)
+        self.assertEqual(last.json()['status'], 'uploaded')
+
+        branding_file = self.branding_file(upload)
+        self.assertEqual(branding_file.status, 'verified')
+        self.assertTrue(branding_file.thumbnail)
+        self.assertEqual(branding_file.branding_request.status, 'submitted')
+        self.assertEqual(self.put(upload, b'x', 0).status_code, 409)
+
+    def test_content_length_is_required(self):
+        upload = self.submit()
+        self.assertEqual(self.put(upload, b'abc', 0, CONTENT_LENGTH='').status_code, 411)
+        self.assertEqual(self.put(upload, b'abc', 0, CONTENT_LENGTH='three').status_code, 400)
+        self.assertEqual(self.branding_file(upload).bytes_received, 0)
+
+    def test_file_that_is_not_an_image_is_rejected(self):
+        data = b'%!PS-Adobe not an image'
+        upload = self.submit(name='logo.png', size=len(data))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upload(upload, data)
+        branding_file = self.branding_file(upload)
+        self.assertEqual(branding_file.status, 'rejected')
+        self.assertFalse(branding_file.file)
+        self.assertEqual(branding_file.branding_request.status, 'submitted')
+
+    def test_processing_failure_settles_the_file(self):
+        upload = self.submit()
+        with mock.patch.object(BrandingUploadService, 'make_thumbnail', side_effect=OSError('disk full')), \
+                self.assertLogs('api.services', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+            self.upload(upload, self.png)
+        branding_file = self.branding_file(upload)
+        self.assertEqual((branding_file.status, branding_file.error), ('rejected', 'File could not be processed'))
+        self.assertFalse(branding_file.file)
+        self.assertEqual(branding_file.branding_request.status, 'submitted')
+
+    def test_stale_uploads_expire(self):
+        stalled, unprocessed = self.submit(), self.submit()
+        self.put(stalled, self.png[:100], 0)
+        self.upload(unprocessed, self.png)  # processing never queued: callbacks not run
+        BrandingFile.objects.update(created_at=timezone.now() - timedelta(days=2))
+
+        self.assertEqual(BrandingUploadService.expire_stale_uploads(), 2)
+        self.assertEqual(self.branding_file(stalled).error, 'Upload expired')
+        self.assertEqual(self.branding_file(unprocessed).error, 'File could not be processed')
+        self.assertFalse(BrandingRequest.objects.exclude(status='submitted').exists())
+        self.assertFalse(os.listdir(BrandingUploadService.get_config()['TEMP_DIR']))
+
+
+class ProductImporterTests(TestCase):
+
+    def records(self, **overrides):
+        return [
+            {'title': f'Canvas tote {i}', 'new_price': '850', 'countInStock': i, 'category_name': 'Bags', **overrides}
+            for i in range(3)
+        ]
+
+    def run_import(self, records, **options):
+        return ProductImporter(match_on='title', create_categories=True, **options).run(iter(records))
+
+    def test_creates_then_updates_only_changed_rows(self):
+        stats = self.run_import(self.records())
+        self.assertEqual((stats.created, stats.updated, stats.skipped, stats.errors), (3, 0, 0, 0))
+        self.assertEqual(Categories.objects.get().name, 'Bags')
+        self.assertEqual(Product.objects.get(title='Canvas tote 2').new_price, Decimal('850.00'))
+
+        records = self.records()
+        records[1]['new_price'] = '900'
+        stats = self.run_import(records)
+        self.assertEqual((stats.created, stats.updated, stats.skipped), (0, 1, 2))
+        self.assertEqual(Product.objects.get(title='Canvas tote 1').new_price, Decimal('900.00'))
+        self.assertEqual(Product.objects.count(), 3)
+
+    def test_fields_missing_from_the_feed_are_kept(self):
+        self.run_import(self.records())
+        self.run_import([{'title': 'Canvas tote 1', 'countInStock': 40, 'category_name': 'Bags'}])
+        product = Product.objects.get(title='Canvas tote 1')
+        self.assertEqual((product.countInStock, product.new_price), (40, Decimal('850.00')))
+
+    def test_bad_rows_are_counted_not_fatal(self):
+        records = self.records()
+        records[0]['new_price'] = 'free'
+        records[1]['title'] = ''
+        stats = self.run_import(records)
+        self.assertEqual((stats.created, stats.errors), (1, 2))
+
+    def test_unknown_category_is_skipped_unless_created(self):
+        stats = ProductImporter(match_on='title').run(iter(self.records(category_name='Mugs')))
+        self.assertEqual(stats.skipped, 3)
+        self.assertFalse(Product.objects.exists())
+
+    def test_dry_run_writes_nothing(self):
+        stats = self.run_import(self.records(), dry_run=True)
+        self.assertEqual(stats.created, 3)
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(Categories.objects.exists())
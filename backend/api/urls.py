@@ -8,7 +8,10 @@ router.register(r'categories', CategoryViewSet, basename='category')
 urlpatterns = [
     path('profile/', UserProfileView.as_view(), name='user-profile'),
     path('products/', views.ProductAPIView.as_view(), name='products'),
+    path('products/batch/', views.product_batch, name='product-batch'),
+    path('search/autocomplete/', views.autocomplete, name='autocomplete'),
     path('products/<str:pk>/', views.getProduct, name='product'),
+    path('products/<str:pk>/reviews/', views.product_reviews, name='product-reviews'),
     path('admin/products/', views.adminProducts, name='admin-products'),
     path('admin/products/<str:pk>/', views.adminProductDetail, name='admin-product-detail'),
     path('flash-sales/', views.getFlashSales, name='flash-sales'),
@@ -17,7 +20,10 @@ urlpatterns = [
     path('best-sellers/', views.getBestSellers, name='best-sellers'),
     path('testimonials/', views.getTestimonials, name="testimonials"),
     path("submit-branding/", views.getBrandingRequest, name="submit-branding"),
+    path('branding-uploads/<uuid:upload_id>/', views.BrandingUploadView.as_view(), name='branding-upload'),
+    path('media/<str:token>/', views.protected_media, name='protected-media'),
     path('orders/', views.create_order, name='create_order'),
+    path('cart/quote/', views.cart_quote, name='cart-quote'),
     
     
     # Dashboard APIs
@@ -34,14 +40,16 @@ urlpatterns = [
     
     # Payment status and management
     path('<uuid:payment_id>/status/', views.payment_status, name='payment_status'),
+    path('<uuid:payment_id>/events/', views.payment_events, name='payment_events'),
     # path('<uuid:payment_id>/retry/', views.retry_payment, name='retry_payment'),
     path('payments/confirm-stripe-payment/', views.confirm_stripe_payment, name='confirm_stripe'),
     path('payments/pay-for-order/<str:order_id>/', views.pay_for_order, name='pay_for_order'),
     path('payments/order-payment-status/<str:order_id>/', views.order_payment_status, name='order_payment_status'),
+    path('payments/order-payment-events/<str:order_id>/', views.order_payment_events, name='order_payment_events'),
     
     # User payment history
     path('history/', views.user_payments, name='user_payments'),
-    path('orders/', views.user_orders_with_payments, name='user_orders_with_payments'),
+    path('orders/history/', views.user_orders_with_payments, name='user_orders_with_payments'),
     
     # Payment methods info
     path('methods/', views.payment_methods, name='payment_methods'),
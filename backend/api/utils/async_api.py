@@ -0,0 +1,73 @@
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.authentication import CustomJWTAuthentication
+
+authenticator = CustomJWTAuthentication()
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, safe=False)
+
+
+async def authenticate(request):
+    """Resolve the JWT cookie user without blocking the event loop"""
+    result = await sync_to_async(authenticator.authenticate)(request)
+    return result[0] if result else None
+
+
+def parse_body(request):
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+    return request.POST.dict()
+
+
+def async_api_view(methods, authenticated=True):
+    """
+    Async counterpart of @api_view for Django-native coroutine views.
+
+    DRF views are synchronous, so under ASGI each one occupies a thread
+    while it waits on the database or a payment provider. These views run
+    on the event loop instead. Like DRF they are CSRF-exempt (JWT cookie
+    auth), set request.user from CustomJWTAuthentication, expose the
+    parsed body as request.data and answer with DRF-shaped errors.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return json_response(
+                    {'detail': f'Method "{request.method}" not allowed.'}, status=405
+                )
+
+            if authenticated:
+                try:
+                    user = await authenticate(request)
+                except AuthenticationFailed as exc:
+                    # Expired or forged cookie: the 401 DRF would have sent
+                    return json_response(exc.detail, status=401)
+                if user is None or not user.is_active:
+                    return json_response(
+                        {'detail': 'Authentication credentials were not provided.'}, status=401
+                    )
+                request.user = user
+
+            if request.method in ('POST', 'PUT', 'PATCH'):
+                request.data = parse_body(request)
+                if request.data is None:
+                    return json_response({'detail': 'JSON parse error.'}, status=400)
+            else:
+                request.data = {}
+            return await view(request, *args, **kwargs)
+
+        return csrf_exempt(wrapper)
+    return decorator
+
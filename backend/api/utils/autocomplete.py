@@ -0,0 +1,215 @@
+import logging
+import re
+import threading
+import time
+import unicodedata
+import uuid
+from bisect import bisect_left
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+DOCUMENTS_KEY = 'autocomplete:documents'
+VERSION_KEY = 'autocomplete:version'
+LOCK_KEY = 'autocomplete:lock'
+KIND_ORDER = {'category': 0, 'brand': 1, 'product': 2}
+
+
+def get_autocomplete_config():
+    """Return AUTOCOMPLETE settings merged with defaults"""
+    config = getattr(settings, 'AUTOCOMPLETE', {})
+    return {
+        'LIMIT': config.get('LIMIT', 8),
+        'MAX_LIMIT': config.get('MAX_LIMIT', 20),
+        'MAX_PER_GROUP': config.get('MAX_PER_GROUP', 3),
+        'MAX_SCAN': config.get('MAX_SCAN', 2000),
+    }
+
+
+def normalize(text):
+    """Lowercase, accents stripped, punctuation collapsed to single spaces"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(re.findall(r'\w+', text.lower()))
+
+
+def word_suffixes(normalized):
+    """'red running shoes' -> the keys for matching at any word start"""
+    words = normalized.split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+def product_document(product):
+    return {
+        'title': product.title,
+        'brand': product.brand or '',
+        'category': str(product.category_id) if product.category_id else None,
+        'score': (product.numReviews or 0) + (product.rating or 0) + (100 if product.best_seller else 0),
+    }
+
+
+def build_documents():
+    """Everything the index needs, from two queries"""
+    from api.models import Categories, Product
+
+    products = Product.objects.filter(is_active=True).only(
+        'id', 'title', 'brand', 'category_id', 'numReviews', 'rating', 'best_seller'
+    )
+    return {
+        'products': {str(product.id): product_document(product) for product in products.iterator()},
+        'categories': {
+            str(category_id): name
+            for category_id, name in Categories.objects.filter(is_active=True).values_list('id', 'name')
+        },
+    }
+
+
+class PrefixIndex:
+    """
+    Sorted array of normalized keys (every word-start suffix of product
+    titles, brands and category names) pointing at suggestion entries.
+    A lookup is a bisect to the first key with the prefix and a short scan.
+    """
+
+    def __init__(self, documents):
+        self.entries = []
+        keys = []
+
+        def add(kind, value, label, score):
+            slot = len(self.entries)
+            self.entries.append((kind, value, label, score))
+            keys.extend((key, slot) for key in word_suffixes(normalize(label)))
+
+        products = documents['products']
+        for product_id, doc in products.items():
+            add('product', product_id, doc['title'], doc['score'])
+
+        for brand, count in Counter(doc['brand'] for doc in products.values() if doc['brand']).items():
+            add('brand', brand, brand, count)
+
+        category_counts = Counter(doc['category'] for doc in products.values() if doc['category'])
+        for category_id, name in documents['categories'].items():
+            if category_counts[category_id]:
+                add('category', category_id, name, category_counts[category_id])
+
+        keys.sort()
+        self.keys = [key for key, _ in keys]
+        self.slots = [slot for _, slot in keys]
+
+    def search(self, query, limit, max_per_group=3, max_scan=2000):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+
+        slots = set()
+        start = bisect_left(self.keys, prefix)
+        for position in range(start, min(start + max_scan, len(self.keys))):
+            if not self.keys[position].startswith(prefix):
+                break
+            slots.add(self.slots[position])
+
+        ranked = sorted(
+            (self.entries[slot] for slot in slots),
+            key=lambda entry: (KIND_ORDER[entry[0]], -entry[3], entry[2]),
+        )
+        suggestions = []
+        per_group = Counter()
+        for kind, value, label, _ in ranked:
+            if kind != 'product' and per_group[kind] >= max_per_group:
+                continue
+            per_group[kind] += 1
+            suggestions.append({'type': kind, 'value': value, 'label': label})
+            if len(suggestions) >= limit:
+                break
+        return suggestions
+
+
+_local = {'version': None, 'index': None}
+_local_lock = threading.Lock()
+
+
+def publish(documents):
+    version = uuid.uuid4().hex
+    cache.set(DOCUMENTS_KEY, documents, None)
+    cache.set(VERSION_KEY, version, None)
+    return version
+
+
+def rebuild():
+    """Full rebuild from the database, shared with every worker through the cache"""
+    documents = build_documents()
+    publish(documents)
+    logger.info("Autocomplete index rebuilt with %s products", len(documents['products']))
+    return len(documents['products'])
+
+
+def get_index():
+    """
+    This worker's copy of the index. Steady state costs one cache read for
+    the version; the documents are only fetched and re-sorted after a change.
+    """
+    version = cache.get(VERSION_KEY)
+    if version is not None and version == _local['version']:
+        return _local['index']
+
+    with _local_lock:
+        if version is not None and version == _local['version']:
+            return _local['index']
+        documents = cache.get(DOCUMENTS_KEY) if version is not None else None
+        if documents is None:
+            documents = build_documents()
+            version = publish(documents)
+        _local['index'] = PrefixIndex(documents)
+        _local['version'] = version
+        return _local['index']
+
+
+def suggest(query, limit=None):
+    config = get_autocomplete_config()
+    limit = min(limit or config['LIMIT'], config['MAX_LIMIT'])
+    return get_index().search(query, limit, config['MAX_PER_GROUP'], config['MAX_SCAN'])
+
+
+def update_documents(change):
+    """
+    Apply `change(documents)` to the shared documents under a short cache
+    lock. Returns False when the lock stays busy, in which case the caller
+    falls back to a full rebuild. With nothing cached yet there is nothing
+    to update: the next lookup builds from the database.
+    """
+    for _ in range(20):
+        if cache.add(LOCK_KEY, 1, timeout=10):
+            break
+        time.sleep(0.05)
+    else:
+        return False
+    try:
+        documents = cache.get(DOCUMENTS_KEY)
+        if documents is None:
+            return True
+        change(documents)
+        publish(documents)
+        return True
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def product_changed(product, deleted=False):
+    def change(documents):
+        if deleted or not product.is_active:
+            documents['products'].pop(str(product.id), None)
+        else:
+            documents['products'][str(product.id)] = product_document(product)
+    return update_documents(change)
+
+
+def category_changed(category, deleted=False):
+    def change(documents):
+        if deleted or not category.is_active:
+            documents['categories'].pop(str(category.id), None)
+        else:
+            documents['categories'][str(category.id)] = category.name
+    return update_documents(change)
@@ -0,0 +1,384 @@
+import itertools
+import json
+import random
+import statistics
+import threading
+import time
+import uuid
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.test import Client
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.models import (Categories, Order, OrderItem, Payment, Product,
+                        ShippingAddress, User)
+from api.pagination import CustomPagination
+from api.services import OrderHistoryService, PaymentService
+from api.utils.query_budget import QueryInspector
+from api import renderers as fast_renderers
+from rest_framework.renderers import JSONRenderer
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+
+class Scenario:
+    """One endpoint to drive: request(client, user) -> response"""
+
+    def __init__(self, name, request, role='anonymous'):
+        self.name = name
+        self.request = request
+        self.role = role
+
+
+def seed_catalog(products=1000, users=50, orders=500, categories=20):
+    """
+    Bulk-insert a synthetic catalog, customers, orders and M-Pesa payments
+    awaiting their callback. Returns ids the scenarios pick from.
+    """
+    rng = random.Random(42)
+    password = make_password(BENCHMARK_PASSWORD)
+
+    category_rows = Categories.objects.bulk_create([
+        Categories(name=f'Category {i}', slug=f'category-{i}', description='Benchmark category')
+        for i in range(categories)
+    ])
+    admin = User.objects.create(
+        username='bench-admin', email='bench-admin@example.com', password=password,
+        phone_number='254800000000', role='admin', is_staff=True,
+    )
+    product_rows = Product.objects.bulk_create([
+        Product(
+            user=admin,
+            title=f'Benchmark product {i:06d}',
+            category=rng.choice(category_rows),
+            brand=f'Brand {i % 25}',
+            description='Synthetic product used by the benchmark suite',
+            countInStock=rng.randint(1, 500),
+            new_price=Decimal(rng.randint(100, 20000)),
+            old_price=Decimal(rng.randint(20000, 30000)),
+            rating=rng.randint(0, 5),
+            numReviews=rng.randint(0, 400),
+            best_seller=i % 10 == 0,
+        )
+        for i in range(products)
+    ], batch_size=1000)
+    user_rows = User.objects.bulk_create([
+        User(
+            username=f'bench-user-{i}', email=f'bench-user-{i}@example.com', password=password,
+            first_name='Bench', last_name=f'User {i}', phone_number=f'2547{i:08d}',
+        )
+        for i in range(users)
+    ], batch_size=1000)
+    addresses = ShippingAddress.objects.bulk_create([
+        ShippingAddress(user=user, town='Nairobi', address='Benchmark Street', country='Kenya',
+                        shippingPrice=Decimal('200'))
+        for user in user_rows
+    ])
+
+    now = timezone.now()
+    order_rows, item_rows, payment_rows = [], [], []
+    for i in range(orders):
+        user_index = i % len(user_rows)
+        order = Order(
+            user=user_rows[user_index], shippingAddress=addresses[user_index],
+            orderId=f'BENCH-{i:06d}', paymentmethod='mpesa', taxPrice=Decimal('0'),
+            totalPrice=Decimal('0'), status='pending',
+        )
+        total = Decimal('0')
+        for product in rng.sample(product_rows, min(3, len(product_rows))):
+            quantity = rng.randint(1, 4)
+            item_rows.append(OrderItem(order=order, product=product, quantity=quantity,
+                                       price=product.new_price))
+            total += product.new_price * quantity
+        order.totalPrice = min(total, Decimal('99999.99'))
+        order_rows.append(order)
+        payment_rows.append(Payment(
+            user=order.user, order=order, amount=order.totalPrice, payment_method='mpesa',
+            status='processing', reference_number=f'BENCH{i:010d}',
+            mpesa_phone_number=order.user.phone_number,
+            mpesa_checkout_request_id=f'ws_CO_BENCH_{i:06d}',
+        ))
+    Order.objects.bulk_create(order_rows, batch_size=1000)
+    Order.objects.filter(id__in=[order.id for order in order_rows]).update(createdAt=now)
+    OrderItem.objects.bulk_create(item_rows, batch_size=1000)
+    Payment.objects.bulk_create(payment_rows, batch_size=1000)
+    # bulk_create bypasses PaymentService and the read-model signals
+    PaymentService().repair_latest_payment([order.id for order in order_rows])
+    OrderHistoryService.rebuild()
+
+    return {
+        'admin': admin,
+        'users': user_rows,
+        'product_ids': [str(product.id) for product in product_rows],
+        'orders_by_user': {
+            str(user.id): [order.orderId for order in order_rows if order.user_id == user.id]
+            for user in user_rows
+        },
+        'checkout_ids': [payment.mpesa_checkout_request_id for payment in payment_rows],
+    }
+
+
+def mpesa_callback_body(checkout_request_id):
+    return {
+        'Body': {
+            'stkCallback': {
+                'MerchantRequestID': 'bench',
+                'CheckoutRequestID': checkout_request_id,
+                'ResultCode': 0,
+                'ResultDesc': 'The service request is processed successfully.',
+                'CallbackMetadata': {'Item': [
+                    {'Name': 'MpesaReceiptNumber', 'Value': uuid.uuid4().hex[:10].upper()},
+                ]},
+            }
+        }
+    }
+
+
+def default_scenarios(seed):
+    rng = random.Random(7)
+    product_ids = seed['product_ids']
+    pages = max(1, min(20, len(product_ids) // CustomPagination.page_size))
+    checkout_ids = itertools.cycle(seed['checkout_ids'])
+    next_checkout = threading.Lock()
+
+    def order_payload():
+        product_id = rng.choice(product_ids)
+        return {
+            'paymentmethod': 'mpesa',
+            'taxPrice': '0.00',
+            'totalPrice': '1000.00',
+            'shippingAddress': {'town': 'Nairobi', 'address': 'Benchmark Street',
+                                'country': 'Kenya', 'shippingPrice': '200.00'},
+            'items': [{'product': product_id, 'quantity': 1, 'price': '1000.00'}],
+        }
+
+    def pay_for_order(client, user):
+        order_id = rng.choice(seed['orders_by_user'][str(user.id)])
+        return client.post(f'/api/payments/pay-for-order/{order_id}/',
+                           {'payment_method': 'mpesa', 'phone_number': user.phone_number},
+                           content_type='application/json')
+
+    def mpesa_callback(client, user):
+        with next_checkout:
+            checkout_id = next(checkout_ids)
+        return client.post('/api/mpesa-callback/', mpesa_callback_body(checkout_id),
+                           content_type='application/json')
+
+    return [
+        Scenario('product_list', lambda client, user: client.get(
+            '/api/products/', {'page': rng.randint(1, pages)})),
+        Scenario('product_cards', lambda client, user: client.get(
+            '/api/products/', {'page': rng.randint(1, pages), 'view': 'card'})),
+        Scenario('product_search', lambda client, user: client.get(
+            '/api/products/', {'query': f'product 000{rng.randint(0, 99):02d}'})),
+        Scenario('product_detail', lambda client, user: client.get(
+            f'/api/products/{rng.choice(product_ids)}/')),
+        Scenario('cart_quote', lambda client, user: client.post(
+            '/api/cart/quote/', {'items': order_payload()['items']}, content_type='application/json')),
+        Scenario('create_order', lambda client, user: client.post(
+            '/api/orders/', order_payload(), content_type='application/json'), role='customer'),
+        Scenario('pay_for_order', pay_for_order, role='customer'),
+        Scenario('order_history', lambda client, user: client.get(
+            '/api/orders/history/'), role='customer'),
+        Scenario('mpesa_callback', mpesa_callback),
+        Scenario('dashboard_overview', lambda client, user: client.get(
+            '/api/admin/dashboard/'), role='admin'),
+        Scenario('dashboard_sales', lambda client, user: client.get(
+            '/api/admin/dashboard/sales/'), role='admin'),
+        Scenario('dashboard_categories', lambda client, user: client.get(
+            '/api/admin/dashboard/categories/'), role='admin'),
+    ]
+
+
+def stub_payment_providers():
+    """Patch the M-Pesa/Stripe/SendGrid calls so no request leaves the process"""
+    def stk_push(self, phone_number, amount, account_reference, transaction_desc):
+        return {
+            'ResponseCode': '0',
+            'CheckoutRequestID': f'ws_CO_{uuid.uuid4().hex[:20]}',
+            'MerchantRequestID': uuid.uuid4().hex[:12],
+        }
+
+    def payment_intent(self, amount, currency='usd', customer_email=None):
+        intent_id = f'pi_{uuid.uuid4().hex[:24]}'
+        return mock.Mock(id=intent_id, client_secret=f'{intent_id}_secret', status='requires_payment_method')
+
+    stack = ExitStack()
+    stack.enter_context(mock.patch('api.services.MPesaService.initiate_stk_push', stk_push))
+    stack.enter_context(mock.patch('api.services.StripeService.create_payment_intent', payment_intent))
+    stack.enter_context(mock.patch('api.views.send_via_sendgrid', return_value=True))
+    return stack
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class BenchmarkRunner:
+    """
+    Drives each scenario in-process through the full middleware and view
+    stack with a fixed number of worker threads, recording latency, status
+    and the number of SQL statements of every request.
+    """
+
+    def __init__(self, seed, requests_per_scenario=200, concurrency=8, warmup=10):
+        self.seed = seed
+        self.requests_per_scenario = requests_per_scenario
+        self.concurrency = concurrency
+        self.warmup = warmup
+        self.local = threading.local()
+
+    def client_for(self, role):
+        clients = getattr(self.local, 'clients', None)
+        if clients is None:
+            clients = self.local.clients = {}
+        if role not in clients:
+            client = Client(raise_request_exception=False)
+            user = None
+            if role == 'admin':
+                user = self.seed['admin']
+            elif role == 'customer':
+                user = random.choice(self.seed['users'])
+            if user is not None:
+                client.cookies['access'] = str(RefreshToken.for_user(user).access_token)
+            clients[role] = (client, user)
+        return clients[role]
+
+    def timed_request(self, scenario):
+        client, user = self.client_for(scenario.role)
+        inspector = QueryInspector(slow_query_ms=0)
+        start = time.perf_counter()
+        with inspector.capture():
+            response = scenario.request(client, user)
+        return time.perf_counter() - start, response.status_code, inspector.count
+
+    def run_scenario(self, scenario):
+        for _ in range(self.warmup):
+            self.timed_request(scenario)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            samples = list(pool.map(
+                lambda _: self.timed_request(scenario), range(self.requests_per_scenario)
+            ))
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(sample[0] * 1000 for sample in samples)
+        errors = sum(1 for sample in samples if sample[1] >= 400)
+        return {
+            'requests': len(samples),
+            'errors': errors,
+            'error_rate': round(100 * errors / len(samples), 1) if samples else 0.0,
+            'p50_ms': round(percentile(latencies, 0.50), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+            'queries_per_request': round(statistics.mean(sample[2] for sample in samples), 1),
+        }
+
+    def run(self, scenarios):
+        return {scenario.name: self.run_scenario(scenario) for scenario in scenarios}
+
+
+def compare_to_baseline(results, baseline, tolerance=0.2):
+    """
+    Regressions against a stored run: p95 latency above baseline by more
+    than `tolerance`, more queries per request, or new errors.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current['queries_per_request'] > previous['queries_per_request']:
+            regressions.append(
+                f"{name}: queries/request {previous['queries_per_request']} -> "
+                f"{current['queries_per_request']}"
+            )
+        if current['errors'] > previous['errors']:
+            regressions.append(f"{name}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+def load_baseline(path):
+    try:
+        with open(path) as handle:
+            return json.load(handle).get('results', {})
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, results, options):
+    with open(path, 'w') as handle:
+        json.dump({'created_at': timezone.now().isoformat(), 'options': options,
+                   'results': results}, handle, indent=2, sort_keys=True)
+
+
+def render_payloads(rows=1000):
+    """
+    Paginated product-list bodies of `rows` products: 'serialized' as
+    ModelSerializers emit them (decimals, ids and dates already strings) and
+    'native' with Decimal, UUID and datetime values, as hand-built responses
+    such as the dashboard return them.
+    """
+    rng = random.Random(11)
+    now = timezone.now()
+    category = {'id': uuid.uuid4(), 'name': 'Benchmark category', 'slug': 'benchmark', 'product_count': rows}
+    native = []
+    for i in range(rows):
+        price = Decimal(rng.randint(100, 99999)) / 100
+        native.append({
+            'id': uuid.uuid4(), 'user': uuid.uuid4(), 'title': f'Benchmark product {i:05d} – édition',
+            'image_url': f'https://cdn.example.com/products/{i}.jpg', 'brand': f'Brand {i % 40}',
+            'category': category, 'description': 'Lorem ipsum dolor sit amet. ' * 8, 'is_active': True,
+            'rating': rng.randint(0, 5), 'numReviews': rng.randint(0, 500), 'rating_average': Decimal('4.25'),
+            'rating_histogram': {str(stars): rng.randint(0, 100) for stars in range(1, 6)},
+            'countInStock': rng.randint(0, 500), 'Date_added': now - timedelta(minutes=i),
+            'new_price': price, 'old_price': price * 2, 'specs': {'weight': '1kg', 'colors': ['red', 'blue']},
+            'best_seller': i % 7 == 0, 'flash_sale': False, 'flash_sale_price': None,
+            'flash_sale_start': None, 'flash_sale_end': None,
+        })
+    envelope = {'total_items': rows, 'total_pages': 1, 'current_page': 1, 'next': None, 'previous': None}
+    serialized = json.loads(JSONRenderer().render({**envelope, 'data': native}))
+    return {'serialized': serialized, 'native': {**envelope, 'data': native}}
+
+
+def benchmark_renderers(payloads, rounds=50):
+    """
+    Median render time of each available renderer per payload, against DRF's
+    stdlib JSONRenderer, and whether its output decodes to the same data.
+    """
+    candidates = [('stdlib_json', JSONRenderer()), ('fast_json', fast_renderers.FastJSONRenderer())]
+    if fast_renderers.msgpack is not None:
+        candidates.append(('msgpack', fast_renderers.MessagePackRenderer()))
+
+    results = {}
+    for payload_name, payload in payloads.items():
+        expected = json.loads(JSONRenderer().render(payload))
+        rows = {}
+        for name, renderer in candidates:
+            timings = []
+            for _ in range(rounds):
+                start = time.perf_counter()
+                body = renderer.render(payload, renderer.media_type, {})
+                timings.append(time.perf_counter() - start)
+            decoded = (fast_renderers.msgpack.unpackb(body) if renderer.format == 'msgpack'
+                       else json.loads(body))
+            rows[name] = {'ms': statistics.median(timings) * 1000, 'bytes': len(body),
+                          'matches': decoded == expected}
+        baseline = rows['stdlib_json']['ms']
+        for row in rows.values():
+            row['speedup'] = baseline / row['ms'] if row['ms'] else 0.0
+        results[payload_name] = rows
+    return results
@@ -0,0 +1,73 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+COLLECTIONS = ('products', 'categories', 'sliders', 'testimonials')
+
+
+def get_catalog_version_config():
+    """Return CATALOG_VERSIONS settings merged with defaults"""
+    config = getattr(settings, 'CATALOG_VERSIONS', {})
+    return {
+        'CLOCK_BUCKET': config.get('CLOCK_BUCKET', 60),
+    }
+
+
+def version_key(collection):
+    return f'catalog:version:{collection}'
+
+
+def initial_version():
+    # Seeded from the clock, so a flushed cache never hands out an old version again
+    return time.time_ns() // 1000
+
+
+def get_versions(*collections):
+    """Current counter of each collection, one cache round trip in the steady state"""
+    keys = [version_key(collection) for collection in collections]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, initial_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _bump(collections):
+    for collection in collections:
+        try:
+            cache.incr(version_key(collection))
+        except ValueError:
+            cache.add(version_key(collection), initial_version(), None)
+
+
+def bump(*collections):
+    """
+    Move the collections to a new version once the current transaction
+    commits, so a reader can never cache old rows under the new version.
+    """
+    transaction.on_commit(lambda: _bump(collections))
+
+
+def etag_for(request, collections, clock=False):
+    """
+    Entity tag of a public read: the collection versions plus everything
+    else the body depends on (host for absolute URLs, path and query,
+    negotiated format). `clock` adds a CLOCK_BUCKET time slot for bodies
+    that also depend on the time, such as live flash sales.
+    """
+    parts = [*get_versions(*collections), request.get_host(), request.get_full_path(),
+             request.META.get('HTTP_ACCEPT', '')]
+    if clock:
+        parts.append(int(time.time() // get_catalog_version_config()['CLOCK_BUCKET']))
+    return hashlib.md5('|'.join(map(str, parts)).encode('utf-8')).hexdigest()
+
+
+def etag(*collections, clock=False):
+    """etag_func for django.views.decorators.http.condition"""
+    def etag_func(request, *args, **kwargs):
+        return etag_for(request, collections, clock)
+    return etag_func
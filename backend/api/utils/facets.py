@@ -0,0 +1,155 @@
+import hashlib
+import json
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from api.utils import catalog_version
+from api.utils.flash_sales import active_sales
+
+TRUE_VALUES = ('1', 'true', 'yes')
+# NULL countInStock is untracked stock, which checkout treats as available
+IN_STOCK = Q(countInStock__gt=0) | Q(countInStock__isnull=True)
+
+
+def get_facet_config():
+    """Return CATALOG_FACETS settings merged with defaults"""
+    config = getattr(settings, 'CATALOG_FACETS', {})
+    return {
+        'PRICE_BUCKETS': config.get('PRICE_BUCKETS', [0, 500, 1000, 2500, 5000, 10000, 50000]),
+        'BRAND_LIMIT': config.get('BRAND_LIMIT', 50),
+        'CACHE_TIMEOUT': config.get('CACHE_TIMEOUT', 300),
+    }
+
+
+def split_values(params, name):
+    values = []
+    for raw in params.getlist(name):
+        values.extend(value.strip() for value in raw.split(',') if value.strip())
+    return sorted(set(values))
+
+
+def parse_decimal(value):
+    try:
+        return Decimal(value) if value not in (None, '') else None
+    except InvalidOperation:
+        return None
+
+
+def parse_filters(params):
+    """
+    Normalized filters from query params: brand and category (repeatable or
+    comma-separated), min_price/max_price on new_price, in_stock, on_sale
+    and the free-text query. Unparseable values are dropped.
+    """
+    categories = []
+    for value in split_values(params, 'category'):
+        try:
+            categories.append(str(uuid.UUID(value)))
+        except ValueError:
+            continue
+    min_price = parse_decimal(params.get('min_price'))
+    max_price = parse_decimal(params.get('max_price'))
+    return {
+        'query': params.get('query', '').strip()[:100],
+        'brand': split_values(params, 'brand'),
+        'category': categories,
+        'min_price': str(min_price) if min_price is not None else None,
+        'max_price': str(max_price) if max_price is not None else None,
+        'in_stock': params.get('in_stock', '').lower() in TRUE_VALUES,
+        'on_sale': params.get('on_sale', '').lower() in TRUE_VALUES,
+    }
+
+
+def filter_q(filters, skip=()):
+    """Q for the given filters, leaving out the facets named in `skip`"""
+    q = Q()
+    if filters['query']:
+        q &= Q(title__icontains=filters['query']) | Q(category__name__icontains=filters['query'])
+    if filters['brand'] and 'brand' not in skip:
+        q &= Q(brand__in=filters['brand'])
+    if filters['category'] and 'category' not in skip:
+        q &= Q(category_id__in=filters['category'])
+    if 'price' not in skip:
+        if filters['min_price'] is not None:
+            q &= Q(new_price__gte=filters['min_price'])
+        if filters['max_price'] is not None:
+            q &= Q(new_price__lt=filters['max_price'])
+    if filters['in_stock'] and 'in_stock' not in skip:
+        q &= IN_STOCK
+    if filters['on_sale'] and 'on_sale' not in skip:
+        q &= Q(id__in=[product_id for product_id, _ in active_sales()])
+    return q
+
+
+def apply_filters(queryset, filters):
+    return queryset.filter(filter_q(filters))
+
+
+def compute_facets(filters):
+    """
+    Counts for every facet value. Each facet is counted against the other
+    active filters but not its own, so selecting one brand still shows how
+    many products the other brands would add. One grouped query per facet.
+    """
+    from api.models import Product
+
+    config = get_facet_config()
+    products = Product.objects.order_by()
+
+    brands = (
+        products.filter(filter_q(filters, skip=('brand',)))
+        .exclude(brand__isnull=True).exclude(brand='')
+        .values('brand').annotate(count=Count('id')).order_by('-count', 'brand')[:config['BRAND_LIMIT']]
+    )
+    categories = (
+        products.filter(filter_q(filters, skip=('category',)), category__isnull=False)
+        .values('category_id', 'category__name').annotate(count=Count('id')).order_by('-count')
+    )
+
+    edges = config['PRICE_BUCKETS']
+    ranges = [(edges[i], edges[i + 1] if i + 1 < len(edges) else None) for i in range(len(edges))]
+    price_counts = products.filter(filter_q(filters, skip=('price',))).aggregate(**{
+        f'bucket_{i}': Count('id', filter=Q(new_price__gte=low) & (Q(new_price__lt=high) if high is not None else Q()))
+        for i, (low, high) in enumerate(ranges)
+    })
+
+    sale_ids = [product_id for product_id, _ in active_sales()]
+    in_stock = products.filter(filter_q(filters, skip=('in_stock',)), IN_STOCK).count()
+    on_sale = products.filter(filter_q(filters, skip=('on_sale',)), id__in=sale_ids).count() if sale_ids else 0
+
+    return {
+        'brand': [{'value': row['brand'], 'count': row['count']} for row in brands],
+        'category': [
+            {'value': str(row['category_id']), 'label': row['category__name'], 'count': row['count']}
+            for row in categories
+        ],
+        'price': [
+            {'min': low, 'max': high, 'count': price_counts[f'bucket_{i}']}
+            for i, (low, high) in enumerate(ranges)
+        ],
+        'in_stock': in_stock,
+        'on_sale': on_sale,
+    }
+
+
+def facets_cache_key(filters):
+    # Every product write bumps the products version, which retires these
+    # together with the catalog ETags
+    version, = catalog_version.get_versions('products')
+    signature = hashlib.md5(json.dumps(filters, sort_keys=True).encode('utf-8')).hexdigest()
+    return f'facets:{version}:{signature}'
+
+
+def get_facets(filters):
+    """Facet counts cached per filter signature and catalog version"""
+    key = facets_cache_key(filters)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(filters)
+        cache.set(key, facets, get_facet_config()['CACHE_TIMEOUT'])
+    return facets
+
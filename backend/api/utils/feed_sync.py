@@ -0,0 +1,228 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlparse
+
+import requests
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from api.models import Product, SupplierFeedPage
+from api.utils import catalog_version
+from api.utils.images import queue_image_variants
+from api.utils.product_import import ProductImporter, remote_feed_record
+
+logger = logging.getLogger(__name__)
+
+
+def get_feed_config():
+    """Return SUPPLIER_FEED settings merged with defaults"""
+    config = getattr(settings, 'SUPPLIER_FEED', {})
+    return {
+        'URL': config.get('URL', 'https://fakeapi.net/products'),
+        'PAGE_SIZE': config.get('PAGE_SIZE', 100),
+        'CONCURRENCY': config.get('CONCURRENCY', 4),
+        'TIMEOUT': config.get('TIMEOUT', 30),
+        'MAX_PAGES': config.get('MAX_PAGES', 5000),
+        'DOWNLOAD_IMAGES': config.get('DOWNLOAD_IMAGES', True),
+    }
+
+
+def content_hash(data):
+    if not isinstance(data, bytes):
+        data = json.dumps(data, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+class SupplierFeedSync:
+    """
+    Incremental sync of the paginated supplier catalog.
+
+    Pages are fetched concurrently with conditional requests using the
+    stored ETag/Last-Modified; pages answering 304, or whose body hash is
+    unchanged, are not imported at all. Within changed pages, products
+    whose content hash matches Product.source_hash are skipped, and images
+    are only downloaded when their URL or content changed.
+    """
+
+    def __init__(self, full=False, dry_run=False, default_user=None, **overrides):
+        self.config = {**get_feed_config(), **overrides}
+        self.full = full
+        self.dry_run = dry_run
+        self.local = threading.local()
+        self.importer = ProductImporter(
+            match_on='title',
+            default_user=default_user,
+            create_categories=True,
+            dry_run=dry_run,
+        )
+        self.fetched_pages = []
+        self.pages_unchanged = 0
+        self.pages_changed = 0
+        self.images_stored = 0
+
+    @property
+    def session(self):
+        """One requests.Session per fetch thread; sessions are not thread-safe"""
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def page_url(self, page):
+        params = urlencode({'page': page, 'limit': self.config['PAGE_SIZE']})
+        return f"{self.config['URL']}?{params}"
+
+    def fetch_page(self, url, state):
+        """Runs in a worker thread: HTTP only, no database access"""
+        headers = {}
+        if state and not self.full:
+            if state.etag:
+                headers['If-None-Match'] = state.etag
+            if state.last_modified:
+                headers['If-Modified-Since'] = state.last_modified
+
+        response = self.session.get(url, headers=headers, timeout=self.config['TIMEOUT'])
+        if response.status_code == 304:
+            return {'url': url, 'status': 304}
+        response.raise_for_status()
+
+        payload = response.json()
+        items = payload if isinstance(payload, list) else payload.get('data', [])
+        return {
+            'url': url,
+            'status': response.status_code,
+            'items': items,
+            'etag': response.headers.get('ETag', ''),
+            'last_modified': response.headers.get('Last-Modified', ''),
+            'content_hash': content_hash(response.content),
+        }
+
+    def iter_changed_pages(self):
+        concurrency = self.config['CONCURRENCY']
+        page = 1
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            while page <= self.config['MAX_PAGES']:
+                urls = [self.page_url(number) for number in range(page, page + concurrency)]
+                page += concurrency
+                states = SupplierFeedPage.objects.in_bulk(urls, field_name='url')
+
+                results = list(pool.map(lambda url: self.fetch_page(url, states.get(url)), urls))
+                last_page_reached = False
+                for result in results:
+                    if result['status'] == 304:
+                        self.pages_unchanged += 1
+                        continue
+
+                    items = result['items']
+                    if len(items) < self.config['PAGE_SIZE']:
+                        last_page_reached = True
+                    if not items:
+                        continue
+
+                    state = states.get(result['url'])
+                    self.fetched_pages.append(result)
+                    if state and not self.full and state.content_hash == result['content_hash']:
+                        self.pages_unchanged += 1
+                        continue
+
+                    self.pages_changed += 1
+                    yield items
+
+                if last_page_reached:
+                    return
+
+    def to_record(self, item):
+        record = remote_feed_record(item)
+        record['source_hash'] = content_hash(item)
+        if self.config['DOWNLOAD_IMAGES']:
+            record['source_image_url'] = record.pop('image', None) or ''
+        return record
+
+    def iter_records(self):
+        for items in self.iter_changed_pages():
+            for item in items:
+                yield self.to_record(item)
+
+    def download_image(self, url):
+        """Runs in a worker thread: HTTP only, no database access"""
+        try:
+            response = self.session.get(url, timeout=self.config['TIMEOUT'])
+            response.raise_for_status()
+            return response.content
+        except requests.exceptions.RequestException as e:
+            logger.warning("Failed to download product image %s: %s", url, e)
+            return None
+
+    def sync_images(self, pending):
+        size = self.config['PAGE_SIZE']
+        changed = 0
+        for start in range(0, len(pending), size):
+            changed += self.sync_image_batch(pending[start:start + size])
+        if changed:
+            catalog_version.bump('products')
+
+    def sync_image_batch(self, pending):
+        urls = list(dict.fromkeys(url for _, url, _ in pending))
+        with ThreadPoolExecutor(max_workers=self.config['CONCURRENCY']) as pool:
+            contents = dict(zip(urls, pool.map(self.download_image, urls)))
+
+        now = timezone.now()
+        unchanged, changed = [], []
+        for product_id, url, stored_hash in pending:
+            content = contents[url]
+            if content is None:
+                continue
+
+            image_hash = content_hash(content)
+            if image_hash == stored_hash:
+                unchanged.append(Product(id=product_id, source_image_url=url))
+                continue
+
+            # Content-addressed names: identical images are stored once
+            extension = os.path.splitext(urlparse(url).path)[1] or '.jpg'
+            name = f"products/{image_hash[:32]}{extension}"
+            if not default_storage.exists(name):
+                name = default_storage.save(name, ContentFile(content))
+                transaction.on_commit(lambda name=name: queue_image_variants(name))
+                self.images_stored += 1
+
+            changed.append(Product(
+                id=product_id, image=name, source_image_url=url, source_image_hash=image_hash, updated_at=now,
+            ))
+
+        Product.objects.bulk_update(unchanged, ['source_image_url'])
+        Product.objects.bulk_update(changed, ['image', 'source_image_url', 'source_image_hash', 'updated_at'])
+        return len(changed)
+
+    def save_page_states(self):
+        # Only stored after the import, so a failed run refetches its pages
+        for result in self.fetched_pages:
+            SupplierFeedPage.objects.update_or_create(
+                url=result['url'],
+                defaults={
+                    'etag': result['etag'],
+                    'last_modified': result['last_modified'],
+                    'content_hash': result['content_hash'],
+                },
+            )
+
+    def run(self):
+        stats = self.importer.run(self.iter_records())
+        if not self.dry_run:
+            if self.importer.pending_images:
+                self.sync_images(self.importer.pending_images)
+            self.save_page_states()
+
+        summary = stats.as_dict()
+        summary.update({
+            'pages_changed': self.pages_changed,
+            'pages_unchanged': self.pages_unchanged,
+            'images_stored': self.images_stored,
+        })
+        return summary
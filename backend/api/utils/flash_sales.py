@@ -0,0 +1,135 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from api.utils import catalog_version
+
+logger = logging.getLogger(__name__)
+
+INDEX_KEY = 'flash_sales:index'
+STALE_INDEX_KEY = 'flash_sales:index:stale'
+REBUILD_LOCK_KEY = 'flash_sales:index:rebuild'
+
+
+def get_flash_sale_config():
+    """Return FLASH_SALES settings merged with defaults"""
+    config = getattr(settings, 'FLASH_SALES', {})
+    return {
+        'INDEX_TIMEOUT': config.get('INDEX_TIMEOUT', 300),
+        'LOOKAHEAD': config.get('LOOKAHEAD', timedelta(hours=24)),
+        'SCHEDULE_INTERVAL': config.get('SCHEDULE_INTERVAL', timedelta(minutes=1)),
+    }
+
+
+def timestamp(value):
+    return value.timestamp() if value else None
+
+
+def is_live(entry, now_ts):
+    _, _, start, end = entry
+    return (start is None or start <= now_ts) and end > now_ts
+
+
+def sale_is_live(product, now):
+    """Same window test as the index, for a loaded Product"""
+    if product.flash_sale_price is None or not product.flash_sale_end or product.flash_sale_end <= now:
+        return False
+    if product.flash_sale_start:
+        return product.flash_sale_start <= now
+    return product.flash_sale
+
+
+def build_index():
+    """
+    Compact list of [product_id, sale_price, start_ts, end_ts] for sales that
+    are live now or start within LOOKAHEAD, in storefront order. Readers
+    test the window against the clock themselves, so a cached index stays
+    correct as sales open and close between rebuilds.
+    """
+    from api.models import Product
+
+    now = timezone.now()
+    config = get_flash_sale_config()
+    rows = Product.objects.filter(
+        Q(flash_sale=True) | Q(flash_sale_start__lte=now + config['LOOKAHEAD']),
+        flash_sale_end__gt=now,
+    ).exclude(flash_sale_start__gt=now + config['LOOKAHEAD']).values_list(
+        'id', 'flash_sale_price', 'flash_sale_start', 'flash_sale_end'
+    )
+    return [
+        [str(product_id), str(price) if price is not None else None, timestamp(start), timestamp(end)]
+        for product_id, price, start, end in rows
+    ]
+
+
+def rebuild_index():
+    entries = build_index()
+    cache.set(INDEX_KEY, entries, get_flash_sale_config()['INDEX_TIMEOUT'])
+    cache.set(STALE_INDEX_KEY, entries, None)
+    return entries
+
+
+def get_index():
+    """
+    Cached index; on a miss one request rebuilds it while the others keep
+    serving the previous copy, so a launch spike causes a single query.
+    """
+    entries = cache.get(INDEX_KEY)
+    if entries is not None:
+        return entries
+    if cache.add(REBUILD_LOCK_KEY, 1, timeout=30):
+        try:
+            return rebuild_index()
+        finally:
+            cache.delete(REBUILD_LOCK_KEY)
+    entries = cache.get(STALE_INDEX_KEY)
+    return entries if entries is not None else build_index()
+
+
+def invalidate_index():
+    cache.delete(INDEX_KEY)
+
+
+def active_sales():
+    """[(product_id, sale_price)] of sales live right now"""
+    now_ts = time.time()
+    return [(entry[0], entry[1]) for entry in get_index() if is_live(entry, now_ts)]
+
+
+def active_sale_prices():
+    return dict(active_sales())
+
+
+def apply_schedule(now=None):
+    """
+    Flip Product.flash_sale to match each sale's window. Returns the number
+    of products switched on and off, and the next window boundary so the
+    caller can run again exactly then.
+    """
+    from api.models import Product
+
+    now = now or timezone.now()
+    started = Product.objects.filter(
+        flash_sale=False, flash_sale_start__lte=now, flash_sale_end__gt=now
+    ).update(flash_sale=True, updated_at=now)
+    ended = Product.objects.filter(flash_sale=True).filter(
+        Q(flash_sale_end__lte=now) | Q(flash_sale_start__gt=now)
+    ).update(flash_sale=False, updated_at=now)
+    if started or ended:
+        invalidate_index()
+        catalog_version.bump('products')
+        logger.info("Flash sales: %s started, %s ended", started, ended)
+
+    upcoming = Product.objects.filter(flash_sale_start__gt=now).order_by('flash_sale_start').values_list(
+        'flash_sale_start', flat=True
+    ).first()
+    ending = Product.objects.filter(flash_sale=True, flash_sale_end__gt=now).order_by('flash_sale_end').values_list(
+        'flash_sale_end', flat=True
+    ).first()
+    boundaries = [boundary for boundary in (upcoming, ending) if boundary]
+    return started, ended, min(boundaries) if boundaries else None
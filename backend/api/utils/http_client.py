@@ -0,0 +1,38 @@
+import asyncio
+import weakref
+
+import httpx
+from django.conf import settings
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_http_client_config():
+    """Return OUTBOUND_HTTP settings merged with defaults"""
+    config = getattr(settings, 'OUTBOUND_HTTP', {})
+    return {
+        'TIMEOUT': config.get('TIMEOUT', 30),
+        'MAX_CONNECTIONS': config.get('MAX_CONNECTIONS', 100),
+        'MAX_KEEPALIVE_CONNECTIONS': config.get('MAX_KEEPALIVE_CONNECTIONS', 20),
+    }
+
+
+def async_client():
+    """
+    The shared httpx.AsyncClient of the running event loop, so outbound
+    calls reuse pooled connections instead of a TLS handshake each. A pool
+    cannot outlive its loop: under ASGI a worker has one loop and one
+    client; under WSGI each async view runs on a fresh loop and gets its own.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        config = get_http_client_config()
+        client = _clients[loop] = httpx.AsyncClient(
+            timeout=config['TIMEOUT'],
+            limits=httpx.Limits(
+                max_connections=config['MAX_CONNECTIONS'],
+                max_keepalive_connections=config['MAX_KEEPALIVE_CONNECTIONS'],
+            ),
+        )
+    return client
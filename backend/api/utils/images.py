@@ -0,0 +1,200 @@
+import hashlib
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from . import catalog_version
+
+logger = logging.getLogger(__name__)
+
+CLOUDINARY_UPLOAD_MARKER = '/image/upload/'
+PIL_FORMATS = {
+    'webp': 'WEBP',
+    'jpg': 'JPEG',
+    'png': 'PNG',
+}
+
+
+def get_variant_config():
+    """Return IMAGE_VARIANTS settings merged with defaults"""
+    config = getattr(settings, 'IMAGE_VARIANTS', {})
+    return {
+        'WIDTHS': sorted(config.get('WIDTHS', [320, 640, 960])),
+        'FORMATS': config.get('FORMATS', ['webp', 'jpg']),
+        'QUALITY': config.get('QUALITY', 80),
+        'CACHE_TIMEOUT': config.get('CACHE_TIMEOUT', 60 * 60 * 24),
+        'PENDING_TIMEOUT': config.get('PENDING_TIMEOUT', 60),
+    }
+
+
+def is_remote(name):
+    return name.startswith(('http://', 'https://'))
+
+
+def variants_cache_key(name):
+    # Uploaded files never overwrite each other, so the stored name
+    # identifies one version of the image.
+    digest = hashlib.md5(name.encode('utf-8')).hexdigest()
+    return f'image_variants:{digest}'
+
+
+def variant_name(name, width, fmt):
+    """Storage path of a locally generated derivative"""
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, 'variants', f'{stem}_{width}w.{fmt}')
+
+
+def cloudinary_variant_url(url, width, fmt, quality='auto'):
+    """Insert a Cloudinary transformation into an upload URL"""
+    if CLOUDINARY_UPLOAD_MARKER not in url:
+        return None
+    head, tail = url.split(CLOUDINARY_UPLOAD_MARKER, 1)
+    transformation = f'w_{width},c_limit,f_{fmt},q_{quality}'
+    return f'{head}{CLOUDINARY_UPLOAD_MARKER}{transformation}/{tail}'
+
+
+def _remote_variants(name):
+    variants = {}
+    for width in get_variant_config()['WIDTHS']:
+        for fmt in get_variant_config()['FORMATS']:
+            url = cloudinary_variant_url(name, width, fmt)
+            if url:
+                variants.setdefault(str(width), {})[fmt] = url
+    return variants
+
+
+def get_many_image_variants(names):
+    """
+    Return {name: {width: {format: url}}} in one cache round trip. Remote
+    variants are plain URL rewrites. Local derivatives are only known once
+    generate_image_variants has run and cached them, so a miss is cached
+    as {} for PENDING_TIMEOUT (clients fall back to the original image)
+    and, when a Celery broker is configured, queues the generation, which
+    is a no-op for derivatives that already exist. Without a broker tasks
+    run inline, so readers leave it to the post_save signal and the
+    generate_image_variants command instead of resizing in the request.
+    """
+    names = {name for name in names if name}
+    if not names:
+        return {}
+
+    config = get_variant_config()
+    keys = {variants_cache_key(name): name for name in names}
+    found = cache.get_many(keys)
+    result = {keys[key]: variants for key, variants in found.items()}
+
+    resolved, pending = {}, []
+    for key, name in keys.items():
+        if key in found:
+            continue
+        if is_remote(name):
+            resolved[key] = result[name] = _remote_variants(name)
+        else:
+            result[name] = {}
+            pending.append(name)
+    if resolved:
+        cache.set_many(resolved, config['CACHE_TIMEOUT'])
+
+    for name in pending:
+        if settings.CELERY_TASK_ALWAYS_EAGER:
+            cache.add(variants_cache_key(name), {}, config['PENDING_TIMEOUT'])
+        else:
+            queue_image_variants(name)
+    return result
+
+
+def queue_image_variants(name):
+    """
+    Queue generate_image_variants for a local image, at most once per
+    PENDING_TIMEOUT: the pending {} entry doubles as the lock.
+    """
+    from api.tasks import generate_image_variants
+    if cache.add(variants_cache_key(name), {}, get_variant_config()['PENDING_TIMEOUT']):
+        generate_image_variants.delay(name)
+
+
+def get_image_variants(name):
+    """Return {width: {format: url}} for one image, see get_many_image_variants"""
+    return get_many_image_variants([name]).get(name, {})
+
+
+def generate_image_variants(name):
+    """Create resized derivatives of a locally stored image"""
+    if not name or is_remote(name):
+        return 0
+
+    config = get_variant_config()
+    if not default_storage.exists(name):
+        cache.set(variants_cache_key(name), {}, config['CACHE_TIMEOUT'])
+        return 0
+
+    created = 0
+    variants = {}
+
+    with default_storage.open(name, 'rb') as source:
+        original = Image.open(source)
+        original.load()
+
+    for width in config['WIDTHS']:
+        if width >= original.width:
+            continue
+        height = round(original.height * width / original.width)
+        resized = original.resize((width, height), Image.LANCZOS)
+
+        for fmt in config['FORMATS']:
+            path = variant_name(name, width, fmt)
+            if not default_storage.exists(path):
+                image = resized
+                if PIL_FORMATS[fmt] == 'JPEG' and image.mode not in ('RGB', 'L'):
+                    image = image.convert('RGB')
+
+                buffer = BytesIO()
+                image.save(buffer, PIL_FORMATS[fmt], quality=config['QUALITY'], optimize=True)
+                path = default_storage.save(path, ContentFile(buffer.getvalue()))
+                created += 1
+            variants.setdefault(str(width), {})[fmt] = default_storage.url(path)
+
+    # Readers never probe storage, so this is what makes the derivatives
+    # visible; the version bump moves product ETags and list caches along.
+    cache.set(variants_cache_key(name), variants, config['CACHE_TIMEOUT'])
+    catalog_version.bump('products')
+    logger.info("Generated %s variants for %s", created, name)
+    return created
+
+
+def image_variants_payload(name, request=None, variants=None):
+    """
+    Serializer representation: per-width URLs plus a srcset per format.
+    Pass `variants` when they were already fetched with get_many_image_variants.
+    """
+    if variants is None:
+        variants = get_image_variants(name)
+    if not variants:
+        return None
+
+    def absolute(url):
+        if request and not is_remote(url):
+            return request.build_absolute_uri(url)
+        return url
+
+    sizes = {
+        width: {fmt: absolute(url) for fmt, url in formats.items()}
+        for width, formats in variants.items()
+    }
+    srcset = {}
+    for fmt in get_variant_config()['FORMATS']:
+        entries = [
+            f'{formats[fmt]} {width}w'
+            for width, formats in sizes.items() if fmt in formats
+        ]
+        if entries:
+            srcset[fmt] = ', '.join(entries)
+
+    return {'sizes': sizes, 'srcset': srcset}
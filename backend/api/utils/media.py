@@ -0,0 +1,94 @@
+import mimetypes
+import os
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.http import HttpResponse, HttpResponseRedirect
+from django.urls import reverse
+from django.utils.http import content_disposition_header
+
+SIGNING_SALT = 'api.media'
+
+
+def get_media_config():
+    """Return MEDIA_DELIVERY settings merged with defaults"""
+    config = getattr(settings, 'MEDIA_DELIVERY', {})
+    return {
+        'MODE': config.get('MODE', 'x-accel'),
+        'PRIVATE_PREFIXES': tuple(config.get('PRIVATE_PREFIXES', ['branding_uploads/'])),
+        'SIGNED_URL_TTL': config.get('SIGNED_URL_TTL', 300),
+        'X_ACCEL_LOCATION': config.get('X_ACCEL_LOCATION', '/protected-media/'),
+    }
+
+
+def is_private(name):
+    return name.startswith(get_media_config()['PRIVATE_PREFIXES'])
+
+
+def is_local_storage(storage=default_storage):
+    return isinstance(storage, FileSystemStorage)
+
+
+def sign_media_name(name):
+    return signing.dumps(name, salt=SIGNING_SALT, compress=True)
+
+
+def unsign_media_name(token):
+    max_age = get_media_config()['SIGNED_URL_TTL']
+    return signing.loads(token, salt=SIGNING_SALT, max_age=max_age)
+
+
+def media_url(file, request=None):
+    """
+    URL a client should use to fetch an uploaded file.
+
+    Public files and files on remote storage are linked directly, so the
+    web server or CDN serves them. Private files on local storage get a
+    short-lived signed link that the protected_media view hands off to
+    the web server.
+    """
+    if not file:
+        return None
+
+    name = file.name
+    storage = file.storage
+    if name.startswith(('http://', 'https://')):
+        return name
+
+    if is_private(name) and is_local_storage(storage):
+        url = reverse('protected-media', kwargs={'token': sign_media_name(name)})
+    else:
+        url = storage.url(name)
+
+    if request and url.startswith('/'):
+        return request.build_absolute_uri(url)
+    return url
+
+
+def offload_response(name):
+    """
+    Response that makes the front web server send the file.
+    Django only returns headers; the body is never read by the worker.
+    """
+    config = get_media_config()
+    mode = config['MODE']
+    content_type, encoding = mimetypes.guess_type(name)
+
+    if mode == 'direct':
+        return HttpResponseRedirect(default_storage.url(name))
+
+    response = HttpResponse(content_type=content_type or 'application/octet-stream')
+    if encoding:
+        response['Content-Encoding'] = encoding
+    # Quotes and escapes the name, with filename*= for non-ASCII ones
+    response['Content-Disposition'] = content_disposition_header(False, os.path.basename(name))
+    response['Cache-Control'] = 'private, max-age=0'
+
+    if mode == 'x-sendfile':
+        response['X-Sendfile'] = default_storage.path(name)
+    else:
+        location = config['X_ACCEL_LOCATION'].rstrip('/')
+        response['X-Accel-Redirect'] = f'{location}/{name}'
+    return response
+
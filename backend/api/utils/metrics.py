@@ -0,0 +1,337 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def get_metrics_config():
+    """Return PERFORMANCE_METRICS settings merged with defaults"""
+    config = getattr(settings, 'PERFORMANCE_METRICS', {})
+    return {
+        'ENABLED': config.get('ENABLED', True),
+        'TOKEN': config.get('TOKEN', ''),
+        'SERVER_TIMING': config.get('SERVER_TIMING', True),
+        'BUCKETS': tuple(config.get('BUCKETS', DEFAULT_BUCKETS)),
+    }
+
+
+def escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{escape_label_value(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self.lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f'{self.name}{format_labels(self.labelnames, labels)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = {
+                    'buckets': [0] * (len(self.buckets) + 1),
+                    'sum': 0.0,
+                    'count': 0,
+                }
+            series['buckets'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        names = self.labelnames + ('le',)
+        with self.lock:
+            for labels, series in sorted(self.series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), series['buckets']):
+                    cumulative += count
+                    lines.append(
+                        f'{self.name}_bucket{format_labels(names, labels + (bound,))} {cumulative}'
+                    )
+                label_text = format_labels(self.labelnames, labels)
+                lines.append(f'{self.name}_sum{label_text} {series["sum"]}')
+                lines.append(f'{self.name}_count{label_text} {series["count"]}')
+        return lines
+
+
+class Registry:
+    """
+    Process-local metric registry rendered in the Prometheus text format.
+    Each worker process keeps its own values, so scrape every worker (or
+    run one metrics worker) when using a prefork server.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+buckets = get_metrics_config()['BUCKETS']
+
+REQUEST_DURATION = registry.register(Histogram(
+    'http_request_duration_seconds', 'Wall time spent handling a request',
+    ('view', 'method', 'status'), buckets,
+))
+DB_QUERIES = registry.register(Histogram(
+    'db_queries_per_request', 'SQL statements executed per request',
+    ('view',), QUERY_COUNT_BUCKETS,
+))
+DB_DURATION = registry.register(Histogram(
+    'db_query_duration_seconds', 'Total SQL time per request', ('view',), buckets,
+))
+OUTBOUND_HTTP_DURATION = registry.register(Histogram(
+    'outbound_http_duration_seconds', 'Total outbound HTTP time per request', ('view',), buckets,
+))
+CACHE_HITS = registry.register(Counter('cache_hits_total', 'Cache reads that found a value', ('view',)))
+CACHE_MISSES = registry.register(Counter('cache_misses_total', 'Cache reads that found nothing', ('view',)))
+
+
+class RequestStats:
+    """Counters collected while one request is being handled"""
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.http_count = 0
+        self.http_time = 0.0
+
+    def record_sql(self, sql, duration):
+        self.sql_time += duration
+        self.sql_count += 1
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'db;dur={self.sql_time * 1000:.1f};desc="{self.sql_count} queries"',
+            f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+            f'http;dur={self.http_time * 1000:.1f};desc="{self.http_count} calls"',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+# SQL observers are kept in a context variable rather than registered on
+# connection objects: connections are thread-local, while context variables
+# follow a request across sync_to_async into the thread running its queries.
+sql_observers = ContextVar('sql_observers', default=())
+
+
+def observed_execute(execute, sql, params, many, context):
+    observers = sql_observers.get()
+    if not observers:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        for observer in observers:
+            observer(sql, duration)
+
+
+def add_execute_wrapper(connection, **kwargs):
+    if observed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(observed_execute)
+
+
+def install_sql_hook():
+    """Attach observed_execute to every database connection, once each"""
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+
+    connection_created.connect(add_execute_wrapper, dispatch_uid='api.utils.metrics.sql_hook')
+    for connection in connections.all(initialized_only=True):
+        add_execute_wrapper(connection)
+
+
+@contextmanager
+def observe_sql(observer):
+    """Call observer(sql, duration) for each statement run in this context"""
+    install_sql_hook()
+    token = sql_observers.set(sql_observers.get() + (observer,))
+    try:
+        yield
+    finally:
+        sql_observers.reset(token)
+
+
+current_stats = ContextVar('request_stats', default=None)
+
+
+@contextmanager
+def collect_request_stats(stats):
+    """Make stats the RequestStats of everything run in this context"""
+    token = current_stats.set(stats)
+    try:
+        with observe_sql(stats.record_sql):
+            yield stats
+    finally:
+        current_stats.reset(token)
+
+_MISSING = object()
+_installed = False
+_install_lock = threading.Lock()
+
+
+def _wrap_cache_get(original):
+    def get(self, key, default=None, version=None):
+        value = original(self, key, _MISSING, version)
+        stats = current_stats.get()
+        if stats is not None:
+            if value is _MISSING:
+                stats.cache_misses += 1
+            else:
+                stats.cache_hits += 1
+        return default if value is _MISSING else value
+    get.__wrapped__ = original
+    return get
+
+
+def _wrap_cache_get_many(original):
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = original(self, keys, version)
+        stats = current_stats.get()
+        if stats is not None:
+            stats.cache_hits += len(values)
+            stats.cache_misses += len(keys) - len(values)
+        return values
+    get_many.__wrapped__ = original
+    return get_many
+
+
+def _record_http(start):
+    stats = current_stats.get()
+    if stats is not None:
+        stats.http_time += time.perf_counter() - start
+        stats.http_count += 1
+
+
+def _wrap_http_request(original):
+    def request(self, method, url, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original(self, method, url, *args, **kwargs)
+        finally:
+            _record_http(start)
+    request.__wrapped__ = original
+    request.records_request_stats = True
+    return request
+
+
+def _wrap_httpx_send(original):
+    def send(self, request, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original(self, request, *args, **kwargs)
+        finally:
+            _record_http(start)
+    send.__wrapped__ = original
+    send.records_request_stats = True
+    return send
+
+
+def _wrap_httpx_async_send(original):
+    async def send(self, request, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await original(self, request, *args, **kwargs)
+        finally:
+            _record_http(start)
+    send.__wrapped__ = original
+    send.records_request_stats = True
+    return send
+
+
+def install_instrumentation():
+    """Hook SQL, cache reads and outbound `requests`/httpx calls into RequestStats"""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        from django.core.cache import caches
+        from django.core.cache.backends.base import BaseCache
+
+        install_sql_hook()
+        import httpx
+        import requests
+
+        for alias in settings.CACHES:
+            backend_class = type(caches[alias])
+            if not hasattr(backend_class.get, '__wrapped__'):
+                backend_class.get = _wrap_cache_get(backend_class.get)
+            # BaseCache.get_many loops over self.get, which already counts
+            if backend_class.get_many is not BaseCache.get_many and not hasattr(backend_class.get_many, '__wrapped__'):
+                backend_class.get_many = _wrap_cache_get_many(backend_class.get_many)
+
+        # Other instrumentation (sentry-sdk) also wraps these with functools.wraps,
+        # so __wrapped__ alone doesn't tell whether ours is installed
+        session_class = requests.Session
+        if not getattr(session_class.request, 'records_request_stats', False):
+            session_class.request = _wrap_http_request(session_class.request)
+        # Every httpx request, the shared async client's and Stripe's, goes through send
+        if not getattr(httpx.Client.send, 'records_request_stats', False):
+            httpx.Client.send = _wrap_httpx_send(httpx.Client.send)
+        if not getattr(httpx.AsyncClient.send, 'records_request_stats', False):
+            httpx.AsyncClient.send = _wrap_httpx_async_send(httpx.AsyncClient.send)
+        _installed = True
+
+
+def record_request(view, method, status, duration, stats):
+    labels = (view,)
+    REQUEST_DURATION.observe(duration, (view, method, str(status)))
+    DB_QUERIES.observe(stats.sql_count, labels)
+    DB_DURATION.observe(stats.sql_time, labels)
+    OUTBOUND_HTTP_DURATION.observe(stats.http_time, labels)
+    if stats.cache_hits:
+        CACHE_HITS.inc(labels, stats.cache_hits)
+    if stats.cache_misses:
+        CACHE_MISSES.inc(labels, stats.cache_misses)
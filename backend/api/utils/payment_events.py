@@ -0,0 +1,235 @@
+import asyncio
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = {'completed', 'failed', 'cancelled'}
+
+
+def get_events_config():
+    """Return PAYMENT_EVENTS settings merged with defaults"""
+    config = getattr(settings, 'PAYMENT_EVENTS', {})
+    redis_url = getattr(settings, 'REDIS_URL', '')
+    return {
+        'BACKEND': config.get('BACKEND', 'redis' if redis_url else 'memory'),
+        'REDIS_URL': config.get('REDIS_URL', redis_url),
+        'HEARTBEAT': config.get('HEARTBEAT', 15),
+        'MAX_STREAM_SECONDS': config.get('MAX_STREAM_SECONDS', 300),
+        'RETRY_MS': config.get('RETRY_MS', 3000),
+    }
+
+
+def payment_channel(payment_id):
+    return f'payments:payment:{payment_id}'
+
+
+def order_channel(order_number):
+    return f'payments:order:{order_number}'
+
+
+class InMemorySubscription:
+    def __init__(self, bus, channels):
+        self.bus = bus
+        self.channels = channels
+        self.queue = None
+        self.key = None
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        self.key = (asyncio.get_running_loop(), self.queue)
+        with self.bus.lock:
+            for channel in self.channels:
+                self.bus.subscribers.setdefault(channel, set()).add(self.key)
+
+    async def get(self, timeout):
+        """Next message, or None after `timeout` seconds without one"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        with self.bus.lock:
+            for channel in self.channels:
+                subscribers = self.bus.subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(self.key)
+                    if not subscribers:
+                        del self.bus.subscribers[channel]
+
+
+class InMemoryBus:
+    """
+    Process-local pub/sub. Publishers may run in any thread; each
+    subscriber owns an asyncio.Queue on its event loop. Only reaches
+    subscribers in the same process, so use Redis with several workers.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+
+    def publish(self, channel, message):
+        with self.lock:
+            targets = list(self.subscribers.get(channel, ()))
+        for loop, queue in targets:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, message)
+            except RuntimeError:
+                pass  # subscriber's loop already closed
+
+    def subscribe(self, channels):
+        return InMemorySubscription(self, channels)
+
+
+class RedisSubscription:
+    def __init__(self, url, channels):
+        self.url = url
+        self.channels = channels
+        self.client = None
+        self.pubsub = None
+
+    async def start(self):
+        import redis.asyncio
+
+        self.client = redis.asyncio.Redis.from_url(self.url)
+        self.pubsub = self.client.pubsub()
+        await self.pubsub.subscribe(*self.channels)
+
+    async def get(self, timeout):
+        message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        if message is None:
+            return None
+        data = message['data']
+        return data.decode('utf-8') if isinstance(data, bytes) else data
+
+    async def close(self):
+        if self.pubsub is not None:
+            await self.pubsub.unsubscribe(*self.channels)
+            await self.pubsub.aclose()
+        if self.client is not None:
+            await self.client.aclose()
+
+
+class RedisBus:
+    """Redis pub/sub, shared by every worker process"""
+
+    def __init__(self, url):
+        import redis
+
+        self.url = url
+        self.client = redis.Redis.from_url(url)
+
+    def publish(self, channel, message):
+        self.client.publish(channel, message)
+
+    def subscribe(self, channels):
+        return RedisSubscription(self.url, channels)
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_bus():
+    global _bus
+    with _bus_lock:
+        if _bus is None:
+            config = get_events_config()
+            if config['BACKEND'] == 'redis' and config['REDIS_URL']:
+                _bus = RedisBus(config['REDIS_URL'])
+            else:
+                _bus = InMemoryBus()
+        return _bus
+
+
+def payment_event(payment, order=None):
+    """Payload pushed to clients; matches the order_payment_status fields"""
+    return {
+        'payment_id': str(payment.id),
+        'status': payment.status,
+        'reference': payment.reference_number,
+        'payment_method': payment.payment_method,
+        'order_id': str(order.id) if order else None,
+        'order_number': order.orderId if order else None,
+        'is_paid': order.isPaid if order else payment.status == 'completed',
+        'updated_at': payment.updated_at.isoformat() if payment.updated_at else None,
+    }
+
+
+def publish_payment_status(payment):
+    """
+    Publish a payment's current status to its payment and order channels
+    once the surrounding transaction commits. Safe to call from sync code
+    only; async callers wrap it in sync_to_async.
+    """
+    order = payment.order if payment.order_id else None
+    message = json.dumps(payment_event(payment, order))
+    channels = [payment_channel(payment.id)]
+    if order is not None and order.orderId:
+        channels.append(order_channel(order.orderId))
+
+    def send():
+        bus = get_bus()
+        for channel in channels:
+            try:
+                bus.publish(channel, message)
+            except Exception as e:
+                logger.warning("Failed to publish payment event on %s: %s", channel, e)
+
+    transaction.on_commit(send)
+
+
+def sse_message(data, event='status'):
+    return f'event: {event}\ndata: {data}\n\n'
+
+
+async def event_stream(get_snapshot, channels):
+    """
+    Server-sent events for one payment or order: the current state first,
+    then every published transition, with heartbeats in between. Ends on a
+    terminal status or after MAX_STREAM_SECONDS; clients should close their
+    EventSource on a terminal status and let it reconnect otherwise.
+
+    The subscription is opened before the snapshot is read, so a transition
+    committed in between is still delivered.
+    """
+    config = get_events_config()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + config['MAX_STREAM_SECONDS']
+
+    subscription = get_bus().subscribe(channels)
+    await subscription.start()
+    try:
+        snapshot = await get_snapshot()
+        yield f"retry: {config['RETRY_MS']}\n\n"
+        yield sse_message(json.dumps(snapshot))
+        if snapshot.get('status') in TERMINAL_STATUSES:
+            return
+
+        while loop.time() < deadline:
+            message = await subscription.get(min(config['HEARTBEAT'], deadline - loop.time()))
+            if message is None:
+                yield ': keep-alive\n\n'
+                continue
+            yield sse_message(message)
+            if json.loads(message).get('status') in TERMINAL_STATUSES:
+                return
+    finally:
+        await subscription.close()
+
+
+async def event_poll(get_snapshot):
+    """
+    Single-event body for servers that cannot stream: WSGI buffers an
+    async iterator until it ends, so event_stream would reach the client
+    all at once after MAX_STREAM_SECONDS. The client's EventSource
+    reconnects every RETRY_MS instead, which is polling on the same URL.
+    """
+    snapshot = await get_snapshot()
+    return f"retry: {get_events_config()['RETRY_MS']}\n\n" + sse_message(json.dumps(snapshot))
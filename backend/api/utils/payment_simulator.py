@@ -0,0 +1,300 @@
+import hashlib
+import hmac
+import json
+import logging
+import random
+import secrets
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def get_simulator_config():
+    """Return PAYMENT_SIMULATOR settings merged with defaults"""
+    config = getattr(settings, 'PAYMENT_SIMULATOR', {})
+    return {
+        'HOST': config.get('HOST', '127.0.0.1'),
+        'PORT': config.get('PORT', 8089),
+        'LATENCY_MS': config.get('LATENCY_MS', 150),
+        'LATENCY_JITTER_MS': config.get('LATENCY_JITTER_MS', 50),
+        'FAILURE_RATE': config.get('FAILURE_RATE', 0.0),
+        'DUPLICATE_CALLBACK_RATE': config.get('DUPLICATE_CALLBACK_RATE', 0.0),
+        'CALLBACK_DELAY': config.get('CALLBACK_DELAY', 2.0),
+        'STRIPE_AUTO_CONFIRM': config.get('STRIPE_AUTO_CONFIRM', True),
+        'STRIPE_WEBHOOK_URL': config.get('STRIPE_WEBHOOK_URL', 'http://127.0.0.1:8000/api/stripe-webhook/'),
+        'STRIPE_WEBHOOK_SECRET': config.get(
+            'STRIPE_WEBHOOK_SECRET', settings.STRIPE_CONFIG.get('WEBHOOK_SECRET') or ''
+        ),
+    }
+
+
+def stripe_signature(payload, secret, timestamp=None):
+    """Stripe-Signature header value accepted by stripe.Webhook.construct_event"""
+    timestamp = timestamp or int(time.time())
+    signed = f'{timestamp}.{payload}'.encode('utf-8')
+    digest = hmac.new(secret.encode('utf-8'), signed, hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={digest}'
+
+
+class PaymentSimulator:
+    """
+    In-memory stand-in for Safaricom Daraja (OAuth, STK push, STK query)
+    and the Stripe PaymentIntent API. Results are delivered the way the
+    real providers do: an M-Pesa callback POSTed to the CallBackURL of the
+    STK push, and a signed Stripe event POSTed to the webhook URL.
+    """
+
+    def __init__(self, **overrides):
+        self.config = {**get_simulator_config(), **overrides}
+        self.lock = threading.Lock()
+        self.tokens = set()
+        self.stk_requests = {}
+        self.payment_intents = {}
+
+    # Behaviour knobs
+
+    def delay(self):
+        latency = self.config['LATENCY_MS'] + random.uniform(
+            -self.config['LATENCY_JITTER_MS'], self.config['LATENCY_JITTER_MS']
+        )
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+    def fails(self):
+        return random.random() < self.config['FAILURE_RATE']
+
+    def deliveries(self):
+        return 2 if random.random() < self.config['DUPLICATE_CALLBACK_RATE'] else 1
+
+    def schedule(self, func, *args):
+        timer = threading.Timer(self.config['CALLBACK_DELAY'], func, args)
+        timer.daemon = True
+        timer.start()
+
+    def post_json(self, url, body, headers=None):
+        # Each delivery runs on its own Timer thread and requests.Session is
+        # not thread-safe, so a callback gets its own session; a duplicate
+        # delivery still reuses the connection.
+        with requests.Session() as session:
+            for attempt in range(self.deliveries()):
+                try:
+                    response = session.post(url, data=body, timeout=10,
+                                            headers={'Content-Type': 'application/json', **(headers or {})})
+                    logger.info("Delivered %s (attempt %s): %s", url, attempt + 1, response.status_code)
+                except requests.exceptions.RequestException as e:
+                    logger.warning("Callback delivery to %s failed: %s", url, e)
+
+    # M-Pesa Daraja
+
+    def mpesa_token(self):
+        token = secrets.token_urlsafe(24)
+        with self.lock:
+            self.tokens.add(token)
+        return {'access_token': token, 'expires_in': '3599'}
+
+    def authorized(self, headers):
+        token = headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        with self.lock:
+            return token in self.tokens
+
+    def stk_push(self, payload):
+        checkout_request_id = f'ws_CO_{datetime.now():%d%m%Y%H%M%S}{secrets.token_hex(6)}'
+        merchant_request_id = f'{random.randint(10000, 99999)}-{random.randint(1000000, 9999999)}-1'
+        succeeded = not self.fails()
+        result = {
+            'merchant_request_id': merchant_request_id,
+            'amount': payload.get('Amount'),
+            'phone': payload.get('PhoneNumber'),
+            'result_code': 0 if succeeded else 1032,
+            'result_desc': ('The service request is processed successfully.' if succeeded
+                            else 'Request cancelled by user'),
+            'receipt': secrets.token_hex(5).upper(),
+            'completed': False,
+        }
+        with self.lock:
+            self.stk_requests[checkout_request_id] = result
+
+        if payload.get('CallBackURL'):
+            self.schedule(self.deliver_stk_callback, payload['CallBackURL'], checkout_request_id)
+        return {
+            'MerchantRequestID': merchant_request_id,
+            'CheckoutRequestID': checkout_request_id,
+            'ResponseCode': '0',
+            'ResponseDescription': 'Success. Request accepted for processing',
+            'CustomerMessage': 'Success. Request accepted for processing',
+        }
+
+    def stk_callback_body(self, checkout_request_id, result):
+        callback = {
+            'MerchantRequestID': result['merchant_request_id'],
+            'CheckoutRequestID': checkout_request_id,
+            'ResultCode': result['result_code'],
+            'ResultDesc': result['result_desc'],
+        }
+        if result['result_code'] == 0:
+            callback['CallbackMetadata'] = {'Item': [
+                {'Name': 'Amount', 'Value': result['amount']},
+                {'Name': 'MpesaReceiptNumber', 'Value': result['receipt']},
+                {'Name': 'TransactionDate', 'Value': int(f'{datetime.now():%Y%m%d%H%M%S}')},
+                {'Name': 'PhoneNumber', 'Value': result['phone']},
+            ]}
+        return {'Body': {'stkCallback': callback}}
+
+    def deliver_stk_callback(self, url, checkout_request_id):
+        with self.lock:
+            result = self.stk_requests[checkout_request_id]
+            result['completed'] = True
+        self.post_json(url, json.dumps(self.stk_callback_body(checkout_request_id, result)))
+
+    def stk_query(self, payload):
+        with self.lock:
+            result = self.stk_requests.get(payload.get('CheckoutRequestID'))
+        if result is None:
+            return 404, {'errorCode': '400.002.02', 'errorMessage': 'Invalid CheckoutRequestID'}
+        if not result['completed']:
+            return 500, {'errorCode': '500.001.1001', 'errorMessage': 'The transaction is being processed'}
+        return 200, {
+            'ResponseCode': '0',
+            'ResponseDescription': 'The service request has been accepted successsfully',
+            'MerchantRequestID': result['merchant_request_id'],
+            'CheckoutRequestID': payload['CheckoutRequestID'],
+            'ResultCode': str(result['result_code']),
+            'ResultDesc': result['result_desc'],
+        }
+
+    # Stripe
+
+    def create_payment_intent(self, params):
+        intent_id = f'pi_{secrets.token_hex(12)}'
+        intent = {
+            'id': intent_id,
+            'object': 'payment_intent',
+            'amount': int(params.get('amount', 0)),
+            'currency': params.get('currency', 'usd'),
+            'client_secret': f'{intent_id}_secret_{secrets.token_hex(8)}',
+            'created': int(time.time()),
+            'livemode': False,
+            'receipt_email': params.get('receipt_email'),
+            'status': 'requires_payment_method',
+            'charges': {'object': 'list', 'data': []},
+        }
+        with self.lock:
+            self.payment_intents[intent_id] = intent
+        if self.config['STRIPE_AUTO_CONFIRM']:
+            self.schedule(self.confirm_payment_intent, intent_id)
+        return intent
+
+    def retrieve_payment_intent(self, intent_id):
+        with self.lock:
+            return self.payment_intents.get(intent_id)
+
+    def confirm_payment_intent(self, intent_id):
+        with self.lock:
+            intent = self.payment_intents.get(intent_id)
+            if intent is None or intent['status'] == 'succeeded':
+                return intent
+            if self.fails():
+                intent['status'] = 'requires_payment_method'
+                event_type = 'payment_intent.payment_failed'
+            else:
+                intent['status'] = 'succeeded'
+                intent['charges']['data'] = [{
+                    'id': f'ch_{secrets.token_hex(12)}',
+                    'object': 'charge',
+                    'payment_method_details': {'card': {'brand': 'visa', 'last4': '4242'}},
+                }]
+                event_type = 'payment_intent.succeeded'
+            snapshot = json.loads(json.dumps(intent))
+        self.deliver_stripe_event(event_type, snapshot)
+        return intent
+
+    def deliver_stripe_event(self, event_type, intent):
+        payload = json.dumps({
+            'id': f'evt_{secrets.token_hex(12)}',
+            'object': 'event',
+            'api_version': '2024-06-20',
+            'created': int(time.time()),
+            'livemode': False,
+            'type': event_type,
+            'data': {'object': intent},
+        })
+        signature = stripe_signature(payload, self.config['STRIPE_WEBHOOK_SECRET'])
+        self.post_json(self.config['STRIPE_WEBHOOK_URL'], payload, {'Stripe-Signature': signature})
+
+
+def stripe_error(message, status=404):
+    return status, {'error': {'type': 'invalid_request_error', 'message': message}}
+
+
+def make_handler(simulator):
+    class Handler(BaseHTTPRequestHandler):
+        server_version = 'PaymentSimulator/1.0'
+
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+        def read_body(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            return self.rfile.read(length).decode('utf-8') if length else ''
+
+        def respond(self, status, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def route(self, method):
+            simulator.delay()
+            path = urlparse(self.path).path.rstrip('/')
+            body = self.read_body()
+
+            if path == '/oauth/v1/generate' and method == 'GET':
+                return 200, simulator.mpesa_token()
+            if path.startswith('/mpesa/'):
+                if not simulator.authorized(self.headers):
+                    return 401, {'errorCode': '404.001.03', 'errorMessage': 'Invalid Access Token'}
+                payload = json.loads(body or '{}')
+                if path == '/mpesa/stkpush/v1/processrequest':
+                    return 200, simulator.stk_push(payload)
+                if path == '/mpesa/stkpushquery/v1/query':
+                    return simulator.stk_query(payload)
+
+            if path.startswith('/v1/payment_intents'):
+                params = {key: values[-1] for key, values in parse_qs(body).items()}
+                parts = path.split('/')[3:]
+                if not parts and method == 'POST':
+                    return 200, simulator.create_payment_intent(params)
+                intent = simulator.retrieve_payment_intent(parts[0]) if parts else None
+                if intent is None:
+                    return stripe_error(f"No such payment_intent: '{parts[0] if parts else ''}'")
+                if len(parts) == 1:
+                    return 200, intent
+                if parts[1] == 'confirm' and method == 'POST':
+                    return 200, simulator.confirm_payment_intent(parts[0])
+
+            return 404, {'error': f'Unknown simulator endpoint {method} {path}'}
+
+        def do_GET(self):
+            self.respond(*self.route('GET'))
+
+        def do_POST(self):
+            self.respond(*self.route('POST'))
+
+    return Handler
+
+
+def make_server(simulator):
+    """HTTP server for the Daraja and Stripe stand-ins on HOST:PORT"""
+    config = simulator.config
+    server = ThreadingHTTPServer((config['HOST'], config['PORT']), make_handler(simulator))
+    server.daemon_threads = True
+    return server
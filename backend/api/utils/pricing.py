@@ -0,0 +1,146 @@
+import uuid
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.utils import timezone
+
+from api.utils.flash_sales import sale_is_live
+
+CENT = Decimal('0.01')
+# Product columns needed to price a product
+PRICE_FIELDS = ('id', 'title', 'is_active', 'new_price', 'flash_sale', 'flash_sale_price',
+                'flash_sale_start', 'flash_sale_end')
+
+
+def get_pricing_config():
+    """Return PRICING settings merged with defaults"""
+    config = getattr(settings, 'PRICING', {})
+    return {
+        'CURRENCY': config.get('CURRENCY', 'KES'),
+        'TAX_RATE': Decimal(str(config.get('TAX_RATE', '0'))),
+        'SHIPPING_FLAT': Decimal(str(config.get('SHIPPING_FLAT', '0'))),
+        'FREE_SHIPPING_OVER': (
+            Decimal(str(config['FREE_SHIPPING_OVER'])) if config.get('FREE_SHIPPING_OVER') is not None else None
+        ),
+        'MAX_QUANTITY': config.get('MAX_QUANTITY', 100),
+    }
+
+
+def money(value):
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class PricingError(Exception):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(errors))
+
+
+class CartLine:
+    def __init__(self, product, quantity, unit_price, on_sale):
+        self.product = product
+        self.quantity = quantity
+        self.unit_price = unit_price
+        self.on_sale = on_sale
+        self.line_total = money(unit_price * quantity)
+
+    def as_dict(self):
+        return {
+            'product': str(self.product.id),
+            'title': self.product.title,
+            'quantity': self.quantity,
+            'unit_price': str(self.unit_price),
+            'flash_sale': self.on_sale,
+            'line_total': str(self.line_total),
+        }
+
+
+class CartQuote:
+    def __init__(self, lines, subtotal, shipping, tax, total, currency):
+        self.lines = lines
+        self.subtotal = subtotal
+        self.shipping = shipping
+        self.tax = tax
+        self.total = total
+        self.currency = currency
+
+    def as_dict(self):
+        return {
+            'items': [line.as_dict() for line in self.lines],
+            'subtotal': str(self.subtotal),
+            'shippingPrice': str(self.shipping),
+            'taxPrice': str(self.tax),
+            'totalPrice': str(self.total),
+            'currency': self.currency,
+        }
+
+
+def current_price(product, now):
+    """(unit price, on_sale) the product sells at right now"""
+    on_sale = sale_is_live(product, now)
+    return (product.flash_sale_price if on_sale else product.new_price), on_sale
+
+
+def merge_items(items):
+    """{product_id: quantity} from [{'product': id, 'quantity': n}], summing repeated products"""
+    quantities = {}
+    errors = []
+    for item in items:
+        product = item.get('product')
+        product_id = getattr(product, 'pk', product)
+        try:
+            product_id = product_id if isinstance(product_id, uuid.UUID) else uuid.UUID(str(product_id))
+            quantity = int(item.get('quantity', 0))
+        except (TypeError, ValueError):
+            errors.append(f"Invalid cart item {item!r}")
+            continue
+        if quantity < 1:
+            errors.append(f"Quantity for product {product_id} must be at least 1")
+            continue
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities, errors
+
+
+def quote_cart(items, now=None):
+    """
+    Price a whole cart from the catalog: one query for every product, then
+    unit prices (the flash-sale price while its window is live, otherwise
+    new_price), line totals, shipping, tax and total in a single Decimal
+    pass. Client-supplied prices are never read. Raises PricingError.
+    """
+    from api.models import Product
+
+    config = get_pricing_config()
+    now = now or timezone.now()
+    quantities, errors = merge_items(items)
+    if not quantities and not errors:
+        errors.append("Cart is empty")
+
+    products = Product.objects.only(*PRICE_FIELDS).in_bulk(list(quantities))
+
+    lines = []
+    subtotal = Decimal('0')
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
+        if product is None or not product.is_active:
+            errors.append(f"Product {product_id} is not available")
+            continue
+        if quantity > config['MAX_QUANTITY']:
+            errors.append(f"At most {config['MAX_QUANTITY']} of product {product_id} per order")
+            continue
+        unit_price, on_sale = current_price(product, now)
+        if unit_price is None:
+            errors.append(f"Product {product_id} has no price")
+            continue
+        line = CartLine(product, quantity, money(unit_price), on_sale)
+        subtotal += line.line_total
+        lines.append(line)
+
+    if errors:
+        raise PricingError(errors)
+
+    free_over = config['FREE_SHIPPING_OVER']
+    shipping = Decimal('0') if free_over is not None and subtotal >= free_over else config['SHIPPING_FLAT']
+    shipping = money(shipping)
+    tax = money(subtotal * config['TAX_RATE'])
+    return CartQuote(lines, subtotal, shipping, tax, subtotal + shipping + tax, config['CURRENCY'])
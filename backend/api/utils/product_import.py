@@ -0,0 +1,384 @@
+import csv
+import io
+import json
+import logging
+import time
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from api.models import Categories, Product
+from api.utils import catalog_version
+
+logger = logging.getLogger(__name__)
+
+# Fields compared against existing rows and written on update.
+# Date_added is left out: it is auto_now_add and only set on create.
+SYNC_FIELDS = [
+    'title', 'image', 'brand', 'category', 'description', 'is_active',
+    'rating', 'numReviews', 'countInStock', 'new_price', 'old_price',
+    'specs', 'best_seller', 'flash_sale', 'flash_sale_price', 'flash_sale_end',
+    'source_hash',
+]
+DECIMAL_FIELDS = {'new_price', 'old_price', 'flash_sale_price'}
+INTEGER_FIELDS = {'rating', 'numReviews', 'countInStock'}
+BOOLEAN_FIELDS = {'is_active', 'best_seller', 'flash_sale'}
+CENTS = Decimal('0.01')
+
+
+# Readers: each yields one dict per product without loading the whole file
+
+def iter_json_array(stream, chunk_size=64 * 1024):
+    """Incrementally decode the objects of a top-level JSON array"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+
+    while True:
+        chunk = stream.read(chunk_size)
+        buffer += chunk
+        pos = 0
+
+        if not started:
+            buffer = buffer.lstrip()
+            if not buffer:
+                if not chunk:
+                    return
+                continue
+            if buffer[0] == '{':
+                # Wrapped feed such as {"data": [...]}; needs the full document
+                document = json.loads(buffer + stream.read())
+                yield from document.get('data', [])
+                return
+            if buffer[0] != '[':
+                raise ValueError("Expected a JSON array of products")
+            buffer = buffer[1:]
+            started = True
+
+        while True:
+            remainder = buffer[pos:].lstrip(' \t\r\n,')
+            pos = len(buffer) - len(remainder)
+            if remainder.startswith(']'):
+                return
+            if not remainder:
+                break
+            try:
+                record, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break
+            yield record
+
+        buffer = buffer[pos:]
+        if not chunk:
+            if buffer.strip():
+                raise ValueError("Truncated JSON array")
+            return
+
+
+def iter_ndjson(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_csv(stream):
+    for row in csv.DictReader(stream):
+        if row.get('specs'):
+            row['specs'] = json.loads(row['specs'])
+        yield {key: (value if value != '' else None) for key, value in row.items()}
+
+
+READERS = {
+    'json': iter_json_array,
+    'ndjson': iter_ndjson,
+    'jsonl': iter_ndjson,
+    'csv': iter_csv,
+}
+
+
+def detect_format(path):
+    extension = path.rsplit('.', 1)[-1].lower()
+    if extension not in READERS:
+        raise ValueError(f"Unsupported import format: {extension}")
+    return extension
+
+
+def iter_records(stream, fmt):
+    if isinstance(stream, (bytes, str)):
+        stream = io.StringIO(stream.decode('utf-8') if isinstance(stream, bytes) else stream)
+    return READERS[fmt](stream)
+
+
+def remote_feed_record(item):
+    """Map a supplier feed item (fakeapi.net shape) onto Product fields"""
+    rating_info = item.get('rating') or {}
+    return {
+        'title': item.get('title'),
+        'description': item.get('description'),
+        'image': item.get('image'),
+        'category_name': item.get('category') or 'uncategorized',
+        'brand': item.get('brand'),
+        'countInStock': item.get('stock', 0),
+        'rating': rating_info.get('rate', 0),
+        'numReviews': rating_info.get('count', 0),
+        'new_price': item.get('price'),
+    }
+
+
+class ImportStats:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.errors = 0
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    @property
+    def processed(self):
+        return self.created + self.updated + self.skipped + self.errors
+
+    @property
+    def rows_per_second(self):
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+    def stop(self):
+        self.elapsed = time.monotonic() - self.started
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'skipped': self.skipped,
+            'errors': self.errors,
+            'elapsed': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+    def __str__(self):
+        return (
+            f"created={self.created} updated={self.updated} skipped={self.skipped} "
+            f"errors={self.errors} in {self.elapsed:.2f}s ({self.rows_per_second:.0f} rows/s)"
+        )
+
+
+class ProductImporter:
+    """
+    Batch importer for products.
+
+    Each batch costs one SELECT of the matching rows and one upsert
+    (INSERT ... ON CONFLICT (id) DO UPDATE) for the new and changed rows;
+    unchanged rows are skipped. Rows are matched on `id` when the feed
+    provides one, otherwise on `title`.
+    """
+
+    def __init__(self, match_on='id', batch_size=1000, default_user=None,
+                 create_categories=False, dry_run=False):
+        if match_on not in ('id', 'title'):
+            raise ValueError("match_on must be 'id' or 'title'")
+        self.match_on = match_on
+        self.batch_size = batch_size
+        self.default_user = default_user
+        self.create_categories = create_categories
+        self.dry_run = dry_run
+        self.stats = ImportStats()
+        self.categories_by_id = {}
+        self.categories_by_name = {}
+        # (product id, image url, stored image hash) for images to fetch
+        self.pending_images = []
+
+    def load_categories(self):
+        for category in Categories.objects.all():
+            self.categories_by_id[str(category.id)] = category
+            self.categories_by_name[category.name.lower()] = category
+
+    def run(self, records):
+        self.load_categories()
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        self.stats.stop()
+        return self.stats
+
+    # Normalization
+
+    @staticmethod
+    def to_decimal(value):
+        if value in (None, ''):
+            return None
+        try:
+            return Decimal(str(value)).quantize(CENTS)
+        except InvalidOperation:
+            raise ValueError(f"Invalid decimal: {value}")
+
+    @staticmethod
+    def to_bool(value):
+        if isinstance(value, str):
+            return value.strip().lower() in ('1', 'true', 'yes')
+        return bool(value)
+
+    @staticmethod
+    def to_datetime(value):
+        if value in (None, ''):
+            return None
+        parsed = parse_datetime(value) if isinstance(value, str) else value
+        if parsed is not None and timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    def resolve_category(self, record, missing_names):
+        if record.get('category_name') is not None:
+            name = str(record['category_name'])
+            category = self.categories_by_name.get(name.lower())
+            if category is None and self.create_categories:
+                missing_names.add(name)
+                return name
+            return category
+        category_id = record.get('category')
+        return self.categories_by_id.get(str(category_id)) if category_id else None
+
+    def normalize(self, record, missing_names):
+        values = {}
+        for field in SYNC_FIELDS:
+            if field == 'category':
+                continue
+            if field not in record:
+                continue
+            value = record[field]
+            if field in DECIMAL_FIELDS:
+                value = self.to_decimal(value)
+            elif field in INTEGER_FIELDS:
+                value = int(round(float(value))) if value not in (None, '') else 0
+            elif field in BOOLEAN_FIELDS:
+                value = self.to_bool(value)
+            elif field == 'flash_sale_end':
+                value = self.to_datetime(value)
+            elif field == 'image':
+                value = value or ''  # FileField stores a missing file as ''
+            values[field] = value
+
+        if not values.get('title'):
+            raise ValueError("Missing title")
+
+        category = self.resolve_category(record, missing_names)
+        if category is None:
+            raise LookupError(f"Unknown category for {values['title']}")
+        values['category'] = category
+        if record.get('id'):
+            values['id'] = uuid.UUID(str(record['id']))
+        return values, record.get('source_image_url')
+
+    def create_missing_categories(self, names):
+        new_categories = [Categories(name=name) for name in names]
+        if not self.dry_run:
+            Categories.objects.bulk_create(new_categories)
+            catalog_version.bump('categories')
+        for category in new_categories:
+            self.categories_by_id[str(category.id)] = category
+            self.categories_by_name[category.name.lower()] = category
+
+    # Batch processing
+
+    def fetch_existing(self, keys):
+        lookup = f'{self.match_on}__in'
+        columns = ['id', 'title', 'category_id', 'source_image_url', 'source_image_hash'] + [
+            field for field in SYNC_FIELDS if field not in ('title', 'category')
+        ]
+        return {
+            str(row[self.match_on]): row
+            for row in Product.objects.filter(**{lookup: keys}).values(*columns)
+        }
+
+    @staticmethod
+    def has_changes(values, existing):
+        for field, value in values.items():
+            if field == 'id':
+                continue
+            if field == 'category':
+                if existing['category_id'] != value.id:
+                    return True
+            elif existing.get(field) != value:
+                return True
+        return False
+
+    def import_batch(self, batch):
+        missing_names = set()
+        rows = []
+        for record in batch:
+            try:
+                rows.append(self.normalize(record, missing_names))
+            except LookupError as e:
+                self.stats.skipped += 1
+                logger.warning("Skipping product: %s", e)
+            except (ValueError, TypeError) as e:
+                self.stats.errors += 1
+                logger.warning("Invalid product row: %s", e)
+
+        if missing_names:
+            self.create_missing_categories(missing_names)
+            for values, _ in rows:
+                if isinstance(values['category'], str):
+                    values['category'] = self.categories_by_name[values['category'].lower()]
+
+        keyed = {}
+        for values, image_url in rows:
+            key = str(values.get(self.match_on) or '')
+            if not key:
+                self.stats.errors += 1
+                continue
+            keyed[key] = (values, image_url)  # last occurrence in a batch wins
+
+        existing = self.fetch_existing(list(keyed.keys()))
+        to_write = []
+        update_fields = set()
+        for key, (values, image_url) in keyed.items():
+            current = existing.get(key)
+            if current is None:
+                product = Product(user=self.default_user, **values)
+                to_write.append(product)
+                if image_url:
+                    self.pending_images.append((product.id, image_url, ''))
+                self.stats.created += 1
+                continue
+
+            # source_image_url is only recorded after a successful download,
+            # so a failed fetch is retried on the next run.
+            if image_url and image_url != current['source_image_url']:
+                self.pending_images.append((current['id'], image_url, current['source_image_hash']))
+
+            source_hash = values.get('source_hash')
+            if source_hash and source_hash == current['source_hash']:
+                self.stats.skipped += 1
+            elif self.has_changes(values, current):
+                # Start from the stored row so fields missing from this
+                # record keep their values when the batch is upserted.
+                merged = {
+                    field: current[field] for field in SYNC_FIELDS if field != 'category'
+                }
+                merged.update(values)
+                merged['id'] = current['id']
+                to_write.append(Product(**merged))
+                update_fields.update(field for field in values if field != 'id')
+                self.stats.updated += 1
+            else:
+                self.stats.skipped += 1
+
+        if to_write and not self.dry_run:
+            with transaction.atomic():
+                Product.objects.bulk_create(
+                    to_write,
+                    batch_size=self.batch_size,
+                    update_conflicts=bool(update_fields),
+                    unique_fields=['id'] if update_fields else None,
+                    update_fields=sorted(update_fields | {'updated_at'}) if update_fields else None,
+                )
+                catalog_version.bump('products')
@@ -0,0 +1,131 @@
+import logging
+import re
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from api.utils.metrics import observe_sql
+
+logger = logging.getLogger(__name__)
+
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*%s\s*,?)+\)', re.IGNORECASE)
+_NUMBER = re.compile(r'\b\d+\b')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_WHITESPACE = re.compile(r'\s+')
+
+
+def get_query_budget_config():
+    """Return QUERY_BUDGETS settings merged with defaults"""
+    config = getattr(settings, 'QUERY_BUDGETS', {})
+    return {
+        'ENABLED': config.get('ENABLED', settings.DEBUG),
+        'RAISE': config.get('RAISE', False),
+        'HEADER': config.get('HEADER', settings.DEBUG),
+        'REPEAT_THRESHOLD': config.get('REPEAT_THRESHOLD', 3),
+        'SLOW_QUERY_MS': config.get('SLOW_QUERY_MS', 100),
+        'BUDGETS': config.get('BUDGETS', {}),
+    }
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def sql_shape(sql):
+    """Reduce a statement to its shape so per-row repeats compare equal"""
+    shape = _IN_LIST.sub('IN (...)', sql)
+    shape = _STRING.sub('?', shape)
+    shape = _NUMBER.sub('?', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+def app_stack(limit=6):
+    """Innermost project frames (views, serializers) that issued a query"""
+    base_dir = str(settings.BASE_DIR)
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if frame.filename.startswith(base_dir)
+        and 'site-packages' not in frame.filename
+        and not frame.filename.endswith(('manage.py', 'query_budget.py', 'middleware.py', 'metrics.py'))
+    ]
+    return [f'{frame.filename}:{frame.lineno} in {frame.name}' for frame in frames[-limit:]]
+
+
+class QueryInspector:
+    """
+    SQL observer that counts statements, groups them by shape and keeps
+    the call stack of the first occurrence of each shape and of slow ones.
+    """
+
+    def __init__(self, repeat_threshold=None, slow_query_ms=None):
+        config = get_query_budget_config()
+        self.repeat_threshold = repeat_threshold or config['REPEAT_THRESHOLD']
+        self.slow_query_ms = config['SLOW_QUERY_MS'] if slow_query_ms is None else slow_query_ms
+        self.count = 0
+        self.shapes = Counter()
+        self.stacks = {}
+        self.slow = []
+
+    def record(self, sql, duration):
+        duration_ms = duration * 1000
+        self.count += 1
+        shape = sql_shape(sql)
+        self.shapes[shape] += 1
+        if shape not in self.stacks:
+            self.stacks[shape] = app_stack()
+        if self.slow_query_ms and duration_ms >= self.slow_query_ms:
+            self.slow.append((duration_ms, sql, app_stack()))
+
+    def capture(self):
+        return observe_sql(self.record)
+
+    def repeated(self):
+        """[(shape, count, stack)] for shapes executed repeat_threshold times or more"""
+        return [
+            (shape, count, self.stacks[shape])
+            for shape, count in self.shapes.most_common()
+            if count >= self.repeat_threshold
+        ]
+
+    def problems(self, budget=None):
+        messages = []
+        if budget is not None and self.count > budget:
+            messages.append(f"{self.count} queries executed, budget is {budget}")
+        for shape, count, stack in self.repeated():
+            trace = '\n    '.join(stack) or '(no project frames)'
+            messages.append(f"Possible N+1: {count}x {shape}\n    {trace}")
+        return messages
+
+
+def budget_for(request, budgets=None):
+    """Budget for the resolved view, keyed by URL name or view class/function name"""
+    budgets = get_query_budget_config()['BUDGETS'] if budgets is None else budgets
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    func = match.func
+    view = getattr(func, 'view_class', None) or getattr(func, 'cls', None)
+    names = [match.view_name, view.__name__ if view else None, func.__name__]
+    for name in names:
+        if name in budgets:
+            return budgets[name]
+    return None
+
+
+@contextmanager
+def query_budget(max_queries, repeat_threshold=None):
+    """
+    Fail when the block runs more than max_queries statements or repeats
+    the same statement shape. Intended for tests:
+
+        with query_budget(5):
+            client.get('/api/products/')
+    """
+    inspector = QueryInspector(repeat_threshold=repeat_threshold, slow_query_ms=0)
+    with inspector.capture():
+        yield inspector
+    problems = inspector.problems(max_queries)
+    if problems:
+        raise QueryBudgetExceeded('\n'.join(problems))
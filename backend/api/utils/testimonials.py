@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from api.utils import catalog_version
+
+
+def get_testimonial_config():
+    """Return TESTIMONIALS settings merged with defaults"""
+    config = getattr(settings, 'TESTIMONIALS', {})
+    return {
+        'CACHE_TIMEOUT': config.get('CACHE_TIMEOUT', 3600),
+    }
+
+
+def feed_cache_key(page, limit):
+    # Bumped by the testimonial and author signals, which also moves the feed's ETag
+    version, = catalog_version.get_versions('testimonials')
+    return f'testimonials:{version}:{page}:{limit}'
+
+
+def get_feed_page(page, limit, render):
+    """Rendered feed page, cached per page size until the testimonials version moves"""
+    key = feed_cache_key(page, limit)
+    data = cache.get(key)
+    if data is None:
+        data = render()
+        cache.set(key, data, get_testimonial_config()['CACHE_TIMEOUT'])
+    return data
+
@@ -11,13 +11,13 @@ from django.shortcuts import render, get_object_or_404
 from rest_framework.response import Response 
 from django.utils import timezone
 from django.utils.timezone import now
-from rest_framework.decorators import api_view, permission_classes, parser_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, parser_classes
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from rest_framework import status, viewsets, filters
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.exceptions import NotFound, ValidationError
-from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser, IsAuthenticatedOrReadOnly
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework import generics, permissions
 from django.db.models import Q
@@ -26,25 +26,48 @@ from rest_framework.views import APIView
 from django.contrib.auth import authenticate
 import stripe
 from api.utils.email_service import send_via_sendgrid
-from django.db.models import Sum, Count, Q, F
+from django.db.models import Sum, Count, Q, F, Prefetch
 from rest_framework_simplejwt.tokens import RefreshToken
-from api.pagination import CustomPagination
+from api.pagination import CustomPagination, OrderHistoryPagination
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.core.cache import cache
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import condition, require_http_methods
 from rest_framework.throttling import UserRateThrottle
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError as DjangoValidationError
-from . services import PaymentService
+from . services import (PaymentService, BrandingUploadService, BrandingUploadError,
+                        InventoryService, InsufficientStock, ReviewService)
 from .authentication import CustomJWTAuthentication
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.urls import reverse
+from rest_framework.parsers import JSONParser
+import re
+import uuid
+from .utils.media import is_private, offload_response, unsign_media_name
+from .utils.facets import apply_filters, get_facets, parse_filters
+from .utils.autocomplete import suggest
+from .utils.catalog_version import etag, etag_for
+from .utils.testimonials import get_feed_page
+from .utils.flash_sales import active_sales
+from .utils.pricing import PRICE_FIELDS, PricingError, quote_cart
+from .utils.metrics import get_metrics_config, registry
+from .utils.async_api import async_api_view, json_response
+from .utils.payment_events import (event_poll, event_stream, order_channel, payment_channel, payment_event,
+                                   publish_payment_status)
 
 
 logger = logging.getLogger(__name__)
 from .models import (Categories, Product, Order,OrderItem, ShippingAddress,
         SliderData, User, Testimonials, BrandingRequest, BrandingFile,  
-        Payment, PaymentWebhook)
+        Payment, PaymentWebhook, OrderHistoryEntry, Review)
 from .serializers import (CustomTokenObtainPairSerializer, UserSerializer, CategorySerializer, 
-                          ProductSerializer, TestimonialsSerializer, OrderSerializer, OrderItemSerializer,
+                          ProductSerializer, TestimonialsSerializer, OrderSerializer, OrderItemSerializer, CartQuoteSerializer,
+                          ProductSummarySerializer, ReviewSerializer,
                           ShippingAddressSerializer, SliderDataSerializer, UserProfileSerializer, 
                           BrandingRequestSerializer, PaymentSerializer, MPesaPaymentSerializer, 
                           StripePaymentSerializer, PaymentStatusSerializer,DashboardStatsSerializer, SalesDataSerializer,
@@ -67,16 +90,12 @@ class CreateUserView(generics.CreateAPIView):
     throttle_classes = [CustomRateThrottle]
 
     def perform_create(self, serializer):
-        # Validate email format
+        # Validate email format; uniqueness was settled by the serializer
         try:
             validate_email(serializer.validated_data['email'])
         except DjangoValidationError:
             raise ValidationError({'email': 'Invalid email format'})
         
-        # Check if email already exists
-        if User.objects.filter(email=serializer.validated_data['email']).exists():
-            raise ValidationError({'email': 'Email already exists'})
-        
         serializer.save()
         
 
@@ -231,20 +250,45 @@ def login_view(request):
 #         return paginator.get_paginated_response(serializer.data)
 
 
+def product_queryset(fields=None):
+    """
+    Products with their category and its product count loaded in one extra
+    query. With `fields` (a ProductSerializer fieldset) only the columns
+    those fields read are selected, and the category only when asked for.
+    """
+    products = Product.objects.all()
+    if fields is not None:
+        products = products.only(*ProductSerializer.columns(fields))
+        if 'category' not in fields:
+            return products
+    return products.prefetch_related(
+        Prefetch('category', queryset=Categories.objects.annotate(product_count=Count('products')))
+    )
+
+
+def product_list_etag(request, *args, **kwargs):
+    # The on_sale filter and facet counts also follow live sale windows
+    timed = any(request.GET.get(name, '').lower() in ('1', 'true', 'yes') for name in ('on_sale', 'facets'))
+    return etag_for(request, ('products', 'categories'), clock=timed)
+
+
 class ProductAPIView(APIView):
     permission_classes = [AllowAny]
     
+    @method_decorator(condition(etag_func=product_list_etag))
     def get(self, request, *args, **kwargs):
-        query = request.GET.get('query', '').strip()[:100]
-        products = Product.objects.filter(
-            Q(title__icontains=query) | 
-            Q(category__name__icontains=query)
-        ).order_by('title')
+        # query, brand, category, min_price, max_price, in_stock, on_sale
+        filters = parse_filters(request.GET)
+        fields = ProductSerializer.fieldset(request.GET)
+        products = apply_filters(product_queryset(fields), filters).order_by('title')
         paginator = CustomPagination()
         
         paginated_products = paginator.paginate_queryset(products, request)
-        serializer = ProductSerializer(paginated_products, many=True, context={'request': request})
-        return paginator.get_paginated_response(serializer.data)
+        serializer = ProductSerializer(paginated_products, many=True, fields=fields, context={'request': request})
+        response = paginator.get_paginated_response(serializer.data)
+        if request.GET.get('facets', '').lower() in ('1', 'true', 'yes'):
+            response.data['facets'] = get_facets(filters)
+        return response
 
     def post(self, request, *args, **kwargs):
         print("Request data:", request.data)
@@ -260,9 +304,10 @@ class ProductAPIView(APIView):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@condition(etag_func=etag('products', 'categories'))
 def getProduct(request, pk):
     try:
-        product = Product.objects.get(id=pk)
+        product = product_queryset().get(id=pk)
     except Product.DoesNotExist:
         raise NotFound(detail="Product not found")
     
@@ -271,20 +316,119 @@ def getProduct(request, pk):
         return Response(serializer.data)
     
 
+REVIEW_SUMMARY_FIELDS = ('id', 'rating', 'numReviews', 'rating_average', 'rating_count_1', 'rating_count_2',
+                         'rating_count_3', 'rating_count_4', 'rating_count_5')
+
+@api_view(['GET', 'POST', 'DELETE'])
+@permission_classes([IsAuthenticatedOrReadOnly])
+def product_reviews(request, pk):
+    """
+    GET: a page of the product's reviews, newest first, with the rating
+    summary read off the product row. POST: create or replace the current
+    user's review. DELETE: remove it.
+    """
+    try:
+        product = Product.objects.only(*REVIEW_SUMMARY_FIELDS).get(id=pk)
+    except (Product.DoesNotExist, DjangoValidationError):
+        raise NotFound(detail="Product not found")
+    
+    if request.method == 'POST':
+        serializer = ReviewSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        review, created = ReviewService.submit(
+            request.user, product, serializer.validated_data['rating'],
+            serializer.validated_data.get('comment', '')
+        )
+        return Response(
+            ReviewSerializer(review).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+    
+    if request.method == 'DELETE':
+        review = Review.objects.filter(product=product, user=request.user).first()
+        if review is None:
+            raise NotFound(detail="You have not reviewed this product")
+        ReviewService.delete(review)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    
+    reviews = Review.objects.filter(product=product).order_by(F('created_at').desc(nulls_last=True), '-id')
+    paginator = CustomPagination()
+    page = paginator.paginate_queryset(reviews, request)
+    response = paginator.get_paginated_response(ReviewSerializer(page, many=True).data)
+    response.data['summary'] = {
+        'rating': product.rating,
+        'rating_average': str(product.rating_average),
+        'numReviews': product.numReviews,
+        'histogram': {str(stars): getattr(product, f'rating_count_{stars}') for stars in range(1, 6)},
+    }
+    return response
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+@condition(etag_func=etag('products', 'categories'))
+def autocomplete(request):
+    """Typeahead suggestions (categories, brands, products) for ?q=, from the in-memory prefix index"""
+    try:
+        limit = int(request.GET.get('limit', 0)) or None
+    except ValueError:
+        limit = None
+    query = request.GET.get('q', '')[:100]
+    response = Response({'query': query, 'suggestions': suggest(query, limit)})
+    response['Cache-Control'] = 'public, max-age=60'
+    return response
+
+MAX_BATCH_PRODUCTS = 50
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@condition(etag_func=etag('products', clock=True))
+def product_batch(request):
+    """Current price, stock and availability of up to MAX_BATCH_PRODUCTS products (?ids=a,b,c), one query"""
+    raw_ids = [value.strip() for value in request.GET.get('ids', '').split(',') if value.strip()]
+    if not raw_ids:
+        return Response({'error': 'ids is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(raw_ids) > MAX_BATCH_PRODUCTS:
+        return Response(
+            {'error': f'At most {MAX_BATCH_PRODUCTS} ids per request'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        ids = list(dict.fromkeys(uuid.UUID(value) for value in raw_ids))
+    except ValueError:
+        return Response({'error': 'ids must be product UUIDs'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    products = Product.objects.only(*PRICE_FIELDS, 'image', 'countInStock').in_bulk(ids)
+    serializer = ProductSummarySerializer(
+        [products[product_id] for product_id in ids if product_id in products],
+        many=True, context={'request': request, 'now': timezone.now()}
+    )
+    return Response({
+        'products': serializer.data,
+        'missing': [str(product_id) for product_id in ids if product_id not in products],
+    })
+
 @api_view(['GET'])
+@condition(etag_func=etag('products', clock=True))
 def getFlashSales(request):
-    flash_sales = Product.objects.filter(flash_sale=True, flash_sale_end__gt=now())
+    # Paginate the cached index of live sales, then load only this page's rows
+    fields = ProductSerializer.fieldset(request.GET)
+    sale_ids = [product_id for product_id, _ in active_sales()]
     paginator = CustomPagination()
-    paginated_products = paginator.paginate_queryset(flash_sales, request)
-    serializer = ProductSerializer(paginated_products, many=True, context={'request': request})
+    page_ids = paginator.paginate_queryset(sale_ids, request)
+    products = product_queryset(fields).in_bulk(page_ids)
+    flash_sales = [products[product_id] for product_id in map(uuid.UUID, page_ids) if product_id in products]
+    serializer = ProductSerializer(flash_sales, many=True, fields=fields, context={'request': request})
     return paginator.get_paginated_response(serializer.data)
 
 @api_view(['GET'])
+@condition(etag_func=etag('products', 'categories'))
 def getBestSellers(request):
-    best_sellers = Product.objects.filter(best_seller=True).order_by('-numReviews')
+    fields = ProductSerializer.fieldset(request.GET)
+    best_sellers = product_queryset(fields).filter(best_seller=True).order_by('-numReviews')
     paginator = CustomPagination()
     paginated_products = paginator.paginate_queryset(best_sellers, request)
-    serializer = ProductSerializer(paginated_products, many=True, context={'request': request})
+    serializer = ProductSerializer(paginated_products, many=True, fields=fields, context={'request': request})
     return paginator.get_paginated_response(serializer.data)
 
 # @api_view(['GET'])
@@ -294,8 +438,10 @@ def getBestSellers(request):
 #     serializer = CategorySerializer(cats, many=True)
 #     return Response(serializer.data)
 
+@method_decorator(condition(etag_func=etag('categories', 'products')), name='list')
+@method_decorator(condition(etag_func=etag('categories', 'products')), name='retrieve')
 class CategoryViewSet(viewsets.ModelViewSet):
-    queryset = Categories.objects.all()
+    queryset = Categories.objects.annotate(product_count=Count('products'))
     serializer_class = CategorySerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ['name', 'description', 'slug']
@@ -304,45 +450,156 @@ class CategoryViewSet(viewsets.ModelViewSet):
 
 @api_view(["GET"])
 @permission_classes([AllowAny])
+@condition(etag_func=etag('testimonials'))
 def getTestimonials(request):
-    testimony = Testimonials.objects.all()
-    serializer = TestimonialsSerializer(testimony, many=True, context={'request': request})
-    return Response(serializer.data)
+    paginator = CustomPagination()
+    
+    def render():
+        testimonials = Testimonials.objects.select_related('user').only(
+            'id', 'position', 'rating', 'comment',
+            'user__first_name', 'user__last_name', 'user__username', 'user__avatar'
+        ).order_by('-id')
+        page = paginator.paginate_queryset(testimonials, request)
+        serializer = TestimonialsSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data).data
+    
+    page_number = str(request.query_params.get(paginator.page_query_param, 1))[:16]
+    return Response(get_feed_page(page_number, paginator.get_page_size(request), render))
         
 @api_view(["POST"])
 @permission_classes([AllowAny])
-@parser_classes([MultiPartParser, FormParser])
+@parser_classes([MultiPartParser, FormParser, JSONParser])
 def getBrandingRequest(request):
-    # Validate file size and type
+    """
+    Create a branding request. Files either come in the multipart body as
+    branding_files, or are announced in a `files` manifest and uploaded in
+    chunks to the returned upload URLs. Validation happens in the
+    background and the request is finalized once every file has settled.
+    """
+    serializer = BrandingRequestSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    manifest = request.data.get('files') or []
+    if isinstance(manifest, str):
+        try:
+            manifest = json.loads(manifest)
+        except ValueError:
+            return Response({'error': 'Invalid files manifest'}, status=status.HTTP_400_BAD_REQUEST)
     files = request.FILES.getlist('branding_files')
-    for file in files:
-        if file.size > 5 * 1024 * 1024:  # 5MB limit
-            return Response(
-                {'error': 'File size too large. Maximum size is 5MB'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        if not file.content_type.startswith(('image/', 'application/pdf')):
-            return Response(
-                {'error': 'Invalid file type. Only images and PDFs are allowed'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
 
-    serializer = BrandingRequestSerializer(data=request.data)
-    if serializer.is_valid():
-        branding_request = serializer.save()
-        files = request.FILES.getlist('branding_files')
-        for file in files:
-            BrandingFile.objects.create(branding_request=branding_request, file=file)
-            
-        return Response({"message":"Quote request submitted!"}, status=status.HTTP_201_CREATED)
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        with transaction.atomic():
+            branding_request = serializer.save()
+            if files:
+                BrandingUploadService.attach_uploaded_files(branding_request, files)
+            slots = BrandingUploadService.register_files(branding_request, manifest) if manifest else []
+            if not files and not slots:
+                BrandingUploadService.finalize_request(branding_request.id)
+    except BrandingUploadError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    chunk_size = BrandingUploadService.get_config()['CHUNK_SIZE']
+    uploads = [{
+        'upload_id': str(slot.upload_id),
+        'name': slot.original_name,
+        'size': slot.size,
+        'chunk_size': chunk_size,
+        'upload_url': request.build_absolute_uri(
+            reverse('branding-upload', kwargs={'upload_id': slot.upload_id})
+        ),
+    } for slot in slots]
+
+    return Response({
+        "message": "Quote request submitted!",
+        "request_id": branding_request.id,
+        "uploads": uploads,
+    }, status=status.HTTP_201_CREATED)
+
+@method_decorator(csrf_exempt, name='dispatch')
+class BrandingUploadView(View):
+    """
+    Resumable chunk upload for one branding file.
+    GET returns the bytes received so far; PUT appends a chunk described
+    by a Content-Range header (bytes <start>-<end>/<total>).
+    """
+    CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+    def get(self, request, upload_id):
+        branding_file = BrandingFile.objects.filter(upload_id=upload_id).select_related('branding_request').first()
+        if not branding_file:
+            return JsonResponse({'error': 'Upload not found'}, status=404)
+        return JsonResponse({
+            'upload_id': str(branding_file.upload_id),
+            'status': branding_file.status,
+            'size': branding_file.size,
+            'bytes_received': branding_file.bytes_received,
+            'error': branding_file.error,
+            'request_status': branding_file.branding_request.status,
+        })
+
+    def put(self, request, upload_id):
+        if not request.META.get('CONTENT_LENGTH'):
+            return JsonResponse({'error': 'Content-Length header is required'}, status=411)
+        try:
+            length = int(request.META['CONTENT_LENGTH'])
+        except ValueError:
+            length = -1
+        if length < 0:
+            return JsonResponse({'error': 'Invalid Content-Length header'}, status=400)
+        if length > BrandingUploadService.get_config()['CHUNK_SIZE']:
+            return JsonResponse({'error': 'Chunk too large'}, status=413)
+
+        offset = 0
+        content_range = request.META.get('HTTP_CONTENT_RANGE')
+        if content_range:
+            match = self.CONTENT_RANGE.match(content_range)
+            if not match:
+                return JsonResponse({'error': 'Invalid Content-Range header'}, status=400)
+            offset = int(match.group(1))
+
+        try:
+            branding_file = BrandingUploadService.write_chunk(upload_id, offset, request, length)
+        except BrandingFile.DoesNotExist:
+            return JsonResponse({'error': 'Upload not found'}, status=404)
+        except BrandingUploadError as e:
+            return JsonResponse({'error': str(e)}, status=409)
+
+        return JsonResponse({
+            'upload_id': str(branding_file.upload_id),
+            'status': branding_file.status,
+            'bytes_received': branding_file.bytes_received,
+        })
+
+@require_http_methods(['GET', 'HEAD'])
+def protected_media(request, token):
+    """Validate a signed media link and hand delivery to the web server"""
+    try:
+        name = unsign_media_name(token)
+    except signing.SignatureExpired:
+        raise Http404("Link expired")
+    except signing.BadSignature:
+        raise Http404("Invalid link")
+
+    if not is_private(name) or not default_storage.exists(name):
+        raise Http404("File not found")
+
+    return offload_response(name)
+
+@require_http_methods(['GET'])
+def metrics(request):
+    """Prometheus scrape endpoint for this worker's request metrics"""
+    token = get_metrics_config()['TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponse(status=401)
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @csrf_exempt
 @api_view(['POST', 'GET'])
 @permission_classes([IsAuthenticated])
 def create_order(request):
     if request.method == 'GET':
-        orders = Order.objects.filter(user=request.user)
+        orders = Order.objects.filter(user=request.user).select_related('shippingAddress').prefetch_related('items')
         serializer = OrderSerializer(orders, many=True)
         return Response(serializer.data)
     
@@ -365,6 +622,18 @@ def create_order(request):
             return Response({'orderId': order.id, **serializer.data}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def cart_quote(request):
+    """Server-side prices and totals for a cart, as checkout will charge them"""
+    serializer = CartQuoteSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    try:
+        quote = quote_cart(serializer.validated_data['items'])
+    except PricingError as e:
+        return Response({'items': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(quote.as_dict())
+
 class DashboardOverviewView(APIView):
     """
     Main dashboard overview API that returns all dashboard data
@@ -495,12 +764,13 @@ class AdvancedAnalyticsView(APIView):
 # @permission_classes([IsAuthenticated, IsAdminUser])
 def adminProducts(request):
     if request.method == 'GET':
+        fields = ProductSerializer.fieldset(request.query_params)
         try:
             search = request.query_params.get('search', '').strip()
             category = request.query_params.get('category', 'all').strip().lower()
             stock_filter = request.query_params.get('stock', 'all').strip().lower()
 
-            products = Product.objects.all()
+            products = product_queryset(fields)
 
             if search:
                 products = products.filter(title__icontains=search)
@@ -518,7 +788,7 @@ def adminProducts(request):
                 products = products.filter(countInStock__gt=100)
 
             products = products.order_by('-Date_added')
-            serializer = ProductSerializer(products, many=True, context={'request': request})
+            serializer = ProductSerializer(products, many=True, fields=fields, context={'request': request})
 
             total_products = products.count()
             total_stock = products.aggregate(Sum('countInStock'))['countInStock__sum'] or 0
@@ -604,7 +874,7 @@ def adminProductDetail(request, pk):
 def pay_for_order(request, order_id):
     """Pay for an existing order"""
     try:
-        order = Order.objects.get(orderId=order_id, user=request.user)
+        order = Order.objects.select_related('user').get(orderId=order_id, user=request.user)
         
         # Check if order is already paid
         if order.isPaid:
@@ -631,10 +901,19 @@ def pay_for_order(request, order_id):
                     status=status.HTTP_400_BAD_REQUEST
                 )
         
+        try:
+            InventoryService.ensure_reserved(order)
+        except InsufficientStock as e:
+            return Response(
+                {'error': f'Product {e.product_id} is no longer in stock'},
+                status=status.HTTP_409_CONFLICT
+            )
+        
         result = payment_service.create_order_payment(
             order_id=order_id,
             payment_method=payment_method,
-            phone_number=phone_number
+            phone_number=phone_number,
+            order=order
         )
         
         if result['success']:
@@ -659,14 +938,13 @@ def pay_for_order(request, order_id):
             status=status.HTTP_404_NOT_FOUND
         )
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def initiate_mpesa_payment(request):
+@async_api_view(['POST'])
+async def initiate_mpesa_payment(request):
     """Initiate M-Pesa STK Push payment (standalone)"""
     serializer = MPesaPaymentSerializer(data=request.data)
     
     if serializer.is_valid():
-        result = payment_service.create_mpesa_payment(
+        result = await payment_service.acreate_mpesa_payment(
             user=request.user,
             amount=serializer.validated_data['amount'],
             phone_number=serializer.validated_data['phone_number'],
@@ -674,20 +952,19 @@ def initiate_mpesa_payment(request):
         )
         
         if result['success']:
-            return Response(result, status=status.HTTP_201_CREATED)
+            return json_response(result, status=status.HTTP_201_CREATED)
         else:
-            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+            return json_response(result, status=status.HTTP_400_BAD_REQUEST)
     
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    return json_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def initiate_stripe_payment(request):
+@async_api_view(['POST'])
+async def initiate_stripe_payment(request):
     """Initiate Stripe payment (standalone)"""
     serializer = StripePaymentSerializer(data=request.data)
     
     if serializer.is_valid():
-        result = payment_service.create_stripe_payment(
+        result = await payment_service.acreate_stripe_payment(
             user=request.user,
             amount=serializer.validated_data['amount'],
             currency=serializer.validated_data['currency'],
@@ -695,57 +972,93 @@ def initiate_stripe_payment(request):
         )
         
         if result['success']:
-            return Response(result, status=status.HTTP_201_CREATED)
+            return json_response(result, status=status.HTTP_201_CREATED)
         else:
-            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+            return json_response(result, status=status.HTTP_400_BAD_REQUEST)
     
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    return json_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def payment_status(request, payment_id):
+@async_api_view(['GET'])
+async def payment_status(request, payment_id):
     """Get payment status"""
     try:
-        payment = Payment.objects.get(id=payment_id, user=request.user)
+        payment = await Payment.objects.aget(id=payment_id, user=request.user)
         serializer = PaymentStatusSerializer(payment)
-        return Response(serializer.data)
+        return json_response(serializer.data)
     except Payment.DoesNotExist:
-        return Response(
+        return json_response(
             {'error': 'Payment not found'}, 
             status=status.HTTP_404_NOT_FOUND
         )
 
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def order_payment_status(request, order_id):
+@async_api_view(['GET'])
+async def order_payment_status(request, order_id):
     """Get payment status for a specific order"""
     try:
-        order = Order.objects.get(orderId=order_id, user=request.user)
-        payments = Payment.objects.filter(order=order).order_by('-created_at')
-        
-        if payments.exists():
-            latest_payment = payments.first()
-            serializer = PaymentStatusSerializer(latest_payment)
-            return Response({
-                'order_id': str(order.id),
-                'order_number': order.orderId,
-                'is_paid': order.isPaid,
-                'payment': serializer.data
-            })
-        else:
-            return Response({
-                'order_id': str(order.id),
-                'order_number': order.orderId,
-                'is_paid': order.isPaid,
-                'payment': None,
-                'message': 'No payment initiated for this order'
-            })
-            
+        order = await Order.objects.select_related('latest_payment').aget(orderId=order_id, user=request.user)
     except Order.DoesNotExist:
-        return Response(
+        return json_response(
             {'error': 'Order not found'}, 
             status=status.HTTP_404_NOT_FOUND
         )
+    
+    latest_payment = order.latest_payment
+    if latest_payment:
+        serializer = PaymentStatusSerializer(latest_payment)
+        return json_response({
+            'order_id': str(order.id),
+            'order_number': order.orderId,
+            'is_paid': order.isPaid,
+            'payment': serializer.data
+        })
+    return json_response({
+        'order_id': str(order.id),
+        'order_number': order.orderId,
+        'is_paid': order.isPaid,
+        'payment': None,
+        'message': 'No payment initiated for this order'
+    })
+
+@async_api_view(['GET'])
+async def payment_events(request, payment_id):
+    """Server-sent payment status updates, replacing polling of payment_status"""
+    try:
+        payment = await Payment.objects.select_related('order').aget(id=payment_id, user=request.user)
+    except Payment.DoesNotExist:
+        return json_response({'error': 'Payment not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    async def snapshot():
+        await payment.arefresh_from_db()
+        order = await Order.objects.filter(id=payment.order_id).afirst()
+        return payment_event(payment, order)
+
+    return await event_stream_response(request, snapshot, [payment_channel(payment.id)])
+
+@async_api_view(['GET'])
+async def order_payment_events(request, order_id):
+    """Server-sent payment status updates for an order, replacing polling of order_payment_status"""
+    try:
+        order = await Order.objects.aget(orderId=order_id, user=request.user)
+    except Order.DoesNotExist:
+        return json_response({'error': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    async def snapshot():
+        current = await Order.objects.select_related('latest_payment').aget(id=order.id)
+        if current.latest_payment is None:
+            return {'order_id': str(current.id), 'order_number': current.orderId,
+                    'is_paid': current.isPaid, 'status': None}
+        return payment_event(current.latest_payment, current)
+
+    return await event_stream_response(request, snapshot, [order_channel(order.orderId)])
+
+async def event_stream_response(request, snapshot, channels):
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(event_stream(snapshot, channels), content_type='text/event-stream')
+    else:
+        response = HttpResponse(await event_poll(snapshot), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # let nginx flush each event
+    return response
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -758,35 +1071,36 @@ def user_payments(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def user_orders_with_payments(request):
-    """Get user's orders with their payment status"""
-    orders = Order.objects.filter(user=request.user).prefetch_related('payments')
+    """Get user's orders with their latest payment, newest first, cursor-paginated"""
+    entries = OrderHistoryEntry.objects.filter(user=request.user)
+    paginator = OrderHistoryPagination()
+    page = paginator.paginate_queryset(entries, request)
     
     order_data = []
-    for order in orders:
-        latest_payment = order.payments.first() if order.payments.exists() else None
-        
+    for entry in page:
         order_info = {
-            'id': str(order.id),
-            'order_number': order.orderId,
-            'total_price': order.totalPrice,
-            'is_paid': order.isPaid,
-            'status': order.status,
-            'created_at': order.createdAt,
-            'payment_method': order.paymentmethod,
+            'id': str(entry.order_id),
+            'order_number': entry.order_number,
+            'total_price': entry.total_price,
+            'is_paid': entry.is_paid,
+            'status': entry.status,
+            'created_at': entry.created_at,
+            'payment_method': entry.payment_method,
+            'item_count': entry.item_count,
             'payment': None
         }
         
-        if latest_payment:
+        if entry.latest_payment_id:
             order_info['payment'] = {
-                'id': str(latest_payment.id),
-                'status': latest_payment.status,
-                'reference': latest_payment.reference_number,
-                'created_at': latest_payment.created_at
+                'id': str(entry.latest_payment_id),
+                'status': entry.latest_payment_status,
+                'reference': entry.latest_payment_reference,
+                'created_at': entry.latest_payment_created_at
             }
         
         order_data.append(order_info)
     
-    return Response(order_data)
+    return paginator.get_paginated_response(order_data)
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -839,14 +1153,17 @@ class StripeWebhookView(View):
                 payload, sig_header, endpoint_secret
             )
         except ValueError:
-            return Response("Invalid payload", status=400)
+            return HttpResponse("Invalid payload", status=400)
         except stripe.error.SignatureVerificationError:
-            return Response("Invalid signature", status=400)
+            return HttpResponse("Invalid signature", status=400)
+        
+        # Plain dict of the verified event, storable in JSONFields
+        event_data = json.loads(payload)
         
         # Log the webhook
         PaymentWebhook.objects.create(
             webhook_type='stripe_webhook',
-            raw_data=event,
+            raw_data=event_data,
             payment=None
         )
         
@@ -855,14 +1172,14 @@ class StripeWebhookView(View):
             payment_intent = event['data']['object']
             payment_intent_id = payment_intent['id']
             
-            success = payment_service.process_stripe_webhook(event, payment_intent_id)
+            success = payment_service.process_stripe_webhook(event_data, payment_intent_id)
             
             if success:
-                return Response("OK", status=200)
+                return HttpResponse("OK", status=200)
             else:
-                return Response("Failed to process webhook", status=400)
+                return HttpResponse("Failed to process webhook", status=400)
         
-        return Response("Event not handled", status=200)
+        return HttpResponse("Event not handled", status=200)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -889,54 +1206,57 @@ def payment_methods(request):
     
     return Response(methods)
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def confirm_stripe_payment(request):
+def complete_stripe_payment(payment):
+    with transaction.atomic():
+        if payment.order:
+            payment.order.isPaid = True
+            payment.order.paidAt = timezone.now()
+            payment.order.status = 'pending'
+            payment.order.save(update_fields=['isPaid', 'paidAt', 'status'])
+            InventoryService.convert(payment.order_id)
+        payment_service.record_payment(payment)
+        publish_payment_status(payment)
+
+@async_api_view(['POST'])
+async def confirm_stripe_payment(request):
     payment_intent_id = request.data.get('payment_intent_id')
-    print("Received payment_intent_id:", payment_intent_id)
 
     if not payment_intent_id:
-        return Response({'error': 'payment_intent_id is required'}, status=400)
+        return json_response({'error': 'payment_intent_id is required'}, status=400)
 
     try:
-        payment = Payment.objects.get(
+        payment = await Payment.objects.select_related('order').aget(
             stripe_payment_intent_id=payment_intent_id,
             user=request.user
         )
 
-        intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+        intent = await payment_service.stripe_service.aretrieve_payment_intent(payment_intent_id)
 
         if intent.status == 'succeeded':
             payment.status = 'completed'
-            payment.save()
-
-            if payment.order:
-                payment.order.isPaid = True
-                payment.order.paidAt = timezone.now()
-                payment.order.status = 'pending'
-                payment.order.save()
+            await sync_to_async(complete_stripe_payment)(payment)
 
-            return Response({
+            return json_response({
                 'success': True,
                 'payment_status': 'completed',
                 'message': 'Payment completed successfully',
-                'order_id': payment.order.id if payment.order else None
+                'order_id': str(payment.order.id) if payment.order else None
             })
         else:
-            return Response({
+            return json_response({
                 'success': False,
                 'payment_status': intent.status,
                 'message': f'Payment status: {intent.status}'
             })
 
     except Payment.DoesNotExist:
-        return Response({'error': 'Payment not found'}, status=404)
+        return json_response({'error': 'Payment not found'}, status=404)
 
-    except stripe.error.InvalidRequestError:
-        return Response({'error': f'Stripe error: {str(e)}'}, status=400)
+    except stripe.error.InvalidRequestError as e:
+        return json_response({'error': f'Stripe error: {str(e)}'}, status=400)
 
     except Exception as e:
-        return Response({'error': str(e)}, status=500)
+        return json_response({'error': str(e)}, status=500)
 
 # @api_view(['POST'])
 # @permission_classes([IsAuthenticated])
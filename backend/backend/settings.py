@@ -20,6 +20,7 @@ from sentry_sdk.integrations.django import DjangoIntegration
 from decouple import config
 import dj_database_url
 from decimal import Decimal
+from importlib.util import find_spec
 load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -49,7 +50,17 @@ ALLOWED_HOSTS = [
 
 AUTH_USER_MODEL = 'api.User'
 
+# Response rendering: orjson-backed JSON (api.renderers falls back to the
+# stdlib encoder without orjson) and MessagePack for clients that ask for it.
+FAST_JSON_RENDERER = os.getenv('FAST_JSON_RENDERER', 'True') == 'True'
+MSGPACK_RENDERER = os.getenv('MSGPACK_RENDERER', 'True') == 'True' and find_spec('msgpack') is not None
+
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer' if FAST_JSON_RENDERER else 'rest_framework.renderers.JSONRenderer',
+        *(['api.renderers.MessagePackRenderer'] if MSGPACK_RENDERER else []),
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'api.authentication.CustomJWTAuthentication',
     ),
@@ -95,6 +106,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     
     'corsheaders.middleware.CorsMiddleware',
+    'api.middleware.PerformanceMetricsMiddleware',
+    'api.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     
@@ -125,6 +138,9 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'backend.wsgi.application'
+# Payment views are async; serve with an ASGI worker, e.g.
+# gunicorn backend.asgi:application -k uvicorn.workers.UvicornWorker
+ASGI_APPLICATION = 'backend.asgi.application'
 
 
 # Database
@@ -162,6 +178,18 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# PBKDF2 work factor for new and rehashed passwords. Every registration and
+# login pays it in CPU; changing it rehashes each password at its next login.
+PASSWORD_HASH_ITERATIONS = int(os.getenv('PASSWORD_HASH_ITERATIONS', '870000'))
+
+PASSWORD_HASHERS = [
+    'api.hashers.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
@@ -183,6 +211,201 @@ STATIC_URL = '/static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Cache: Redis when available so cached data is shared across workers,
+# local memory otherwise.
+REDIS_URL = os.getenv('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Celery: without a broker, tasks run inline in the calling process.
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', REDIS_URL)
+CELERY_TASK_ALWAYS_EAGER = not CELERY_BROKER_URL
+CELERY_TASK_IGNORE_RESULT = True
+
+# Server-sent payment status streams; Redis pub/sub when REDIS_URL is set,
+# otherwise a process-local bus (single worker only)
+PAYMENT_EVENTS = {
+    'BACKEND': 'redis' if REDIS_URL else 'memory',
+    'HEARTBEAT': 15,
+    'MAX_STREAM_SECONDS': 300,
+    # EventSource reconnect delay; also the poll interval under WSGI, which cannot stream
+    'RETRY_MS': 3000,
+}
+
+# Responsive image variants emitted by ProductSerializer.image_variants
+IMAGE_VARIANTS = {
+    'WIDTHS': [320, 640, 960, 1280],
+    'FORMATS': ['webp', 'jpg'],
+    'QUALITY': 80,
+    'CACHE_TIMEOUT': 60 * 60 * 24,
+}
+
+# Media delivery. Public uploads are served by nginx from MEDIA_ROOT at
+# MEDIA_URL. Private uploads go through signed links; the view only sets
+# X-Accel-Redirect, which needs an internal nginx location such as:
+#   location /protected-media/ { internal; alias <MEDIA_ROOT>/; }
+# and nginx should deny direct requests for MEDIA_URL + each private prefix.
+MEDIA_DELIVERY = {
+    'MODE': os.getenv('MEDIA_DELIVERY_MODE', 'x-accel'),  # x-accel, x-sendfile or direct
+    'PRIVATE_PREFIXES': ['branding_uploads/'],
+    'SIGNED_URL_TTL': 60 * 5,
+    'X_ACCEL_LOCATION': '/protected-media/',
+}
+
+# Resumable branding uploads: chunks are appended under TEMP_DIR and
+# validated by a background task before the file reaches MEDIA_ROOT.
+BRANDING_UPLOADS = {
+    'MAX_FILE_SIZE': 200 * 1024 * 1024,
+    'MAX_FILES': 10,
+    'CHUNK_SIZE': 5 * 1024 * 1024,
+    'ALLOWED_TYPES': ['image/', 'application/pdf'],
+    'TEMP_DIR': os.path.join(BASE_DIR, 'uploads_tmp'),
+    'EXPIRE_AFTER': timedelta(hours=24),
+    'THUMBNAIL_SIZE': (256, 256),
+}
+
+# Shared httpx.AsyncClient of the async payment calls (api.utils.http_client)
+OUTBOUND_HTTP = {
+    'TIMEOUT': 30,
+    'MAX_CONNECTIONS': 100,
+    'MAX_KEEPALIVE_CONNECTIONS': 20,
+}
+
+# Incremental supplier catalog sync (api.utils.feed_sync)
+SUPPLIER_FEED = {
+    'URL': os.getenv('SUPPLIER_FEED_URL', 'https://fakeapi.net/products'),
+    'PAGE_SIZE': 100,
+    'CONCURRENCY': 4,
+    'TIMEOUT': 30,
+    'DOWNLOAD_IMAGES': True,
+}
+
+CELERY_BEAT_SCHEDULE = {
+    'expire-branding-uploads': {
+        'task': 'api.tasks.expire_branding_uploads',
+        'schedule': timedelta(hours=1),
+    },
+    'sync-supplier-feed': {
+        'task': 'api.tasks.sync_supplier_feed',
+        'schedule': timedelta(days=1),
+    },
+    'release-expired-reservations': {
+        'task': 'api.tasks.release_expired_reservations',
+        'schedule': timedelta(minutes=1),
+    },
+    'apply-flash-sale-schedule': {
+        'task': 'api.tasks.apply_flash_sale_schedule',
+        'schedule': timedelta(minutes=1),
+    },
+    # Signals keep the index current; this catches bulk imports that bypass them
+    'rebuild-autocomplete-index': {
+        'task': 'api.tasks.rebuild_autocomplete_index',
+        'schedule': timedelta(hours=1),
+    },
+    # Review aggregates are maintained per write; this repairs any drift
+    'recompute-review-aggregates': {
+        'task': 'api.tasks.recompute_review_aggregates',
+        'schedule': timedelta(days=1),
+    },
+}
+
+# Search-box typeahead served from an in-memory prefix index
+AUTOCOMPLETE = {
+    'LIMIT': 8,
+    'MAX_LIMIT': 20,
+    'MAX_PER_GROUP': 3,
+    'MAX_SCAN': 2000,
+}
+
+# Conditional GET on public catalog reads (api.utils.catalog_version). ETags
+# of bodies that depend on live sale windows also roll over every CLOCK_BUCKET seconds.
+CATALOG_VERSIONS = {
+    'CLOCK_BUCKET': 60,
+}
+
+# Public homepage testimonials feed; cached pages are invalidated on change
+TESTIMONIALS = {
+    'CACHE_TIMEOUT': 3600,
+}
+
+# Server-side checkout pricing (api.utils.pricing). Checkout currently
+# charges no tax or shipping; set the rate and flat fee here when it does.
+PRICING = {
+    'CURRENCY': 'KES',
+    'TAX_RATE': '0',
+    'SHIPPING_FLAT': '0',
+    'FREE_SHIPPING_OVER': None,
+    'MAX_QUANTITY': 100,
+}
+
+# Catalog facets on the products endpoint (?facets=1): price bucket edges on
+# new_price, how many brands to list, and how long a facet set is cached
+CATALOG_FACETS = {
+    'PRICE_BUCKETS': [0, 500, 1000, 2500, 5000, 10000, 50000],
+    'BRAND_LIMIT': 50,
+    'CACHE_TIMEOUT': 300,
+}
+
+# Flash sales: cached index of live and upcoming sales, and how often the
+# scheduler flips Product.flash_sale at window boundaries
+FLASH_SALES = {
+    'INDEX_TIMEOUT': 300,
+    'LOOKAHEAD': timedelta(hours=24),
+    'SCHEDULE_INTERVAL': timedelta(minutes=1),
+}
+
+# Checkout stock holds: how long an unpaid order keeps its units, and how
+# long after a failed payment the customer has to retry before they go back
+INVENTORY_RESERVATIONS = {
+    'HOLD_FOR': timedelta(minutes=15),
+    'FAILED_PAYMENT_GRACE': timedelta(minutes=5),
+}
+
+# Per-view latency, SQL, cache and outbound HTTP metrics served at /metrics
+PERFORMANCE_METRICS = {
+    'ENABLED': os.getenv('PERFORMANCE_METRICS_ENABLED', 'True') == 'True',
+    'TOKEN': os.getenv('METRICS_TOKEN', ''),
+    'SERVER_TIMING': True,
+}
+
+# N+1 detection and per-endpoint query budgets (development/staging).
+# Keys are URL names or view class/function names.
+QUERY_BUDGETS = {
+    'ENABLED': os.getenv('QUERY_BUDGETS_ENABLED', str(DEBUG)) == 'True',
+    'RAISE': os.getenv('QUERY_BUDGETS_RAISE', 'False') == 'True',
+    # X-Query-Count response header; off in production unless asked for
+    'HEADER': os.getenv('QUERY_BUDGETS_HEADER', str(DEBUG)) == 'True',
+    'REPEAT_THRESHOLD': 3,
+    'SLOW_QUERY_MS': 100,
+    'BUDGETS': {
+        # 3 for a page; ?facets=1 on a facet cache miss adds 5 grouped counts
+        # (brand, category, price buckets, live sales, in stock)
+        'ProductAPIView': 8,
+        'getProduct': 3,
+        'getFlashSales': 5,
+        'getBestSellers': 5,
+        'getTestimonials': 2,
+        'CategoryViewSet': 3,
+        'adminProducts': 6,
+        'user_orders_with_payments': 3,
+        'cart_quote': 2,
+        'product_batch': 1,
+        'autocomplete': 0,
+        'product_reviews': 8,  # 3 to list; a submission is 8 with its transaction and two aggregate UPDATEs
+    },
+}
+
 # Create logs directory if it doesn't exist
 LOGS_DIR = os.path.join(BASE_DIR, 'logs')
 if not os.path.exists(LOGS_DIR):
@@ -266,6 +489,25 @@ STRIPE_CONFIG = {
     'WEBHOOK_SECRET': config('WEBHOOK_SECRET'),
 }
 
+# Local Daraja/Stripe stand-ins (manage.py run_payment_simulators).
+# Setting PAYMENT_SIMULATOR_URL points both payment services at them.
+PAYMENT_SIMULATOR_URL = os.getenv('PAYMENT_SIMULATOR_URL', '')
+PAYMENT_SIMULATOR = {
+    'HOST': '127.0.0.1',
+    'PORT': 8089,
+    'LATENCY_MS': float(os.getenv('PAYMENT_SIMULATOR_LATENCY_MS', 150)),
+    'LATENCY_JITTER_MS': 50,
+    'FAILURE_RATE': float(os.getenv('PAYMENT_SIMULATOR_FAILURE_RATE', 0)),
+    'DUPLICATE_CALLBACK_RATE': float(os.getenv('PAYMENT_SIMULATOR_DUPLICATE_RATE', 0)),
+    'CALLBACK_DELAY': 2.0,
+    'STRIPE_AUTO_CONFIRM': True,
+    'STRIPE_WEBHOOK_URL': os.getenv('PAYMENT_SIMULATOR_WEBHOOK_URL', 'http://127.0.0.1:8000/api/stripe-webhook/'),
+}
+if PAYMENT_SIMULATOR_URL:
+    MPESA_CONFIG['ENVIRONMENT'] = 'simulator'
+    MPESA_CONFIG['SIMULATOR_URL'] = PAYMENT_SIMULATOR_URL.rstrip('/')
+    STRIPE_CONFIG['API_BASE'] = PAYMENT_SIMULATOR_URL.rstrip('/')
+
 PAYMENT_SETTINGS = {
     'MIN_AMOUNT': Decimal('1.00'),
     'MAX_AMOUNT': Decimal('100000.00'),
@@ -296,6 +538,11 @@ LOGGING = {
             'class': 'logging.StreamHandler',
             'formatter': 'verbose',
         },
+        'queries': {
+            'level': 'WARNING',
+            'class': 'logging.StreamHandler',
+            'formatter': 'verbose',
+        },
     },
     'loggers': {
         'django': {
@@ -303,5 +550,10 @@ LOGGING = {
             'level': 'ERROR',
             'propagate': True,
         },
+        'api.middleware': {
+            'handlers': ['queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
     },
 }
@@ -15,11 +15,10 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include, re_path
+from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from django.views.static import serve
-from api.views import CreateUserView, CustomTokenObtainPair
+from api.views import CreateUserView, CustomTokenObtainPair, metrics
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django.http import JsonResponse
 
@@ -30,7 +29,8 @@ urlpatterns = [
     path("api/user/register/", CreateUserView.as_view(), name="register"),
     path('api/token/', CustomTokenObtainPair.as_view(), name='get_token'),
     path("api/token/refresh/", TokenRefreshView.as_view(), name="refresh"),
-    path("api-auth",include("rest_framework.urls"))
+    path("api-auth",include("rest_framework.urls")),
+    path('metrics', metrics, name='metrics'),
 ]
+# Only active with DEBUG=True; in production nginx serves MEDIA_ROOT.
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-urlpatterns += [re_path(r'^media/(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT, }), ]
@@ -11,9 +11,9 @@ const Testimonials = () => {
         </div>
 
         <div className="grid grid-cols-1 md:grid-cols-3 gap-8">
-          {testimonials.map((testimonial, index) => (
+          {testimonials.map((testimonial) => (
             <div
-              key={index}
+              key={testimonial.id}
               className="bg-white p-6 rounded-lg shadow border border-gray-100"
             >
               <div className="mb-4">
@@ -35,14 +35,12 @@ const Testimonials = () => {
 
               <div className="flex items-center">
                 <img
-                  src={testimonial.user.avatar}
-                  alt={testimonial.user.full_name}
+                  src={testimonial.avatar_url ?? undefined}
+                  alt={testimonial.name ?? ""}
                   className="w-12 h-12 rounded-full mr-4 object-cover"
                 />
                 <div>
-                  <h4 className="font-semibold">
-                    {testimonial.user.full_name}
-                  </h4>
+                  <h4 className="font-semibold">{testimonial.name}</h4>
                   <p className="text-sm text-gray-500">
                     {testimonial.position}
                   </p>
@@ -72,7 +72,7 @@ const getStatusColor = (status: string) => {
 };
 
 const OrderHistory = () => {
-  const { orders } = useStore();
+  const { orders, hasMoreOrders, fetchMoreOrders } = useStore();
   // const [selectedOrder, setSelectedOrder] = useState(null);
   // const [isDrawerOpen, setIsDrawerOpen] = useState(false);
   return (
@@ -93,19 +93,19 @@ const OrderHistory = () => {
           </TableHeader>
           <TableBody>
             {orders.map((order) => (
-              <TableRow key={order.orderId}>
-                <TableCell className="font-medium">{order.orderId}</TableCell>
+              <TableRow key={order.id}>
+                <TableCell className="font-medium">
+                  {order.order_number}
+                </TableCell>
                 <TableCell>
-                  {new Date(order.createdAt).toLocaleDateString("en-KE", {
+                  {new Date(order.created_at).toLocaleDateString("en-KE", {
                     year: "numeric",
                     month: "short",
                     day: "numeric",
                   })}
                 </TableCell>
-                <TableCell>
-                  {order.items.reduce((sum, item) => sum + item.quantity, 0)}
-                </TableCell>
-                <TableCell>{order.totalPrice}</TableCell>
+                <TableCell>{order.item_count}</TableCell>
+                <TableCell>{order.total_price}</TableCell>
                 <TableCell>
                   <Badge
                     variant="outline"
@@ -126,6 +126,14 @@ const OrderHistory = () => {
         </Table>
       </div>
 
+      {hasMoreOrders && (
+        <div className="text-center mt-4">
+          <Button variant="outline" onClick={fetchMoreOrders}>
+            Load more orders
+          </Button>
+        </div>
+      )}
+
       {orders.length === 0 && (
         <div className="text-center py-12">
           <p className="text-gray-500 mb-4">
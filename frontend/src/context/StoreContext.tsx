@@ -29,8 +29,9 @@ export type User = {
 };
 
 export type Testimonials = {
-  id: string;
-  user: User;
+  id: number;
+  name: string | null;
+  avatar_url: string | null;
   position: string;
   rating: number;
   comment: string;
@@ -84,6 +85,22 @@ type Order = {
   items: OrderItem[];
   shippingAddress: any | null;
 };
+type OrderHistoryEntry = {
+  id: string;
+  order_number: string;
+  total_price: number;
+  is_paid: boolean;
+  status: string;
+  created_at: string;
+  payment_method: string;
+  item_count: number;
+  payment: {
+    id: string;
+    status: string;
+    reference: string;
+    created_at: string;
+  } | null;
+};
 type ShippingAddress = {
   town: string;
   address: string;
@@ -128,7 +145,9 @@ type StoreContextType = {
     hasPrevious: boolean;
   };
   testimonials: Testimonials[];
-  orders: Order[];
+  orders: OrderHistoryEntry[];
+  hasMoreOrders: boolean;
+  fetchMoreOrders: () => Promise<void>;
   category: Category[];
   fetchProducts: (query?: string, page?: number) => Promise<void>;
   fetchCategories: (query?: string, page?: number) => Promise<void>;
@@ -165,7 +184,8 @@ export const StoreProvider: React.FC<{ children: ReactNode }> = ({
   const [category, setCategory] = useState<Category[]>([]);
   const [cartItems, setCartItems] = useState<CartItem[]>([]);
   const [testimonials, setTestimonials] = useState<Testimonials[]>([]);
-  const [orders, setOrders] = useState<Order[]>([]);
+  const [orders, setOrders] = useState<OrderHistoryEntry[]>([]);
+  const [ordersNext, setOrdersNext] = useState<string | null>(null);
   const [selectedOrder, setSelectedOrder] = useState<Order | null>(null);
   const [loading, setLoading] = useState<boolean>(true);
   const [error, setError] = useState<string | null>(null);
@@ -303,17 +323,23 @@ export const StoreProvider: React.FC<{ children: ReactNode }> = ({
       });
   };
 
-  const fetchOrders = async () => {
+  const fetchOrders = async (url = "/api/orders/history/") => {
     const access = localStorage.getItem("access");
     api
-      .get("/api/orders/", {
+      .get(url, {
         headers: {
           Authorization: `Bearer ${access}`,
         },
       })
       .then((res) => res.data)
       .then((data) => {
-        setOrders(data);
+        // Cursor pages: the first request replaces the list, later ones append
+        setOrders((previous) =>
+          url === "/api/orders/history/"
+            ? data.data
+            : [...previous, ...data.data]
+        );
+        setOrdersNext(data.next);
       })
       .catch((error) => {
         setError(
@@ -324,12 +350,19 @@ export const StoreProvider: React.FC<{ children: ReactNode }> = ({
       });
   };
 
+  const fetchMoreOrders = async () => {
+    if (ordersNext) {
+      await fetchOrders(ordersNext);
+    }
+  };
+
   const fetchTestimonials = async () => {
     api
       .get("/api/testimonials/")
       .then((res) => res.data)
       .then((data) => {
-        setTestimonials(data);
+        // Paginated feed; the homepage shows the first page
+        setTestimonials(data.data);
       });
   };
 
@@ -413,6 +446,8 @@ export const StoreProvider: React.FC<{ children: ReactNode }> = ({
     logout,
     testimonials,
     orders,
+    hasMoreOrders: !!ordersNext,
+    fetchMoreOrders,
     handleError,
     setError,
     clearError,
@@ -25,6 +25,12 @@ type Order = {
   orderId: string;
 };
 
+type PaymentStatusResult = {
+  success: boolean;
+  paid?: boolean;
+  error?: string;
+};
+
 const Checkout = () => {
   const { cartItems, clearCart, userInfo } = useStore();
   const navigate = useNavigate();
@@ -224,7 +230,7 @@ const Checkout = () => {
         });
 
         // Start polling for payment status
-        const statusResult = await pollPaymentStatus(orderId);
+        const statusResult = await waitForPaymentStatus(orderId);
 
         if (statusResult.success && statusResult.paid) {
           setMpesaStatus({
@@ -329,7 +335,7 @@ const Checkout = () => {
         );
         console.log("Confirm payment result:", confirmResponse.data);
 
-        const verificationResult = await pollPaymentStatus(orderId, 10);
+        const verificationResult = await waitForPaymentStatus(orderId, 10);
         console.log("verification results", verificationResult);
 
         if (confirmResponse.data.success && confirmResponse.data.order_id) {
@@ -515,11 +521,7 @@ const Checkout = () => {
   const pollPaymentStatus = async (orderId: string, maxAttempts = 30) => {
     let attempts = 0;
 
-    const checkStatus = async (): Promise<{
-      success: boolean;
-      paid?: boolean;
-      error?: string;
-    }> => {
+    const checkStatus = async (): Promise<PaymentStatusResult> => {
       try {
         const response = await api.get(
           `/api/payments/order-payment-status/${orderId}/`,
@@ -559,6 +561,57 @@ const Checkout = () => {
     return checkStatus();
   };
 
+  // Follow payment status over server-sent events, falling back to polling
+  // when EventSource is unavailable or the server refuses the stream
+  const waitForPaymentStatus = (orderId: string, maxAttempts = 30) => {
+    if (typeof EventSource === "undefined") {
+      return pollPaymentStatus(orderId, maxAttempts);
+    }
+
+    return new Promise<PaymentStatusResult>((resolve) => {
+      const source = new EventSource(
+        `${api.defaults.baseURL ?? ""}/api/payments/order-payment-events/${orderId}/`,
+        { withCredentials: true }
+      );
+      let settled = false;
+
+      const settle = (result: Promise<PaymentStatusResult> | PaymentStatusResult) => {
+        if (settled) return;
+        settled = true;
+        clearTimeout(timeout);
+        source.close();
+        resolve(result);
+      };
+
+      // Same overall wait as polling: maxAttempts checks two seconds apart
+      const timeout = setTimeout(
+        () =>
+          settle({
+            success: false,
+            error: "Payment timeout - please check your order status",
+          }),
+        maxAttempts * 2000
+      );
+
+      source.addEventListener("status", (event) => {
+        const { status } = JSON.parse((event as MessageEvent).data);
+        if (status === "completed") {
+          settle({ success: true, paid: true });
+        } else if (status === "failed" || status === "cancelled") {
+          settle({ success: false, error: "Payment failed" });
+        }
+      });
+
+      // A stream that simply ended is reconnected by EventSource itself;
+      // CLOSED means the request was rejected, so poll instead
+      source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED) {
+          settle(pollPaymentStatus(orderId, maxAttempts));
+        }
+      };
+    });
+  };
+
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
 